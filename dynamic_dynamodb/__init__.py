@@ -20,23 +20,39 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-import re
+import json
 import sys
-import time
+import threading
+from itertools import izip
+from multiprocessing.pool import ThreadPool
 
 from boto.exception import JSONResponseError, BotoServerError
-import consul
 
-from dynamic_dynamodb.aws import dynamodb
+from dynamic_dynamodb import (
+    config, consul_handler, metrics, scheduler, throttle_watcher, timing)
+from dynamic_dynamodb.aws import cloudwatch, dynamodb, sns
 from dynamic_dynamodb.core import gsi, table
 from dynamic_dynamodb.daemon import Daemon
-from dynamic_dynamodb.config_handler import get_global_option, get_table_option
+from dynamic_dynamodb.config_handler import (
+    get_global_option, get_gsi_matcher, get_gsi_option, get_table_option)
 from dynamic_dynamodb.log_handler import LOGGER as logger
 
 CHECK_STATUS = {
     'tables': {},
     'gsis': {}
 }
+CHECK_STATUS_LOCK = threading.Lock()
+
+# (max_workers, ThreadPool) used when checking tables in parallel
+WORKER_POOL = None
+
+# CloudWatch metrics used to check a table or GSI
+METRIC_NAMES = [
+    'ConsumedReadCapacityUnits',
+    'ConsumedWriteCapacityUnits',
+    'ReadThrottleEvents',
+    'WriteThrottleEvents'
+]
 
 
 class DynamicDynamoDBDaemon(Daemon):
@@ -46,9 +62,10 @@ class DynamicDynamoDBDaemon(Daemon):
         :type check_interval: int
         :param check_interval: Delay in seconds between checks
         """
+        timing.install_signal_handler()
         try:
             while True:
-                execute()
+                execute(consul_handler.get_client())
         except Exception as error:
             logger.exception(error)
 
@@ -94,79 +111,189 @@ def main():
                     'stop, restart, and foreground')
                 sys.exit(1)
         else:
+            timing.install_signal_handler()
             if get_global_option('run_once'):
-                execute()
+                execute(consul_handler.get_client())
             else:
                 while True:
-                    execute()
+                    execute(consul_handler.get_client())
 
     except Exception as error:
         logger.exception(error)
 
 
-def execute():
-    """ Ensure provisioning """
+def execute(l_consulapi):
+    """ Ensure provisioning
+
+    :type l_consulapi: consul.Consul
+    :param l_consulapi: Long-lived Consul client, see consul_handler
+    """
+    throttle_watcher.run_until(l_consulapi, scheduler.get_next_cycle())
+    due = scheduler.start_cycle()
+    timing.start_cycle()
+
+    with timing.phase('config'):
+        if config.reload_configuration():
+            logger.info(
+                'Configuration file changed, using the new configuration')
+
+    if not get_global_option('run_once'):
+        metrics.start_server()
+
+    dynamodb.clear_table_descriptions()
+    cloudwatch.clear_metrics()
+
     boto_server_error_retries = 3
-    l_consulapi = consul.Consul(host=get_global_option('consul_host'), token=get_global_option('consul_token'))
 
-    # Ensure provisioning
-    for table_name, table_key in sorted(dynamodb.get_tables_and_gsis()):
-        try:
-            table_num_consec_read_checks = \
-                CHECK_STATUS['tables'][table_name]['reads']
-        except KeyError:
-            table_num_consec_read_checks = 0
+    pool = __get_worker_pool()
+
+    # Find the GSIs of all tables and fetch the metrics for all tables
+    # and GSIs up front, in as few CloudWatch requests as possible
+    with timing.phase('discovery'):
+        all_tables = dynamodb.get_tables_and_gsis()
+        tables = scheduler.prioritize(
+            scheduler.get_due_tables(all_tables, due), due)
+        gsis = list(__map(pool, __discover_gsis, tables))
+        throttle_watcher.watch(all_tables, tables, gsis)
+    with timing.phase('cloudwatch'):
+        cloudwatch.prefetch_dynamodb_metrics(__plan_metrics(tables, gsis))
+
+    # Ensure provisioning, most urgent tables first. The results are
+    # applied in that order, regardless of which worker finished first
+    results = __map(
+        pool,
+        __ensure_provisioning,
+        [(l_consulapi, table_name, table_key, start_time)
+         for (table_name, table_key), start_time in zip(
+             tables, scheduler.spread(len(tables), due))])
+
+    for (table_name, table_key), result in izip(tables, results):
+        table_name, table_checks, gsi_checks, loads, error = result
+        with CHECK_STATUS_LOCK:
+            if table_checks:
+                CHECK_STATUS['tables'][table_name] = table_checks
+
+            for gsi_name, checks in gsi_checks:
+                CHECK_STATUS['gsis'][gsi_name] = checks
+
+        if error is None:
+            __schedule_table(l_consulapi, due, table_name, table_key, loads)
+            continue
+
+        if getattr(error, 'error_code', None) in \
+                dynamodb.EXPIRED_CREDENTIALS_ERRORS:
+            logger.warning(
+                '{0} - AWS credentials have expired, reconnecting'.format(
+                    table_name))
+            dynamodb.reset_connection()
+            cloudwatch.reset_connection()
+            sns.reset_connection()
 
-        try:
-            table_num_consec_write_checks = \
-                CHECK_STATUS['tables'][table_name]['writes']
-        except KeyError:
-            table_num_consec_write_checks = 0
+        if isinstance(error, JSONResponseError):
+            exception = error.body['__type'].split('#')[1]
 
+            if exception == 'ResourceNotFoundException':
+                logger.error('{0} - Table {1} does not exist anymore'.format(
+                    table_name,
+                    table_name))
+                dynamodb.invalidate_table_names()
+                continue
+
+        elif isinstance(error, BotoServerError):
+            if boto_server_error_retries > 0:
+                logger.error(
+                    'Unknown boto error. Status: "{0}". '
+                    'Reason: "{1}". Message: {2}'.format(
+                        error.status,
+                        error.reason,
+                        error.message))
+                logger.error(
+                    'Please bug report if this error persists')
+                boto_server_error_retries -= 1
+                continue
+
+            else:
+                raise error
+
+        else:
+            raise error
+
+    with timing.phase('consul'):
+        consul_handler.flush_writes(l_consulapi)
+    with timing.phase('sns'):
+        sns.flush_notifications(wait=get_global_option('run_once'))
+
+    cycle = timing.end_cycle()
+    metrics.CYCLE_SECONDS.observe(cycle['duration'])
+    metrics.CHECK_INTERVAL.set(get_global_option('check_interval'))
+    if scheduler.end_cycle():
+        metrics.CYCLE_OVERRUNS.inc()
+
+    logger.debug(
+        'Consul connections: {connections:d} opened, '
+        '{idle_connections:d} idle, {requests:d} requests'.format(
+            **consul_handler.get_pool_stats()))
+
+
+def __ensure_provisioning(args):
+    """ Ensure provisioning for a table and its GSIs
+
+    Runs in a worker thread when max-workers is above 1. Boto errors are
+    returned instead of raised, so that execute() can handle them in
+    table order.
+
+    :type args: tuple
+    :param args: (consul_api, table_name, table_key, start_time)
+    :returns: (str, dict, list, tuple, Exception) -- Table name, new
+        table check status, list of (gsi_name, new GSI check status), the
+        loads of the table and its GSIs, see scheduler.get_loads(), and
+        the error that stopped the processing, if any
+    """
+    l_consulapi, table_name, table_key, start_time = args
+    table_checks = None
+    gsi_checks = []
+    loads = {}
+    throttled_events = 0
+
+    scheduler.sleep_until(start_time)
+
+    with timing.table(table_name):
         try:
+            with CHECK_STATUS_LOCK:
+                try:
+                    table_num_consec_read_checks = \
+                        CHECK_STATUS['tables'][table_name]['reads']
+                except KeyError:
+                    table_num_consec_read_checks = 0
+
+                try:
+                    table_num_consec_write_checks = \
+                        CHECK_STATUS['tables'][table_name]['writes']
+                except KeyError:
+                    table_num_consec_write_checks = 0
+
             # The return var shows how many times the scale-down criteria
             #  has been met. This is coupled with a var in config,
             # "num_intervals_scale_down", to delay the scale-down
-            table_num_consec_read_checks, table_num_consec_write_checks = \
+            (table_num_consec_read_checks, table_num_consec_write_checks,
+             (table_loads, table_throttled_events)) = \
                 table.ensure_provisioning(l_consulapi, table_name, table_key, table_num_consec_read_checks, table_num_consec_write_checks)
 
-            CHECK_STATUS['tables'][table_name] = {
+            table_checks = {
                 'reads': table_num_consec_read_checks,
                 'writes': table_num_consec_write_checks
             }
+            loads.update(table_loads)
+            throttled_events += table_throttled_events
 
-            gsi_names = set()
-            # Add regexp table names
-            for gst_instance in dynamodb.table_gsis(table_name):
-                gsi_name = gst_instance[u'IndexName']
-
-                try:
-                    gsi_keys = get_table_option(table_key, 'gsis').keys()
-
-                except AttributeError:
-                    # Continue if there are not GSIs configured
-                    continue
-
-                for gsi_key in gsi_keys:
-                    try:
-                        if re.match(gsi_key, gsi_name):
-                            logger.debug(
-                                'Table {0} GSI {1} matches '
-                                'GSI config key {2}'.format(
-                                    table_name, gsi_name, gsi_key))
-                            gsi_names.add((gsi_name, gsi_key))
-
-                    except re.error:
-                        logger.error('Invalid regular expression: "{0}"'.format(
-                            gsi_key))
-                        sys.exit(1)
+            gsi_names = __get_gsis(table_name, table_key)
 
             #получаем список индексов
             l_gsi_candidates = {}
 
             try:
               l_gsiConfigPath = "dynamic-dynamodb/" + table_name + "/index/"
-              l_tmp, l_data = l_consulapi.kv.get(l_gsiConfigPath, keys=True)
+              l_data = consul_handler.get_override_keys(l_consulapi, l_gsiConfigPath)
 
               if l_data:
                   for gsi_name in l_data:
@@ -176,62 +303,199 @@ def execute():
             except:
               pass
 
-            for gsi_name, gsi_key in sorted(gsi_names):
+            for gsi_name, gsi_key in gsi_names:
                 if gsi_name in l_gsi_candidates:
                     del l_gsi_candidates[gsi_name]
 
-                try:
-                    gsi_num_consec_read_checks = \
-                        CHECK_STATUS['gsis'][gsi_name]['reads']
-                except KeyError:
-                    gsi_num_consec_read_checks = 0
+                with CHECK_STATUS_LOCK:
+                    try:
+                        gsi_num_consec_read_checks = \
+                            CHECK_STATUS['gsis'][gsi_name]['reads']
+                    except KeyError:
+                        gsi_num_consec_read_checks = 0
 
-                try:
-                    gsi_num_consec_write_checks = \
-                        CHECK_STATUS['gsis'][gsi_name]['writes']
-                except KeyError:
-                    gsi_num_consec_write_checks = 0
+                    try:
+                        gsi_num_consec_write_checks = \
+                            CHECK_STATUS['gsis'][gsi_name]['writes']
+                    except KeyError:
+                        gsi_num_consec_write_checks = 0
 
-                gsi_num_consec_read_checks, gsi_num_consec_write_checks = \
+                (gsi_num_consec_read_checks, gsi_num_consec_write_checks,
+                 (gsi_loads, gsi_throttled_events)) = \
                     gsi.ensure_provisioning(l_consulapi, table_name, table_key, gsi_name, gsi_key, gsi_num_consec_read_checks, gsi_num_consec_write_checks)
 
-                CHECK_STATUS['gsis'][gsi_name] = {
+                gsi_checks.append((gsi_name, {
                     'reads': gsi_num_consec_read_checks,
                     'writes': gsi_num_consec_write_checks
-                }
+                }))
+                loads.update(gsi_loads)
+                throttled_events += gsi_throttled_events
 
             if not get_global_option('dry_run'):
               #удаляем индексы из конфига которые более не существуют
               for gsi_name, l_tmp in l_gsi_candidates.iteritems():
-                l_consulapi.kv.delete(l_gsiConfigPath + gsi_name)
+                consul_handler.queue_delete(l_gsiConfigPath + gsi_name)
 
-        except JSONResponseError as error:
-            exception = error.body['__type'].split('#')[1]
+        except BotoServerError as error:
+            # JSONResponseError is a BotoServerError as well
+            return table_name, table_checks, gsi_checks, None, error
+        except SystemExit as error:
+            # Would otherwise silently end the worker thread
+            return table_name, table_checks, gsi_checks, None, error
 
-            if exception == 'ResourceNotFoundException':
-                logger.error('{0} - Table {1} does not exist anymore'.format(
+        return (
+            table_name, table_checks, gsi_checks,
+            (loads, throttled_events), None)
+
+
+def __discover_gsis(args):
+    """ Find the configured GSIs of a table
+
+    Errors are left for __ensure_provisioning to handle, as they belong
+    to the table.
+
+    :type args: tuple
+    :param args: (table_name, table_key)
+    :returns: list -- List of tuples (gsi_name, gsi_key)
+    """
+    table_name, table_key = args
+    with timing.table(table_name):
+        try:
+            return __get_gsis(table_name, table_key)
+        except BotoServerError:
+            return []
+
+
+def __get_gsis(table_name, table_key):
+    """ Get the GSIs of a table that match the table configuration
+
+    :type table_name: str
+    :param table_name: Name of the DynamoDB table
+    :type table_key: str
+    :param table_key: Table configuration option key name
+    :returns: list -- Sorted list of tuples (gsi_name, gsi_key)
+    """
+    gsi_names = set()
+    matcher = get_gsi_matcher(table_key)
+    if not matcher or not matcher.keys:
+        # Continue if there are not GSIs configured
+        return []
+
+    for gst_instance in dynamodb.table_gsis(table_name):
+        gsi_name = gst_instance[u'IndexName']
+
+        for gsi_key in matcher.match(gsi_name):
+            logger.debug(
+                'Table {0} GSI {1} matches '
+                'GSI config key {2}'.format(
+                    table_name, gsi_name, gsi_key))
+            gsi_names.add((gsi_name, gsi_key))
+
+    return sorted(gsi_names)
+
+
+def __schedule_table(l_consulapi, due, table_name, table_key, loads):
+    """ Set when to check a table next, from its utilisation in this cycle
+
+    The utilisation is the one the scaling decisions were made from, so
+    nothing more is read from AWS.
+
+    :type l_consulapi: consul.Consul
+    :param l_consulapi: Consul client
+    :type due: float
+    :param due: Time the cycle was due
+    :type table_name: str
+    :param table_name: Name of the DynamoDB table
+    :type table_key: str
+    :param table_key: Table configuration option key name
+    :type loads: tuple
+    :param loads: Loads of the table and its GSIs, see
+        scheduler.get_loads()
+    """
+    table_config = consul_handler.get_effective_config(
+        l_consulapi, 'dynamic-dynamodb/' + table_name,
+        config.get_configuration()['tables'][table_key])
+
+    scheduler.schedule_table(
+        table_name,
+        due,
+        loads[0],
+        loads[1],
+        table_config.get('min_check_interval'),
+        table_config.get('max_check_interval'))
+
+
+def __plan_metrics(tables, gsis):
+    """ List the metrics needed to check the tables and GSIs
+
+    :type tables: list
+    :param tables: List of tuples (table_name, table_key)
+    :type gsis: list
+    :param gsis: List of (gsi_name, gsi_key) lists, one per table
+    :returns: list -- List of tuples (table_name, gsi_name, metric_name,
+        lookback_window_start, lookback_period)
+    """
+    entries = []
+    for (table_name, table_key), table_gsis in zip(tables, gsis):
+        entities = [(
+            None,
+            get_table_option(table_key, 'lookback_window_start'),
+            get_table_option(table_key, 'lookback_period'))]
+        for gsi_name, gsi_key in table_gsis:
+            entities.append((
+                gsi_name,
+                get_gsi_option(table_key, gsi_key, 'lookback_window_start'),
+                get_gsi_option(table_key, gsi_key, 'lookback_period')))
+
+        for gsi_name, lookback_window_start, lookback_period in entities:
+            for metric_name in METRIC_NAMES:
+                entries.append((
                     table_name,
-                    table_name))
-                continue
+                    gsi_name,
+                    metric_name,
+                    lookback_window_start,
+                    lookback_period))
 
-        except BotoServerError as error:
-            if boto_server_error_retries > 0:
-                logger.error(
-                    'Unknown boto error. Status: "{0}". '
-                    'Reason: "{1}". Message: {2}'.format(
-                        error.status,
-                        error.reason,
-                        error.message))
-                logger.error(
-                    'Please bug report if this error persists')
-                boto_server_error_retries -= 1
-                continue
+    return entries
 
-            else:
-                raise
 
-    # Sleep between the checks
-    if not get_global_option('run_once'):
-        logger.debug('Sleeping {0} seconds until next check'.format(
-            get_global_option('check_interval')))
-        time.sleep(get_global_option('check_interval'))
+def __map(pool, func, iterable):
+    """ Map func over iterable, in the worker pool if there is one
+
+    :type pool: multiprocessing.pool.ThreadPool
+    :param pool: Worker pool or None
+    :type func: function
+    :param func: Function to call for each item
+    :type iterable: list
+    :param iterable: Items to process
+    :returns: iterator -- Results in the order of iterable
+    """
+    if pool:
+        return pool.imap(func, iterable)
+
+    return (func(item) for item in iterable)
+
+
+def __get_worker_pool():
+    """ Get the thread pool used to check tables in parallel
+
+    The pool is kept between the checks, so that the worker threads can
+    reuse their AWS connections. It is recreated if max-workers changes.
+
+    :returns: multiprocessing.pool.ThreadPool or None if max-workers is 1
+    """
+    global WORKER_POOL
+
+    max_workers = get_global_option('max_workers')
+    if WORKER_POOL and WORKER_POOL[0] != max_workers:
+        WORKER_POOL[1].close()
+        WORKER_POOL = None
+
+    if max_workers <= 1:
+        return None
+
+    if not WORKER_POOL:
+        logger.debug('Starting {0} worker threads'.format(max_workers))
+        WORKER_POOL = (max_workers, ThreadPool(max_workers))
+
+    return WORKER_POOL[1]
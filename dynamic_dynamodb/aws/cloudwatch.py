@@ -1,9 +1,335 @@
 # -*- coding: utf-8 -*-
 """ Ensure connections to CloudWatch """
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from xml.etree import ElementTree
+
+from dynamic_dynamodb import metrics, timing
 from dynamic_dynamodb.log_handler import LOGGER as logger
 from dynamic_dynamodb.config_handler import get_global_option
 
 from boto.ec2 import cloudwatch
+from boto.exception import BotoServerError
+from boto.utils import ISO8601, parse_ts
+
+# Maximum number of queries in one GetMetricData request
+MAX_METRIC_DATA_QUERIES = 500
+
+# Per thread CloudWatch connections, created on first use
+CONNECTIONS = threading.local()
+
+# Incremented by reset_connection() to make all threads reconnect
+CONNECTION_GENERATION = 0
+
+# Metrics fetched during the current check cycle, keyed by
+# (table_name, gsi_name, metric_name, start_time, end_time)
+METRICS = {}
+METRICS_LOCK = threading.Lock()
+
+# Metric windows end relative to this time during a check cycle
+CYCLE_START = None
+
+# Set to False if GetMetricData is not allowed for our credentials
+USE_GET_METRIC_DATA = True
+
+
+def clear_metrics():
+    """ Forget all cached metrics
+
+    Called at the start of every check cycle so that each metric is
+    fetched at most once per table or GSI and cycle. All metric windows
+    in the cycle are relative to the time of this call.
+    """
+    global CYCLE_START
+
+    with METRICS_LOCK:
+        METRICS.clear()
+        CYCLE_START = datetime.utcnow().replace(second=0, microsecond=0)
+
+
+def get_connection():
+    """ Return the CloudWatch connection for the current thread
+
+    boto connections are not thread safe, so every thread gets its own.
+    The connection is made the first time a thread asks for it.
+
+    :returns: boto.ec2.cloudwatch.CloudWatchConnection
+    """
+    if getattr(CONNECTIONS, 'generation', None) != CONNECTION_GENERATION:
+        CONNECTIONS.connection = __get_connection_cloudwatch()
+        CONNECTIONS.generation = CONNECTION_GENERATION
+
+    return CONNECTIONS.connection
+
+
+def reset_connection():
+    """ Make all threads reconnect to CloudWatch on their next request
+
+    Used when the credentials of the current connections have expired.
+    """
+    global CONNECTION_GENERATION
+
+    CONNECTION_GENERATION += 1
+
+
+def get_dynamodb_metric(
+        table_name, gsi_name, metric_name,
+        lookback_window_start, lookback_period):
+    """ Returns the Sum datapoints of a DynamoDB metric
+
+    The window is aligned to whole minutes, so that all lookups of the same
+    metric during a check cycle share one CloudWatch request.
+
+    :type table_name: str
+    :param table_name: Name of the DynamoDB table
+    :type gsi_name: str
+    :param gsi_name: Name of the GSI, or None for table metrics
+    :type metric_name: str
+    :param metric_name: Name of the metric to retrieve from CloudWatch
+    :type lookback_window_start: int
+    :param lookback_window_start: How many minutes to look at
+    :type lookback_period: int
+    :param lookback_period: Length of the lookback period in minutes
+    :returns: list -- A list of time series data for the given metric
+    """
+    start_time, end_time = get_metric_window(
+        lookback_window_start, lookback_period)
+    key = (table_name, gsi_name, metric_name, start_time, end_time)
+
+    with METRICS_LOCK:
+        if key in METRICS:
+            return METRICS[key]
+
+    dimensions = {'TableName': table_name}
+    if gsi_name:
+        dimensions['GlobalSecondaryIndexName'] = gsi_name
+
+    with timing.phase('cloudwatch'):
+        with metrics.aws_request('cloudwatch', 'GetMetricStatistics'):
+            datapoints = get_connection().get_metric_statistics(
+                period=lookback_period * 60,
+                start_time=start_time,
+                end_time=end_time,
+                metric_name=metric_name,
+                namespace='AWS/DynamoDB',
+                statistics=['Sum'],
+                dimensions=dimensions,
+                unit='Count')
+
+    with METRICS_LOCK:
+        METRICS[key] = datapoints
+
+    return datapoints
+
+
+def prefetch_dynamodb_metrics(entries):
+    """ Fetch DynamoDB metrics in batches and cache them for the cycle
+
+    Entries with the same window are grouped into GetMetricData requests of
+    up to MAX_METRIC_DATA_QUERIES queries. Metrics that could not be
+    fetched this way are left to get_dynamodb_metric().
+
+    :type entries: list
+    :param entries: List of tuples (table_name, gsi_name, metric_name,
+        lookback_window_start, lookback_period)
+    :returns: int -- Number of GetMetricData requests made
+    """
+    global USE_GET_METRIC_DATA
+
+    if not USE_GET_METRIC_DATA:
+        return 0
+
+    windows = defaultdict(list)
+    for (table_name, gsi_name, metric_name,
+            lookback_window_start, lookback_period) in sorted(set(entries)):
+        start_time, end_time = get_metric_window(
+            lookback_window_start, lookback_period)
+        windows[(start_time, end_time, lookback_period)].append(
+            (table_name, gsi_name, metric_name))
+
+    requests = 0
+    for (start_time, end_time, lookback_period), queries in sorted(
+            windows.items()):
+        for i in range(0, len(queries), MAX_METRIC_DATA_QUERIES):
+            batch = queries[i:i + MAX_METRIC_DATA_QUERIES]
+            try:
+                results = __get_metric_data(
+                    batch, start_time, end_time, lookback_period * 60)
+            except BotoServerError as error:
+                logger.warning(
+                    'Could not fetch metrics with GetMetricData, falling '
+                    'back to one request per metric. Status: "{0}". '
+                    'Reason: "{1}"'.format(error.status, error.reason))
+                if error.status == 403:
+                    USE_GET_METRIC_DATA = False
+                return requests
+
+            requests += 1
+            with METRICS_LOCK:
+                for (table_name, gsi_name, metric_name), datapoints in zip(
+                        batch, results):
+                    METRICS[(
+                        table_name,
+                        gsi_name,
+                        metric_name,
+                        start_time,
+                        end_time)] = datapoints
+
+    logger.debug(
+        'Fetched {0:d} metrics in {1:d} GetMetricData requests'.format(
+            len(set(entries)), requests))
+    return requests
+
+
+def get_dynamodb_metrics(queries, start_time, end_time, period):
+    """ Fetch the Sum of DynamoDB metrics for a window, without caching
+
+    Used between the check cycles. The metrics are fetched in
+    GetMetricData requests of up to MAX_METRIC_DATA_QUERIES queries.
+
+    :type queries: list
+    :param queries: List of tuples (table_name, gsi_name, metric_name)
+    :type start_time: datetime
+    :param start_time: Start of the window, in UTC
+    :type end_time: datetime
+    :param end_time: End of the window, in UTC
+    :type period: int
+    :param period: Period in seconds
+    :returns: list or None -- Datapoints for each metric, in the same
+        order, or None if GetMetricData is not allowed for our credentials
+    """
+    global USE_GET_METRIC_DATA
+
+    if not USE_GET_METRIC_DATA:
+        return None
+
+    results = []
+    for i in range(0, len(queries), MAX_METRIC_DATA_QUERIES):
+        try:
+            results.extend(__get_metric_data(
+                queries[i:i + MAX_METRIC_DATA_QUERIES],
+                start_time,
+                end_time,
+                period))
+        except BotoServerError as error:
+            if error.status != 403:
+                raise
+
+            USE_GET_METRIC_DATA = False
+            return None
+
+    return results
+
+
+def get_metric_window(lookback_window_start, lookback_period):
+    """ Returns the start and end time of a metric window
+
+    :type lookback_window_start: int
+    :param lookback_window_start: How many minutes to look at
+    :type lookback_period: int
+    :param lookback_period: Length of the lookback period in minutes
+    :returns: (datetime, datetime) -- Start and end time, in UTC
+    """
+    now = CYCLE_START or datetime.utcnow().replace(second=0, microsecond=0)
+    start_time = now - timedelta(minutes=lookback_window_start)
+    end_time = now - timedelta(
+        minutes=lookback_window_start - lookback_period)
+
+    return start_time, end_time
+
+
+def __get_metric_data(queries, start_time, end_time, period):
+    """ Fetch the Sum of DynamoDB metrics with GetMetricData
+
+    boto does not implement GetMetricData, so the request is made and the
+    response parsed here.
+
+    :type queries: list
+    :param queries: List of tuples (table_name, gsi_name, metric_name)
+    :type start_time: datetime
+    :param start_time: Start of the window, in UTC
+    :type end_time: datetime
+    :param end_time: End of the window, in UTC
+    :type period: int
+    :param period: Period in seconds
+    :returns: list -- Datapoints for each metric, in the same order and in
+        the same format as get_metric_statistics returns them
+    """
+    params = {
+        'StartTime': start_time.strftime(ISO8601),
+        'EndTime': end_time.strftime(ISO8601)
+    }
+    for i, (table_name, gsi_name, metric_name) in enumerate(queries, 1):
+        prefix = 'MetricDataQueries.member.{0:d}.'.format(i)
+        params[prefix + 'Id'] = 'm{0:d}'.format(i)
+        params[prefix + 'ReturnData'] = 'true'
+        params[prefix + 'MetricStat.Period'] = period
+        params[prefix + 'MetricStat.Stat'] = 'Sum'
+        params[prefix + 'MetricStat.Unit'] = 'Count'
+        params[prefix + 'MetricStat.Metric.Namespace'] = 'AWS/DynamoDB'
+        params[prefix + 'MetricStat.Metric.MetricName'] = metric_name
+
+        dimensions = [('TableName', table_name)]
+        if gsi_name:
+            dimensions.append(('GlobalSecondaryIndexName', gsi_name))
+        for j, (name, value) in enumerate(dimensions, 1):
+            dimension = '{0}MetricStat.Metric.Dimensions.member.{1:d}.'.format(
+                prefix, j)
+            params[dimension + 'Name'] = name
+            params[dimension + 'Value'] = value
+
+    datapoints = defaultdict(list)
+    while True:
+        with metrics.aws_request('cloudwatch', 'GetMetricData'):
+            response = get_connection().make_request(
+                'GetMetricData', params, verb='POST')
+            body = response.read()
+            if response.status != 200:
+                raise BotoServerError(response.status, response.reason, body)
+
+        root = ElementTree.fromstring(body)
+        next_token = None
+        for element in root.iter():
+            tag = element.tag.rsplit('}', 1)[-1]
+            if tag == 'NextToken':
+                next_token = element.text
+            elif tag == 'MetricDataResults':
+                for result in element:
+                    __parse_metric_data_result(result, datapoints)
+
+        if not next_token:
+            break
+        params['NextToken'] = next_token
+
+    return [
+        sorted(datapoints['m{0:d}'.format(i)], key=lambda x: x['Timestamp'])
+        for i in range(1, len(queries) + 1)
+    ]
+
+
+def __parse_metric_data_result(result, datapoints):
+    """ Add the datapoints of a GetMetricData result member
+
+    :type result: xml.etree.ElementTree.Element
+    :param result: A MetricDataResults member
+    :type datapoints: dict
+    :param datapoints: Datapoints by query id, updated in place
+    """
+    children = dict(
+        (child.tag.rsplit('}', 1)[-1], child) for child in result)
+
+    timestamps = [
+        parse_ts(member.text) for member in children.get('Timestamps', [])]
+    values = [
+        float(member.text) for member in children.get('Values', [])]
+
+    for timestamp, value in zip(timestamps, values):
+        datapoints[children['Id'].text].append({
+            'Timestamp': timestamp,
+            'Sum': value,
+            'Unit': 'Count'
+        })
 
 
 def __get_connection_cloudwatch():
@@ -34,6 +360,3 @@ def __get_connection_cloudwatch():
 
     logger.debug('Connected to CloudWatch in {0}'.format(region))
     return connection
-
-
-CLOUDWATCH_CONNECTION = __get_connection_cloudwatch()
@@ -1,21 +1,48 @@
 # -*- coding: utf-8 -*-
 """ Handle most tasks related to DynamoDB interaction """
-import re
 import sys
 import time
 import datetime
+import threading
 
 from boto import dynamodb2
 from boto.dynamodb2.table import Table
 from boto.exception import DynamoDBResponseError, JSONResponseError
 
+from dynamic_dynamodb import metrics, timing
 from dynamic_dynamodb.log_handler import LOGGER as logger
 from dynamic_dynamodb.config_handler import (
-    get_configured_tables,
     get_global_option,
     get_gsi_option,
+    get_table_matcher,
     get_table_option)
 from dynamic_dynamodb.aws import sns
+from dynamic_dynamodb.core import controller
+
+# Per thread DynamoDB connections, created on first use
+CONNECTIONS = threading.local()
+
+# Incremented by reset_connection() to make all threads reconnect
+CONNECTION_GENERATION = 0
+
+# Table descriptions fetched during the current check cycle
+TABLE_DESCRIPTIONS = {}
+
+# Table names found by the last listing, when it was made and the
+# prefixes it was limited to
+TABLE_NAMES = None
+TABLE_NAMES_UPDATED = 0
+TABLE_NAMES_PREFIXES = None
+
+# ExclusiveStartTableName must be at least this long
+MIN_TABLE_NAME_LENGTH = 3
+
+# Error codes returned by AWS when temporary credentials have expired
+EXPIRED_CREDENTIALS_ERRORS = [
+    'ExpiredToken',
+    'ExpiredTokenException',
+    'RequestExpired'
+]
 
 
 def get_tables_and_gsis():
@@ -24,38 +51,25 @@ def get_tables_and_gsis():
     :returns: set -- A set of tuples (table_name, table_conf_key)
     """
     table_names = set()
-    configured_tables = get_configured_tables()
-    not_used_tables = set(configured_tables)
+    matcher = get_table_matcher()
+    not_used_tables = set(matcher.keys)
 
     # Add regexp table names
-    for table_instance in list_tables():
-        for key_name in configured_tables:
-            try:
-                if re.match(key_name, table_instance.table_name):
-                    logger.debug("Table {0} match with config key {1}".format(
-                        table_instance.table_name, key_name))
-
-                    # Notify users about regexps that match multiple tables
-                    if table_instance.table_name in [x[0] for x in table_names]:
-                        logger.warning(
-                            'Table {0} matches more than one regexp in config, '
-                            'skipping this match: "{1}"'.format(
-                                table_instance.table_name, key_name))
-                    else:
-                        table_names.add(
-                            (
-                                table_instance.table_name,
-                                key_name
-                            ))
-                        not_used_tables.discard(key_name)
-                else:
-                    logger.debug(
-                        "Table {0} did not match with config key {1}".format(
-                            table_instance.table_name, key_name))
-            except re.error:
-                logger.error('Invalid regular expression: "{0}"'.format(
-                    key_name))
-                sys.exit(1)
+    for table_name in get_table_names():
+        key_names = matcher.match(table_name)
+        if not key_names:
+            continue
+
+        logger.debug("Table {0} match with config key {1}".format(
+            table_name, key_names[0]))
+        table_names.add((table_name, key_names[0]))
+        not_used_tables.discard(key_names[0])
+
+        # Notify users about regexps that match multiple tables
+        for key_name in key_names[1:]:
+            logger.warning(
+                'Table {0} matches more than one regexp in config, '
+                'skipping this match: "{1}"'.format(table_name, key_name))
 
     if not_used_tables:
         logger.warning(
@@ -65,6 +79,15 @@ def get_tables_and_gsis():
     return sorted(table_names)
 
 
+def clear_table_descriptions():
+    """ Forget all cached table descriptions
+
+    Called at the start of every check cycle so that each table is
+    described at most once per cycle.
+    """
+    TABLE_DESCRIPTIONS.clear()
+
+
 def get_table(table_name):
     """ Return the DynamoDB table
 
@@ -73,7 +96,7 @@ def get_table(table_name):
     :returns: boto.dynamodb.table.Table
     """
     try:
-        table = Table(table_name, connection=DYNAMODB_CONNECTION)
+        table = Table(table_name, connection=get_connection())
     except DynamoDBResponseError as error:
         dynamodb_error = error.body['__type'].rsplit('#', 1)[1]
         if dynamodb_error == 'ResourceNotFoundException':
@@ -85,6 +108,31 @@ def get_table(table_name):
     return table
 
 
+def get_connection():
+    """ Return the DynamoDB connection for the current thread
+
+    boto connections are not thread safe, so every thread gets its own.
+    The connection is made the first time a thread asks for it.
+
+    :returns: boto.dynamodb2.layer1.DynamoDBConnection
+    """
+    if getattr(CONNECTIONS, 'generation', None) != CONNECTION_GENERATION:
+        CONNECTIONS.connection = __get_connection_dynamodb()
+        CONNECTIONS.generation = CONNECTION_GENERATION
+
+    return CONNECTIONS.connection
+
+
+def reset_connection():
+    """ Make all threads reconnect to DynamoDB on their next request
+
+    Used when the credentials of the current connections have expired.
+    """
+    global CONNECTION_GENERATION
+
+    CONNECTION_GENERATION += 1
+
+
 def get_gsi_status(table_name, gsi_name):
     """ Return the DynamoDB table
 
@@ -94,12 +142,9 @@ def get_gsi_status(table_name, gsi_name):
     :param gsi_name: Name of the GSI
     :returns: str
     """
-    try:
-        desc = DYNAMODB_CONNECTION.describe_table(table_name)
-    except JSONResponseError:
-        raise
+    desc = __describe_table(table_name)
 
-    for gsi in desc[u'Table'][u'GlobalSecondaryIndexes']:
+    for gsi in desc[u'GlobalSecondaryIndexes']:
         if gsi[u'IndexName'] == gsi_name:
             return gsi[u'IndexStatus']
 
@@ -113,12 +158,9 @@ def get_provisioned_gsi_read_units(table_name, gsi_name):
     :param gsi_name: Name of the GSI
     :returns: int -- Number of read units
     """
-    try:
-        desc = DYNAMODB_CONNECTION.describe_table(table_name)
-    except JSONResponseError:
-        raise
+    desc = __describe_table(table_name)
 
-    for gsi in desc[u'Table'][u'GlobalSecondaryIndexes']:
+    for gsi in desc[u'GlobalSecondaryIndexes']:
         if gsi[u'IndexName'] == gsi_name:
             read_units = int(
                 gsi[u'ProvisionedThroughput'][u'ReadCapacityUnits'])
@@ -139,12 +181,9 @@ def get_provisioned_gsi_write_units(table_name, gsi_name):
     :param gsi_name: Name of the GSI
     :returns: int -- Number of write units
     """
-    try:
-        desc = DYNAMODB_CONNECTION.describe_table(table_name)
-    except JSONResponseError:
-        raise
+    desc = __describe_table(table_name)
 
-    for gsi in desc[u'Table'][u'GlobalSecondaryIndexes']:
+    for gsi in desc[u'GlobalSecondaryIndexes']:
         if gsi[u'IndexName'] == gsi_name:
             write_units = int(
                 gsi[u'ProvisionedThroughput'][u'WriteCapacityUnits'])
@@ -163,13 +202,10 @@ def get_provisioned_table_read_units(table_name):
     :param table_name: Name of the DynamoDB table
     :returns: int -- Number of read units
     """
-    try:
-        desc = DYNAMODB_CONNECTION.describe_table(table_name)
-    except JSONResponseError:
-        raise
+    desc = __describe_table(table_name)
 
     read_units = int(
-        desc[u'Table'][u'ProvisionedThroughput'][u'ReadCapacityUnits'])
+        desc[u'ProvisionedThroughput'][u'ReadCapacityUnits'])
 
     logger.debug('{0} - Currently provisioned read units: {1:d}'.format(
         table_name, read_units))
@@ -183,13 +219,10 @@ def get_provisioned_table_write_units(table_name):
     :param table_name: Name of the DynamoDB table
     :returns: int -- Number of write units
     """
-    try:
-        desc = DYNAMODB_CONNECTION.describe_table(table_name)
-    except JSONResponseError:
-        raise
+    desc = __describe_table(table_name)
 
     write_units = int(
-        desc[u'Table'][u'ProvisionedThroughput'][u'WriteCapacityUnits'])
+        desc[u'ProvisionedThroughput'][u'WriteCapacityUnits'])
 
     logger.debug('{0} - Currently provisioned write units: {1:d}'.format(
         table_name, write_units))
@@ -203,12 +236,9 @@ def get_table_status(table_name):
     :param table_name: Name of the DynamoDB table
     :returns: str
     """
-    try:
-        desc = DYNAMODB_CONNECTION.describe_table(table_name)
-    except JSONResponseError:
-        raise
+    desc = __describe_table(table_name)
 
-    return desc[u'Table'][u'TableStatus']
+    return desc[u'TableStatus']
 
 
 def list_tables():
@@ -216,19 +246,94 @@ def list_tables():
 
     :returns: list -- List of DynamoDB tables
     """
-    tables = []
+    return [get_table(table_name) for table_name in get_table_names()]
 
-    try:
-        table_list = DYNAMODB_CONNECTION.list_tables()
-        while True:
-            for table_name in table_list[u'TableNames']:
-                tables.append(get_table(table_name))
 
-            if u'LastEvaluatedTableName' in table_list:
-                table_list = DYNAMODB_CONNECTION.list_tables(
-                    table_list[u'LastEvaluatedTableName'])
-            else:
-                break
+def get_table_names():
+    """ Return the names of the DynamoDB tables available from AWS
+
+    If every configured table key starts with a literal prefix, only the
+    tables starting with one of those prefixes are listed.
+
+    The names are listed again when table-discovery-interval seconds have
+    passed, the prefixes have changed or invalidate_table_names() has been
+    called. If listing fails, the previous names are kept.
+
+    :returns: list -- Sorted list of table names
+    """
+    global TABLE_NAMES, TABLE_NAMES_UPDATED, TABLE_NAMES_PREFIXES
+
+    prefixes = get_table_matcher().prefixes
+    interval = get_global_option('table_discovery_interval')
+    if (TABLE_NAMES is not None and
+            prefixes == TABLE_NAMES_PREFIXES and
+            time.time() - TABLE_NAMES_UPDATED < interval):
+        return TABLE_NAMES
+
+    table_names = list_table_names(prefixes=prefixes)
+    if table_names is None:
+        return TABLE_NAMES or []
+
+    table_names = sorted(table_names)
+    if TABLE_NAMES is not None and prefixes == TABLE_NAMES_PREFIXES:
+        added = set(table_names) - set(TABLE_NAMES)
+        removed = set(TABLE_NAMES) - set(table_names)
+        if added:
+            logger.info('New tables found: {0}'.format(
+                ', '.join(sorted(added))))
+        if removed:
+            logger.info('Tables removed: {0}'.format(
+                ', '.join(sorted(removed))))
+            for table_name in removed:
+                metrics.forget_table(table_name)
+                controller.forget_table(table_name)
+
+    TABLE_NAMES = table_names
+    TABLE_NAMES_UPDATED = time.time()
+    TABLE_NAMES_PREFIXES = prefixes
+
+    return TABLE_NAMES
+
+
+def invalidate_table_names():
+    """ List the tables again the next time the names are requested
+
+    Called when a table was not found, as it may have been deleted.
+    """
+    global TABLE_NAMES_UPDATED
+
+    TABLE_NAMES_UPDATED = 0
+
+
+def list_table_names(reconnect=True, prefixes=None):
+    """ List the names of the DynamoDB tables available from AWS
+
+    :type reconnect: bool
+    :param reconnect: Reconnect and retry once if the credentials expired
+    :type prefixes: list
+    :param prefixes: Sorted table name prefixes, none starting with
+        another. Only tables starting with one of them are listed. None
+        lists all tables.
+    :returns: list -- List of table names, None if the tables could not
+        be listed
+    """
+    table_names = []
+
+    try:
+        if prefixes is None:
+            with metrics.aws_request('dynamodb', 'ListTables'):
+                table_list = get_connection().list_tables()
+            while True:
+                table_names.extend(table_list[u'TableNames'])
+
+                if u'LastEvaluatedTableName' in table_list:
+                    with metrics.aws_request('dynamodb', 'ListTables'):
+                        table_list = get_connection().list_tables(
+                            table_list[u'LastEvaluatedTableName'])
+                else:
+                    break
+        else:
+            table_names = __list_table_names_by_prefix(prefixes)
 
     except DynamoDBResponseError as error:
         dynamodb_error = error.body['__type'].rsplit('#', 1)[1]
@@ -253,11 +358,70 @@ def list_tables():
                     dynamodb_error,
                     error.body['message']))
 
+        return None
+
     except JSONResponseError as error:
+        if reconnect and error.error_code in EXPIRED_CREDENTIALS_ERRORS:
+            logger.warning('AWS credentials have expired, reconnecting')
+            reset_connection()
+            return list_table_names(reconnect=False, prefixes=prefixes)
+
         logger.error('Communication error: {0}'.format(error))
         sys.exit(1)
 
-    return tables
+    return table_names
+
+
+def __list_table_names_by_prefix(prefixes):
+    """ List the tables starting with any of the prefixes
+
+    ListTables returns the names in alphabetical order, so the listing
+    starts right before each prefix and stops at the first name past it.
+    Pages that cover several prefixes are only fetched once.
+
+    :type prefixes: list
+    :param prefixes: Sorted table name prefixes, none starting with another
+    :returns: list -- Sorted list of table names
+    """
+    table_names = []
+    page = []
+    last_name = None
+    last_page = False
+    requests = 0
+
+    for prefix in prefixes:
+        while True:
+            past_prefix = False
+            for table_name in page:
+                if table_name.startswith(prefix):
+                    table_names.append(table_name)
+                elif table_name > prefix:
+                    past_prefix = True
+                    break
+
+            if past_prefix or last_page:
+                break
+
+            # Seek ahead if the prefix is not on the next page anyway
+            start_name = last_name
+            seek_name = prefix[:-1]
+            if (len(seek_name) >= MIN_TABLE_NAME_LENGTH and
+                    (start_name is None or seek_name > start_name)):
+                start_name = seek_name
+
+            with metrics.aws_request('dynamodb', 'ListTables'):
+                table_list = get_connection().list_tables(start_name)
+            requests += 1
+            page = table_list[u'TableNames']
+            if u'LastEvaluatedTableName' in table_list:
+                last_name = table_list[u'LastEvaluatedTableName']
+            else:
+                last_page = True
+
+    logger.debug(
+        'Listed {0:d} tables matching {1:d} prefixes in {2:d} '
+        'requests'.format(len(table_names), len(prefixes), requests))
+    return table_names
 
 
 def update_table_provisioning(
@@ -274,6 +438,8 @@ def update_table_provisioning(
     :param writes: New number of provisioned write units
     :type retry_with_only_increase: bool
     :param retry_with_only_increase: Set to True to ensure only increases
+    :returns: (int, int) -- The reads and writes set, None if the
+        provisioning was not changed
     """
     table = get_table(table_name)
     current_reads = int(get_provisioned_table_read_units(table_name))
@@ -350,11 +516,15 @@ def update_table_provisioning(
         return
 
     try:
-        table.update(
-            throughput={
-                'read': reads,
-                'write': writes
-            })
+        with metrics.aws_request('dynamodb', 'UpdateTable'):
+            table.update(
+                throughput={
+                    'read': reads,
+                    'write': writes
+                })
+        TABLE_DESCRIPTIONS.pop(table_name, None)
+        metrics.count_scaling(
+            table_name, None, current_reads, reads, current_writes, writes)
 
         # See if we should send notifications for scale-down, scale-up or both
         sns_message_types = []
@@ -382,6 +552,8 @@ def update_table_provisioning(
             ''.join(message),
             sns_message_types,
             subject='Updated provisioning for table {0}'.format(table_name))
+
+        return reads, writes
     except JSONResponseError as error:
         exception = error.body['__type'].split('#')[1]
         know_exceptions = [
@@ -410,7 +582,7 @@ def update_table_provisioning(
             logger.info(
                 '{0} - Will retry to update provisioning '
                 'with only increases'.format(table_name))
-            update_table_provisioning(
+            return update_table_provisioning(
                 table_name,
                 key_name,
                 reads,
@@ -437,6 +609,8 @@ def update_gsi_provisioning(
     :param writes: Number of writes to provision
     :type retry_with_only_increase: bool
     :param retry_with_only_increase: Set to True to ensure only increases
+    :returns: (int, int) -- The reads and writes set, None if the
+        provisioning was not changed
     """
     current_reads = int(get_provisioned_gsi_read_units(table_name, gsi_name))
     current_writes = int(get_provisioned_gsi_write_units(table_name, gsi_name))
@@ -523,19 +697,24 @@ def update_gsi_provisioning(
         return
 
     try:
-        DYNAMODB_CONNECTION.update_table(
-            table_name=table_name,
-            global_secondary_index_updates=[
-                {
-                    "Update": {
-                        "IndexName": gsi_name,
-                        "ProvisionedThroughput": {
-                            "ReadCapacityUnits": reads,
-                            "WriteCapacityUnits": writes
+        with metrics.aws_request('dynamodb', 'UpdateTable'):
+            get_connection().update_table(
+                table_name=table_name,
+                global_secondary_index_updates=[
+                    {
+                        "Update": {
+                            "IndexName": gsi_name,
+                            "ProvisionedThroughput": {
+                                "ReadCapacityUnits": reads,
+                                "WriteCapacityUnits": writes
+                            }
                         }
                     }
-                }
-            ])
+                ])
+        TABLE_DESCRIPTIONS.pop(table_name, None)
+        metrics.count_scaling(
+            table_name, gsi_name, current_reads, reads,
+            current_writes, writes)
 
         message = []
         if current_reads > reads:
@@ -569,6 +748,7 @@ def update_gsi_provisioning(
             sns_message_types,
             subject='Updated provisioning for GSI {0}'.format(gsi_name))
 
+        return reads, writes
     except JSONResponseError as error:
         exception = error.body['__type'].split('#')[1]
         know_exceptions = ['LimitExceededException']
@@ -589,7 +769,7 @@ def update_gsi_provisioning(
             logger.info(
                 '{0} - GSI: {1} - Will retry to update provisioning '
                 'with only increases'.format(table_name, gsi_name))
-            update_gsi_provisioning(
+            return update_gsi_provisioning(
                 table_name,
                 table_key,
                 gsi_name,
@@ -606,10 +786,7 @@ def table_gsis(table_name):
     :param table_name: Name of the DynamoDB table
     :returns: list -- List of GSI names
     """
-    try:
-        desc = DYNAMODB_CONNECTION.describe_table(table_name)[u'Table']
-    except JSONResponseError:
-        raise
+    desc = __describe_table(table_name)
 
     if u'GlobalSecondaryIndexes' in desc:
         return desc[u'GlobalSecondaryIndexes']
@@ -617,6 +794,29 @@ def table_gsis(table_name):
     return []
 
 
+def __describe_table(table_name):
+    """ Return the description of a table
+
+    The description is fetched once per check cycle and kept in
+    TABLE_DESCRIPTIONS until the cycle ends or the table is updated.
+
+    :type table_name: str
+    :param table_name: Name of the DynamoDB table
+    :returns: dict -- The Table part of the DescribeTable response
+    """
+    try:
+        return TABLE_DESCRIPTIONS[table_name]
+    except KeyError:
+        pass
+
+    with timing.phase('describe_table'):
+        with metrics.aws_request('dynamodb', 'DescribeTable'):
+            desc = get_connection().describe_table(table_name)[u'Table']
+    TABLE_DESCRIPTIONS[table_name] = desc
+
+    return desc
+
+
 def __get_connection_dynamodb(retries=3):
     """ Ensure connection to DynamoDB
 
@@ -721,5 +921,3 @@ def __is_table_maintenance_window(table_name, maintenance_windows):
             return True
 
     return False
-
-DYNAMODB_CONNECTION = __get_connection_dynamodb()
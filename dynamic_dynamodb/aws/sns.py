@@ -1,12 +1,78 @@
 # -*- coding: utf-8 -*-
 """ Handles SNS connection and communication """
+import Queue
+import threading
+
 from boto import sns
 from boto.exception import BotoServerError
+from dynamic_dynamodb import metrics
 
 from dynamic_dynamodb.log_handler import LOGGER as logger
 from dynamic_dynamodb.config_handler import (
     get_gsi_option, get_table_option, get_global_option)
 
+# Per thread SNS connections, created on first use
+CONNECTIONS = threading.local()
+
+# Incremented by reset_connection() to make all threads reconnect
+CONNECTION_GENERATION = 0
+
+# Most messages buffered during a check cycle, later ones are dropped
+MAX_BUFFERED_MESSAGES = 1000
+
+# Most messages sent in one digest
+MAX_DIGEST_MESSAGES = 100
+
+# Most digests waiting to be published, later ones are dropped
+MAX_QUEUED_DIGESTS = 100
+
+# Messages buffered during the check cycle, (topic, message type) ->
+# list of (subject, message)
+MESSAGES = {}
+MESSAGES_COUNT = 0
+MESSAGES_LOCK = threading.Lock()
+
+# Digests waiting for the publisher thread
+DIGESTS = Queue.Queue(MAX_QUEUED_DIGESTS)
+PUBLISHER = None
+
+# Notification counters
+STATS = {
+    'buffered': 0,
+    'dropped': 0,
+    'overflow': 0,
+    'published': 0,
+    'failed': 0
+}
+
+# (dropped, overflow) when messages were last reported as lost
+LOST_REPORTED = (0, 0)
+
+
+def get_connection():
+    """ Return the SNS connection for the current thread
+
+    boto connections are not thread safe, so every thread gets its own.
+    The connection is made the first time a thread asks for it.
+
+    :returns: boto.sns.SNSConnection
+    """
+    if getattr(CONNECTIONS, 'generation', None) != CONNECTION_GENERATION:
+        CONNECTIONS.connection = __get_connection_SNS()
+        CONNECTIONS.generation = CONNECTION_GENERATION
+
+    return CONNECTIONS.connection
+
+
+def reset_connection():
+    """ Make all threads reconnect to SNS on their next request
+
+    Used when the credentials of the current connections have expired.
+    """
+    global CONNECTION_GENERATION
+
+    CONNECTION_GENERATION += 1
+
 
 def publish_gsi_notification(
         table_key, gsi_key, message, message_types, subject=None):
@@ -36,7 +102,7 @@ def publish_gsi_notification(
     for message_type in message_types:
         if (message_type in
                 get_gsi_option(table_key, gsi_key, 'sns_message_types')):
-            __publish(topic, message, subject)
+            __publish(topic, message, subject, message_type)
             return
 
 
@@ -64,12 +130,63 @@ def publish_table_notification(table_key, message, message_types, subject=None):
 
     for message_type in message_types:
         if message_type in get_table_option(table_key, 'sns_message_types'):
-            __publish(topic, message, subject)
+            __publish(topic, message, subject, message_type)
             return
 
 
-def __publish(topic, message, subject=None):
-    """ Publish a message to a SNS topic
+def flush_notifications(wait=False):
+    """ Hand the messages of the check cycle to the publisher thread
+
+    Messages for the same topic and message type are sent as one digest.
+
+    :type wait: bool
+    :param wait: Wait until all digests have been published
+    """
+    global MESSAGES, MESSAGES_COUNT, PUBLISHER, LOST_REPORTED
+
+    with MESSAGES_LOCK:
+        messages = MESSAGES
+        MESSAGES = {}
+        MESSAGES_COUNT = 0
+
+    # Start the publisher, or a new one if an earlier one has died
+    if messages and (PUBLISHER is None or not PUBLISHER.is_alive()):
+        PUBLISHER = threading.Thread(
+            target=__run_publisher, name='sns-publisher')
+        PUBLISHER.daemon = True
+        PUBLISHER.start()
+
+    for (topic, message_type), items in sorted(messages.items()):
+        for i in range(0, len(items), MAX_DIGEST_MESSAGES):
+            try:
+                DIGESTS.put_nowait(
+                    (topic, message_type, items[i:i + MAX_DIGEST_MESSAGES]))
+            except Queue.Full:
+                STATS['overflow'] += len(items[i:i + MAX_DIGEST_MESSAGES])
+
+    lost = (STATS['dropped'], STATS['overflow'])
+    if lost != LOST_REPORTED:
+        logger.warning(
+            'SNS notifications not sent so far: {dropped:d} dropped, '
+            '{overflow:d} overflowed'.format(**STATS))
+        LOST_REPORTED = lost
+
+    if wait and PUBLISHER is not None:
+        DIGESTS.join()
+
+
+def get_notification_stats():
+    """ Return the notification counters
+
+    :returns: dict -- Messages buffered, dropped when the cycle buffer was
+        full, dropped when the publisher queue was full, published and
+        failed to publish
+    """
+    return dict(STATS)
+
+
+def __publish(topic, message, subject=None, message_type=None):
+    """ Buffer a message for a SNS topic until the end of the check cycle
 
     :type topic: str
     :param topic: SNS topic to publish the message to
@@ -77,17 +194,73 @@ def __publish(topic, message, subject=None):
     :param message: Message to send via SNS
     :type subject: str
     :param subject: Subject to use for e-mail notifications
+    :type message_type: str
+    :param message_type: Message type, used to group the digests
     :returns: None
     """
+    global MESSAGES_COUNT
+
+    with MESSAGES_LOCK:
+        if MESSAGES_COUNT >= MAX_BUFFERED_MESSAGES:
+            STATS['dropped'] += 1
+            return
+
+        MESSAGES.setdefault((topic, message_type), []).append(
+            (subject, message))
+        MESSAGES_COUNT += 1
+        STATS['buffered'] += 1
+
+    return
+
+
+def __run_publisher():
+    """ Publish the digests queued by flush_notifications() """
+    while True:
+        topic, message_type, items = DIGESTS.get()
+        try:
+            __publish_digest(topic, message_type, items)
+        except Exception:
+            # Keep the publisher alive, or the digests of all later cycles
+            # would be stuck in the queue
+            STATS['failed'] += len(items)
+            logger.exception(
+                'Problem sending SNS notification to {0}'.format(topic))
+        finally:
+            DIGESTS.task_done()
+
+
+def __publish_digest(topic, message_type, items):
+    """ Publish a digest of messages to a SNS topic
+
+    A single message is sent with its own subject.
+
+    :type topic: str
+    :param topic: SNS topic to publish the message to
+    :type message_type: str
+    :param message_type: Message type of all messages
+    :type items: list
+    :param items: List of tuples (subject, message)
+    """
+    if len(items) == 1:
+        subject, message = items[0]
+    else:
+        subject = 'Dynamic DynamoDB: {0:d} {1} notifications'.format(
+            len(items), message_type)
+        message = '\n'.join(
+            '{0}\n{1}'.format(item_subject, item_message)
+            for item_subject, item_message in items)
+
     try:
-        SNS_CONNECTION.publish(topic=topic, message=message, subject=subject)
+        with metrics.aws_request('sns', 'Publish'):
+            get_connection().publish(
+                topic=topic, message=message, subject=subject)
+        STATS['published'] += len(items)
         logger.info('Sent SNS notification to {0}'.format(topic))
     except BotoServerError as error:
+        STATS['failed'] += len(items)
         logger.error('Problem sending SNS notification: {0}'.format(
             error.message))
 
-    return
-
 
 def __get_connection_SNS():
     """ Ensure connection to SNS """
@@ -119,5 +292,3 @@ def __get_connection_SNS():
 
     logger.debug('Connected to SNS in {0}'.format(region))
     return connection
-
-SNS_CONNECTION = __get_connection_SNS()
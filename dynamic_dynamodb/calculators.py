@@ -1,7 +1,18 @@
 # -*- coding: utf-8 -*-
-""" General approach to calucations """
+""" General approach to calucations
+
+The *_batch functions compute the new provisioning of many tables or GSIs
+at once, for simulations and fleet wide reports. They take NumPy arrays,
+return the same values as the scalar functions and do not log. NumPy is
+only needed for the batch functions.
+"""
 import math
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from dynamic_dynamodb.log_handler import LOGGER as logger
 
 
@@ -256,10 +267,58 @@ def increase_reads_in_units(
 
     return updated_provisioning
 
+def increase_reads_to_target(
+        current_provisioning, target_utilization, max_provisioned_reads,
+        consumed_read_units_percent, log_tag):
+    """ Increase the current_provisioning to reach the target utilisation
+
+    The consumed units are divided by the target utilisation, so the
+    provisioning needed is reached in one update.
+
+    :type current_provisioning: int
+    :param current_provisioning: The current provisioning
+    :type target_utilization: int
+    :param target_utilization: Percent of the provisioning to consume
+    :type max_provisioned_reads: int
+    :param max_provisioned_reads: Configured max provisioned reads
+    :type consumed_read_units_percent: float
+    :param consumed_read_units_percent: Number of consumed read units
+    :type log_tag: str
+    :param log_tag: Prefix for the log
+    :returns: int -- New provisioning value
+    """
+    updated_provisioning = max(
+        int(math.ceil(
+            float(current_provisioning) *
+            float(consumed_read_units_percent) /
+            float(target_utilization))),
+        int(current_provisioning))
+
+    if max_provisioned_reads > 0:
+        if updated_provisioning > max_provisioned_reads:
+            logger.warning(
+                '{0} - Reached provisioned reads max limit: {1}'.format(
+                    log_tag,
+                    max_provisioned_reads))
+
+            return max_provisioned_reads
+
+    logger.debug(
+        '{0} - Read provisioning will be increased to {1:d} units to '
+        'reach {2}% utilisation'.format(
+            log_tag,
+            updated_provisioning,
+            target_utilization))
+
+    return updated_provisioning
+
 def  increase_reads(_units, current_provisioning, _increaseto, max_provisioned_reads, consumed_read_units_percent, log_tag):
   if _units == "percent":
     return increase_reads_in_percent(current_provisioning, _increaseto, max_provisioned_reads, consumed_read_units_percent, log_tag)
 
+  elif _units == "target":
+    return increase_reads_to_target(current_provisioning, _increaseto, max_provisioned_reads, consumed_read_units_percent, log_tag)
+
   else:
     return increase_reads_in_units(current_provisioning, _increaseto, max_provisioned_reads, consumed_read_units_percent, log_tag)
 
@@ -355,10 +414,58 @@ def increase_writes_in_units(
 
     return updated_provisioning
 
+def increase_writes_to_target(
+        current_provisioning, target_utilization, max_provisioned_writes,
+        consumed_write_units_percent, log_tag):
+    """ Increase the current_provisioning to reach the target utilisation
+
+    The consumed units are divided by the target utilisation, so the
+    provisioning needed is reached in one update.
+
+    :type current_provisioning: int
+    :param current_provisioning: The current provisioning
+    :type target_utilization: int
+    :param target_utilization: Percent of the provisioning to consume
+    :type max_provisioned_writes: int
+    :param max_provisioned_writes: Configured max provisioned writes
+    :type consumed_write_units_percent: float
+    :param consumed_write_units_percent: Number of consumed write units
+    :type log_tag: str
+    :param log_tag: Prefix for the log
+    :returns: int -- New provisioning value
+    """
+    updated_provisioning = max(
+        int(math.ceil(
+            float(current_provisioning) *
+            float(consumed_write_units_percent) /
+            float(target_utilization))),
+        int(current_provisioning))
+
+    if max_provisioned_writes > 0:
+        if updated_provisioning > max_provisioned_writes:
+            logger.warning(
+                '{0} - Reached provisioned writes max limit: {1}'.format(
+                    log_tag,
+                    max_provisioned_writes))
+
+            return max_provisioned_writes
+
+    logger.debug(
+        '{0} - Write provisioning will be increased to {1:d} units to '
+        'reach {2}% utilisation'.format(
+            log_tag,
+            updated_provisioning,
+            target_utilization))
+
+    return updated_provisioning
+
 def increase_writes(_units, _provisioned, _increaseto, _maxprovisioned, _concumed_writes_inpercent, _tag):
   if _units == "percent":
     return increase_writes_in_percent(_provisioned, _increaseto, _maxprovisioned, _concumed_writes_inpercent, _tag)
 
+  elif _units == "target":
+    return increase_writes_to_target(_provisioned, _increaseto, _maxprovisioned, _concumed_writes_inpercent, _tag)
+
   else:
     return increase_writes_in_units(_provisioned, _increaseto, _maxprovisioned, _concumed_writes_inpercent, _tag)
 
@@ -381,6 +488,180 @@ def is_consumed_over_proposed(
     return l_consumed_capacity > proposed_provisioning
 
 
+def decrease_reads_batch(
+        units, current_provisioning, decrease_with, min_provisioned_reads):
+    """ Decrease the read provisioning of many tables or GSIs
+
+    Same as decrease_reads() for each element of the arrays.
+
+    :type units: str or numpy.ndarray
+    :param units: 'percent' or 'units', for all or for each element
+    :type current_provisioning: numpy.ndarray
+    :param current_provisioning: The current provisioning
+    :type decrease_with: numpy.ndarray
+    :param decrease_with: How many percent or units to decrease with
+    :type min_provisioned_reads: numpy.ndarray
+    :param min_provisioned_reads: Configured min provisioned reads, 0 or None
+        if not set
+    :returns: numpy.ndarray -- New provisioning values
+    """
+    return __decrease_batch(
+        units, current_provisioning, decrease_with, min_provisioned_reads)
+
+
+def decrease_writes_batch(
+        units, current_provisioning, decrease_with, min_provisioned_writes):
+    """ Decrease the write provisioning of many tables or GSIs
+
+    Same as decrease_writes() for each element of the arrays.
+
+    :type units: str or numpy.ndarray
+    :param units: 'percent' or 'units', for all or for each element
+    :type current_provisioning: numpy.ndarray
+    :param current_provisioning: The current provisioning
+    :type decrease_with: numpy.ndarray
+    :param decrease_with: How many percent or units to decrease with
+    :type min_provisioned_writes: numpy.ndarray
+    :param min_provisioned_writes: Configured min provisioned writes, 0 or None
+        if not set
+    :returns: numpy.ndarray -- New provisioning values
+    """
+    return __decrease_batch(
+        units, current_provisioning, decrease_with, min_provisioned_writes)
+
+
+def increase_reads_batch(
+        units, current_provisioning, increase_with, max_provisioned_reads,
+        consumed_read_units_percent):
+    """ Increase the read provisioning of many tables or GSIs
+
+    Same as increase_reads() for each element of the arrays.
+
+    :type units: str or numpy.ndarray
+    :param units: 'percent', 'units' or 'target', for all or for each
+        element
+    :type current_provisioning: numpy.ndarray
+    :param current_provisioning: The current provisioning
+    :type increase_with: numpy.ndarray
+    :param increase_with: How many percent or units to increase with,
+        or the target utilisation
+    :type max_provisioned_reads: numpy.ndarray
+    :param max_provisioned_reads: Configured max provisioned reads, 0 or None
+        if not set
+    :type consumed_read_units_percent: numpy.ndarray
+    :param consumed_read_units_percent: Percent of consumed read units
+    :returns: numpy.ndarray -- New provisioning values
+    """
+    __check_numpy()
+    current_provisioning = numpy.asarray(current_provisioning, dtype=float)
+    increase_with = numpy.asarray(increase_with, dtype=float)
+    max_provisioned_reads = numpy.nan_to_num(
+        numpy.asarray(max_provisioned_reads, dtype=float))
+    consumed_read_units_percent = numpy.asarray(
+        consumed_read_units_percent, dtype=float)
+
+    # increase_reads_in_percent
+    consumption_based = numpy.ceil(
+        current_provisioning * (consumed_read_units_percent / 100))
+    base = numpy.where(
+        consumption_based > current_provisioning,
+        consumption_based,
+        current_provisioning)
+    in_percent = base + numpy.ceil(base * (increase_with / 100))
+
+    # increase_reads_in_units
+    in_units = __units_base(
+        current_provisioning, consumed_read_units_percent) + \
+        numpy.trunc(increase_with)
+
+    units = numpy.asarray(units)
+    updated_provisioning = numpy.where(
+        units == 'percent',
+        in_percent,
+        numpy.where(
+            units == 'target',
+            __target_batch(
+                current_provisioning,
+                increase_with,
+                consumed_read_units_percent),
+            in_units))
+
+    return numpy.where(
+        (max_provisioned_reads > 0) &
+        (updated_provisioning > max_provisioned_reads),
+        max_provisioned_reads,
+        updated_provisioning)
+
+
+def increase_writes_batch(
+        units, current_provisioning, increase_with, max_provisioned_writes,
+        consumed_write_units_percent):
+    """ Increase the write provisioning of many tables or GSIs
+
+    Same as increase_writes() for each element of the arrays.
+
+    :type units: str or numpy.ndarray
+    :param units: 'percent', 'units' or 'target', for all or for each
+        element
+    :type current_provisioning: numpy.ndarray
+    :param current_provisioning: The current provisioning
+    :type increase_with: numpy.ndarray
+    :param increase_with: How many percent or units to increase with,
+        or the target utilisation
+    :type max_provisioned_writes: numpy.ndarray
+    :param max_provisioned_writes: Configured max provisioned writes, 0 or None
+        if not set
+    :type consumed_write_units_percent: numpy.ndarray
+    :param consumed_write_units_percent: Percent of consumed write units
+    :returns: numpy.ndarray -- New provisioning values
+    """
+    __check_numpy()
+    current_provisioning = numpy.asarray(current_provisioning, dtype=float)
+    increase_with = numpy.asarray(increase_with, dtype=float)
+    max_provisioned_writes = numpy.nan_to_num(
+        numpy.asarray(max_provisioned_writes, dtype=float))
+    consumed_write_units_percent = numpy.asarray(
+        consumed_write_units_percent, dtype=float)
+    in_percent_units = numpy.asarray(units) == 'percent'
+
+    # increase_writes_in_percent
+    consumption_based = numpy.ceil(
+        current_provisioning * consumed_write_units_percent / 100)
+    base = numpy.where(
+        consumption_based > current_provisioning,
+        consumption_based,
+        current_provisioning)
+    in_percent = base + numpy.ceil(base * increase_with / 100)
+
+    # increase_writes_in_units
+    in_units = __units_base(
+        current_provisioning, consumed_write_units_percent) + \
+        numpy.trunc(increase_with)
+
+    updated_provisioning = numpy.where(
+        in_percent_units,
+        in_percent,
+        numpy.where(
+            numpy.asarray(units) == 'target',
+            __target_batch(
+                current_provisioning,
+                increase_with,
+                consumed_write_units_percent),
+            in_units))
+
+    # The percent increase caps at any non-zero max, the units increase
+    # only at a positive one
+    has_max = numpy.where(
+        in_percent_units,
+        max_provisioned_writes != 0,
+        max_provisioned_writes > 0)
+
+    return numpy.where(
+        has_max & (updated_provisioning > max_provisioned_writes),
+        max_provisioned_writes,
+        updated_provisioning)
+
+
 def __get_min_reads(current_provisioning, min_provisioned_reads, log_tag):
     """ Get the minimum number of reads to current_provisioning
 
@@ -441,3 +722,98 @@ def __get_min_writes(current_provisioning, min_provisioned_writes, log_tag):
             log_tag, min_provisioned_writes))
 
     return writes
+
+
+def __check_numpy():
+    """ Make sure that NumPy is available for the batch functions """
+    if numpy is None:
+        raise ImportError(
+            'NumPy is required for the batch calculators, '
+            'install it with: pip install numpy')
+
+
+def __decrease_batch(
+        units, current_provisioning, decrease_with, min_provisioned):
+    """ Decrease the provisioning of many tables or GSIs
+
+    The read and write decreases are calculated the same way.
+
+    :type units: str or numpy.ndarray
+    :param units: 'percent' or 'units', for all or for each element
+    :type current_provisioning: numpy.ndarray
+    :param current_provisioning: The current provisioning
+    :type decrease_with: numpy.ndarray
+    :param decrease_with: How many percent or units to decrease with
+    :type min_provisioned: numpy.ndarray
+    :param min_provisioned: Configured min provisioning, 0 or None if
+        not set
+    :returns: numpy.ndarray -- New provisioning values
+    """
+    __check_numpy()
+    current_provisioning = numpy.asarray(current_provisioning, dtype=float)
+    decrease_with = numpy.asarray(decrease_with, dtype=float)
+    min_provisioned = numpy.nan_to_num(
+        numpy.asarray(min_provisioned, dtype=float))
+
+    updated_provisioning = numpy.where(
+        numpy.asarray(units) == 'percent',
+        current_provisioning -
+        numpy.trunc(current_provisioning * (decrease_with / 100)),
+        numpy.trunc(current_provisioning) - numpy.trunc(decrease_with))
+
+    # Same as __get_min_reads() and __get_min_writes()
+    max_scale_up = numpy.trunc(current_provisioning * 2)
+    minimum = numpy.where(
+        min_provisioned != 0,
+        numpy.where(
+            numpy.trunc(min_provisioned) > max_scale_up,
+            max_scale_up,
+            numpy.trunc(min_provisioned)),
+        1)
+
+    return numpy.where(
+        updated_provisioning < minimum, minimum, updated_provisioning)
+
+
+def __units_base(current_provisioning, consumed_units_percent):
+    """ Return what the units increases add the units to
+
+    That is the consumed capacity if it is above the current provisioning,
+    otherwise the current provisioning.
+
+    :type current_provisioning: numpy.ndarray
+    :param current_provisioning: The current provisioning
+    :type consumed_units_percent: numpy.ndarray
+    :param consumed_units_percent: Percent of consumed units
+    :returns: numpy.ndarray
+    """
+    consumption_based = numpy.ceil(
+        current_provisioning * (consumed_units_percent / 100))
+
+    return numpy.where(
+        consumption_based > current_provisioning,
+        consumption_based,
+        numpy.trunc(current_provisioning))
+
+
+def __target_batch(
+        current_provisioning, target_utilization, consumed_units_percent):
+    """ Return the provisioning that reaches the target utilisation
+
+    Same as increase_*_to_target(), without the max limit. Elements
+    without a target utilisation give inf or nan.
+
+    :type current_provisioning: numpy.ndarray
+    :param current_provisioning: The current provisioning
+    :type target_utilization: numpy.ndarray
+    :param target_utilization: Percent of the provisioning to consume
+    :type consumed_units_percent: numpy.ndarray
+    :param consumed_units_percent: Percent of consumed units
+    :returns: numpy.ndarray
+    """
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        return numpy.maximum(
+            numpy.ceil(
+                current_provisioning * consumed_units_percent /
+                target_utilization),
+            numpy.trunc(current_provisioning))
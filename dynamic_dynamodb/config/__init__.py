@@ -1,14 +1,31 @@
 # -*- coding: utf-8 -*-
 """ Configuration management """
+import hashlib
+import os.path
+import re
 import sys
 from dynamic_dynamodb.config import config_file_parser
 from dynamic_dynamodb.config import command_line_parser
+from dynamic_dynamodb.config.matcher import compile_matcher
+from dynamic_dynamodb.config.scale import compile_scale
 
 try:
     from collections import OrderedDict as ordereddict
 except ImportError:
     from ordereddict import OrderedDict as ordereddict
 
+# The current configuration snapshot, shared by all callers
+CONFIGURATION = None
+
+# Modification time and SHA1 of the config file behind CONFIGURATION
+CONFIG_FILE_STATE = None
+
+# Matchers for the table and GSI keys of CONFIGURATION, built with it
+MATCHERS = None
+
+# Command line options, parsed once
+CMD_LINE_OPTIONS = None
+
 DEFAULT_OPTIONS = {
     'global': {
         # Command line only
@@ -18,6 +35,7 @@ DEFAULT_OPTIONS = {
         'dry_run': False,
         'pid_file_dir': '/tmp',
         'run_once': False,
+        'show_config': False,
 
         # [global]
         'region': 'us-east-1',
@@ -26,8 +44,14 @@ DEFAULT_OPTIONS = {
         'consul_host': 'localhost',
         'consul_token': None,
         'check_interval': 300,
+        'check_spread': 0,
+        'max_workers': 1,
+        'table_discovery_interval': 300,
+        'metrics_port': None,
+        'throttle_check_interval': None,
         'circuit_breaker_url': None,
-        'circuit_breaker_timeout': 10000.00
+        'circuit_breaker_timeout': 10000.00,
+        'circuit_breaker_cache_ttl': 0
     },
     'logging': {
         # [logging]
@@ -53,6 +77,7 @@ DEFAULT_OPTIONS = {
         'decrease_reads_with': 50,
         'increase_reads_unit': 'percent',
         'decrease_reads_unit': 'percent',
+        'target_reads_utilization': None,
         'writes_lower_threshold': 30,
         'writes_upper_threshold': 90,
         'throttled_writes_upper_threshold': 0,
@@ -60,6 +85,7 @@ DEFAULT_OPTIONS = {
         'decrease_writes_with': 50,
         'increase_writes_unit': 'percent',
         'decrease_writes_unit': 'percent',
+        'target_writes_utilization': None,
         'min_provisioned_reads': None,
         'max_provisioned_reads': None,
         'min_provisioned_writes': None,
@@ -97,7 +123,14 @@ DEFAULT_OPTIONS = {
         'decrease_consumed_writes_with': None,
         'decrease_consumed_writes_scale': None,
         'circuit_breaker_url': None,
-        'circuit_breaker_timeout': 10000.00
+        'circuit_breaker_timeout': 10000.00,
+        'min_check_interval': None,
+        'max_check_interval': None,
+        'scaling_controller': 'thresholds',
+        'controller_proportional_gain': 0.5,
+        'controller_integral_gain': 0.1,
+        'controller_hysteresis_band': 25.0,
+        'controller_max_decreases_per_day': 4
     },
     'gsi': {
         'reads-upper-alarm-threshold': 0,
@@ -117,6 +150,7 @@ DEFAULT_OPTIONS = {
         'decrease_reads_with': 50,
         'increase_reads_unit': 'percent',
         'decrease_reads_unit': 'percent',
+        'target_reads_utilization': None,
         'writes_lower_threshold': 30,
         'writes_upper_threshold': 90,
         'throttled_writes_upper_threshold': 0,
@@ -124,6 +158,7 @@ DEFAULT_OPTIONS = {
         'decrease_writes_with': 50,
         'increase_writes_unit': 'percent',
         'decrease_writes_unit': 'percent',
+        'target_writes_utilization': None,
         'min_provisioned_reads': None,
         'max_provisioned_reads': None,
         'min_provisioned_writes': None,
@@ -155,13 +190,125 @@ DEFAULT_OPTIONS = {
         'increase_throttled_by_consumed_writes_unit': None,
         'increase_throttled_by_consumed_writes_scale': None,
         'circuit_breaker_url': None,
-        'circuit_breaker_timeout': 10000.00
+        'circuit_breaker_timeout': 10000.00,
+        'scaling_controller': 'thresholds',
+        'controller_proportional_gain': 0.5,
+        'controller_integral_gain': 0.1,
+        'controller_hysteresis_band': 25.0,
+        'controller_max_decreases_per_day': 4
     }
 }
 
 
+class ReadOnlyDict(ordereddict):
+    """ Ordered dictionary that can not be modified once it is built
+
+    copy() returns a regular, mutable ordered dictionary.
+    """
+    def __init__(self, *args, **kwargs):
+        """ Constructor """
+        ordereddict.__init__(self, *args, **kwargs)
+        self._read_only = True
+
+    def __setitem__(self, key, value, *args, **kwargs):
+        if getattr(self, '_read_only', False):
+            raise TypeError('The configuration snapshot is read-only')
+        ordereddict.__setitem__(self, key, value, *args, **kwargs)
+
+    def __delitem__(self, key, *args, **kwargs):
+        if getattr(self, '_read_only', False):
+            raise TypeError('The configuration snapshot is read-only')
+        ordereddict.__delitem__(self, key, *args, **kwargs)
+
+    def clear(self):
+        raise TypeError('The configuration snapshot is read-only')
+
+    def copy(self):
+        return ordereddict(self)
+
+
+class ScaleDict(ReadOnlyDict):
+    """ Read-only scale option, compiled for the scaling amount lookups
+
+    The compiled StepFunction is available as steps.
+    """
+    def __init__(self, *args, **kwargs):
+        """ Constructor """
+        ReadOnlyDict.__init__(self, *args, **kwargs)
+        self.steps = compile_scale(self)
+
+
 def get_configuration():
-    """ Get the configuration from command line and config files """
+    """ Get the configuration snapshot
+
+    The snapshot is built from the command line and config files the first
+    time it is requested. After that the same read-only object is returned
+    to all callers until reload_configuration() picks up a changed
+    configuration file.
+
+    :returns: ReadOnlyDict -- The configuration snapshot
+    """
+    global CONFIGURATION, CONFIG_FILE_STATE, MATCHERS
+
+    if CONFIGURATION is None:
+        CONFIG_FILE_STATE, CONFIGURATION, MATCHERS = __build_configuration()
+
+    return CONFIGURATION
+
+
+def get_matchers():
+    """ Get the matchers for the table and GSI keys of the snapshot
+
+    :returns: dict -- {'tables': Matcher, 'gsis': {table_key: Matcher}}
+    """
+    get_configuration()
+    return MATCHERS
+
+
+def reload_configuration():
+    """ Rebuild the configuration snapshot if the config file has changed
+
+    The modification time of the file is checked first, the content hash is
+    only calculated when the modification time differs from the last build.
+    An invalid configuration file will not replace the current snapshot.
+
+    :returns: bool -- True if a new snapshot was built
+    """
+    global CONFIGURATION, CONFIG_FILE_STATE, MATCHERS
+
+    if CONFIGURATION is None:
+        get_configuration()
+        return True
+
+    file_state = __get_config_file_state(
+        CONFIGURATION['global'].get('config'), CONFIG_FILE_STATE)
+    if file_state is None or file_state == CONFIG_FILE_STATE:
+        return False
+
+    if CONFIG_FILE_STATE and file_state[1] == CONFIG_FILE_STATE[1]:
+        # Touched, but the content is the same
+        CONFIG_FILE_STATE = file_state
+        return False
+
+    try:
+        file_state, configuration, matchers = __build_configuration()
+    except (Exception, SystemExit) as error:
+        print('Keeping the current configuration, reload failed: {0}'.format(
+            error))
+        CONFIG_FILE_STATE = file_state
+        return False
+
+    CONFIG_FILE_STATE, CONFIGURATION, MATCHERS = (
+        file_state, configuration, matchers)
+    return True
+
+
+def __build_configuration():
+    """ Get the configuration from command line and config files
+
+    :returns: (tuple, ReadOnlyDict, dict) -- Config file state,
+        configuration and matchers for the table and GSI keys
+    """
     # This is the dict we will return
     configuration = {
         'global': {},
@@ -170,11 +317,13 @@ def get_configuration():
     }
 
     # Read the command line options
-    cmd_line_options = command_line_parser.parse()
+    cmd_line_options = __get_cmd_line_options()
 
     # If a configuration file is specified, read that as well
     conf_file_options = None
+    file_state = None
     if 'config' in cmd_line_options:
+        file_state = __get_config_file_state(cmd_line_options['config'])
         conf_file_options = config_file_parser.parse(
             cmd_line_options['config'])
 
@@ -197,11 +346,103 @@ def get_configuration():
         configuration['tables'] = __get_config_table_options(conf_file_options)
 
     # Ensure some basic rules
+    __check_global_rules(configuration)
     __check_gsi_rules(configuration)
     __check_logging_rules(configuration)
     __check_table_rules(configuration)
 
-    return configuration
+    return (
+        file_state,
+        __freeze(configuration),
+        __build_matchers(configuration))
+
+
+def __build_matchers(configuration):
+    """ Compile the table and GSI keys, exit if any is an invalid regexp
+
+    :type configuration: dict
+    :param configuration: Configuration
+    :returns: dict -- {'tables': Matcher, 'gsis': {table_key: Matcher}}
+    """
+    try:
+        matchers = {
+            'tables': compile_matcher(configuration['tables'].keys()),
+            'gsis': {}
+        }
+        for table_key, table in configuration['tables'].items():
+            matchers['gsis'][table_key] = compile_matcher(
+                table.get('gsis', {}).keys())
+    except re.error as error:
+        print('Invalid regular expression in the configuration: {0}'.format(
+            error))
+        sys.exit(1)
+
+    return matchers
+
+
+def __freeze(value, key=None):
+    """ Return a read-only copy of a configuration value
+
+    The *_scale options are compiled for the scaling amount lookups.
+
+    :type value: dict, list or other
+    :param value: Value to freeze
+    :type key: str
+    :param key: Option name of the value, if any
+    :returns: ReadOnlyDict, tuple or the value itself
+    """
+    if isinstance(value, dict):
+        if key is not None and key.endswith('_scale'):
+            return ScaleDict(value)
+
+        return ReadOnlyDict(
+            (item_key, __freeze(item, item_key))
+            for item_key, item in value.items())
+
+    if isinstance(value, list):
+        return tuple(__freeze(item) for item in value)
+
+    return value
+
+
+def __get_cmd_line_options():
+    """ Get the command line options, parsed only once
+
+    :returns: dict -- Command line options
+    """
+    global CMD_LINE_OPTIONS
+
+    if CMD_LINE_OPTIONS is None:
+        CMD_LINE_OPTIONS = command_line_parser.parse()
+
+    return CMD_LINE_OPTIONS
+
+
+def __get_config_file_state(config_path, previous_state=None):
+    """ Get the modification time and content hash of the config file
+
+    :type config_path: str
+    :param config_path: Path to the configuration file
+    :type previous_state: tuple
+    :param previous_state: State from an earlier call. The hash is reused
+        if the modification time has not changed
+    :returns: tuple -- (mtime, sha1) or None if there is no config file
+    """
+    if not config_path:
+        return None
+
+    config_path = os.path.expanduser(config_path)
+    try:
+        mtime = os.path.getmtime(config_path)
+        if previous_state and previous_state[0] == mtime:
+            return previous_state
+
+        with open(config_path, 'rb') as config_file:
+            digest = hashlib.sha1(config_file.read()).hexdigest()
+    except (IOError, OSError):
+        return None
+
+    return (mtime, digest)
 
 
 def __get_cmd_table_options(cmd_line_options):
@@ -343,6 +584,33 @@ def __get_logging_options(cmd_line_options, conf_file_options=None):
     return options
 
 
+def __check_global_rules(configuration):
+    """ Check that the global values are proper """
+    if configuration['global']['max_workers'] < 1:
+        print('max-workers must be at least 1')
+        sys.exit(1)
+
+    if not (0 <= configuration['global']['check_spread'] <
+            configuration['global']['check_interval']):
+        print('check-spread must be at least 0 and less than check-interval')
+        sys.exit(1)
+
+    throttle_check_interval = \
+        configuration['global']['throttle_check_interval']
+    if throttle_check_interval is not None and not (
+            0 < throttle_check_interval <
+            configuration['global']['check_interval']):
+        print(
+            'throttle-check-interval must be at least 1 and less than '
+            'check-interval')
+        sys.exit(1)
+
+    metrics_port = configuration['global']['metrics_port']
+    if metrics_port is not None and not 0 < metrics_port < 65536:
+        print('metrics-port must be between 1 and 65535')
+        sys.exit(1)
+
+
 def __check_gsi_rules(configuration):
     """ Do some basic checks on the configuration """
     for table_name in configuration['tables']:
@@ -353,20 +621,21 @@ def __check_gsi_rules(configuration):
             gsi = configuration['tables'][table_name]['gsis'][gsi_name]
             # Check that increase/decrease units is OK
             valid_units = ['percent', 'units']
-            if gsi['increase_reads_unit'] not in valid_units:
+            valid_increase_units = ['percent', 'units', 'target']
+            if gsi['increase_reads_unit'] not in valid_increase_units:
                 print(
                     'increase-reads-unit must be set to '
-                    'either percent or units')
+                    'either percent, units or target')
                 sys.exit(1)
             if gsi['decrease_reads_unit'] not in valid_units:
                 print(
                     'decrease-reads-unit must be set to '
                     'either percent or units')
                 sys.exit(1)
-            if gsi['increase_writes_unit'] not in valid_units:
+            if gsi['increase_writes_unit'] not in valid_increase_units:
                 print(
                     'increase-writes-unit must be set to '
-                    'either percent or units')
+                    'either percent, units or target')
                 sys.exit(1)
             if gsi['decrease_writes_unit'] not in valid_units:
                 print(
@@ -374,50 +643,55 @@ def __check_gsi_rules(configuration):
                     'either percent or units')
                 sys.exit(1)
             if 'increase_consumed_reads_unit' in gsi and gsi['increase_consumed_reads_unit'] and \
-                    gsi['increase_consumed_reads_unit'] not in valid_units:
+                    gsi['increase_consumed_reads_unit'] not in \
+                    valid_increase_units:
                 print(
                     'increase-consumed-reads-unit must be set to '
-                    'either percent or units, or left unset')
+                    'either percent, units or target, or left unset')
                 sys.exit(1)
             if 'increase_consumed_writes_unit' in gsi and gsi['increase_consumed_writes_unit'] and \
-                    gsi['increase_consumed_writes_unit'] not in valid_units:
+                    gsi['increase_consumed_writes_unit'] not in \
+                    valid_increase_units:
                 print(
                     'increase-consumed-writes-unit must be set to '
-                    'either percent or units, or left unset')
+                    'either percent, units or target, or left unset')
                 sys.exit(1)
             if ('increase_throttled_by_consumed_reads_unit' in gsi
                     and gsi['increase_throttled_by_consumed_reads_unit']
                     and gsi['increase_throttled_by_consumed_reads_unit']
-                    not in valid_units):
+                    not in valid_increase_units):
                 print(
                     'increase-throttled-by-consumed-reads-unit must be set to '
-                    'either percent or units, or left unset')
+                    'either percent, units or target, or left unset')
                 sys.exit(1)
             if ('increase_throttled_by_consumed_writes_unit' in gsi
                     and gsi['increase_throttled_by_consumed_writes_unit']
                     and gsi['increase_throttled_by_consumed_writes_unit']
-                    not in valid_units):
+                    not in valid_increase_units):
                 print(
                     'increase-throttled-by-consumed-writes-unit must be set to '
-                    'either percent or units, or left unset')
+                    'either percent, units or target, or left unset')
                 sys.exit(1)
             if ('increase_throttled_by_provisioned_reads_unit' in gsi
                     and gsi['increase_throttled_by_provisioned_reads_unit']
                     and gsi['increase_throttled_by_provisioned_reads_unit']
-                    not in valid_units):
+                    not in valid_increase_units):
                 print(
                     'increase-throttled-by-provisioned-reads-unit must be set '
-                    'to either percent or units, or left unset')
+                    'to either percent, units or target, or left unset')
                 sys.exit(1)
             if ('increase_throttled_by_provisioned_writes_unit' in gsi
                     and gsi['increase_throttled_by_provisioned_writes_unit']
                     and gsi['increase_throttled_by_provisioned_writes_unit']
-                    not in valid_units):
+                    not in valid_increase_units):
                 print(
                     'increase-throttled-by-provisioned-writes-unit must be set '
-                    'to either percent or units, or left unset')
+                    'to either percent, units or target, or left unset')
                 sys.exit(1)
 
+            __check_target_utilization(gsi, 'GSI {0}'.format(gsi_name))
+            __check_controller(gsi, 'GSI {0}'.format(gsi_name))
+
             # Check lookback-window start
             if gsi['lookback_window_start'] < 1:
                 print(
@@ -503,6 +777,83 @@ def __check_gsi_rules(configuration):
                 sys.exit(1)
 
 
+def __check_controller(options, name):
+    """ Check the scaling controller options
+
+    :type options: dict
+    :param options: Table or GSI options
+    :type name: str
+    :param name: Table or GSI, for the error messages
+    """
+    valid_controllers = ['thresholds', 'pi']
+    if options['scaling_controller'] not in valid_controllers:
+        print(
+            'scaling-controller must be set to either thresholds or pi '
+            'for {0}'.format(name))
+        sys.exit(1)
+
+    if options['scaling_controller'] != 'pi':
+        return
+
+    for operation in ['reads', 'writes']:
+        if (options['enable_{0}_autoscaling'.format(operation)] and
+                not options['target_{0}_utilization'.format(operation)]):
+            print(
+                'target-{0}-utilization must be set for {1}, as the pi '
+                'scaling-controller steers towards it'.format(
+                    operation, name))
+            sys.exit(1)
+
+    for option in [
+            'controller_proportional_gain',
+            'controller_integral_gain',
+            'controller_hysteresis_band']:
+        if options[option] < 0:
+            print('{0} may not be lower than 0 for {1}'.format(
+                option.replace('_', '-'), name))
+            sys.exit(1)
+
+    if options['controller_max_decreases_per_day'] < 1:
+        print(
+            'controller-max-decreases-per-day may not be lower than 1 '
+            'for {0}'.format(name))
+        sys.exit(1)
+
+
+def __check_target_utilization(options, name):
+    """ Check the target utilisation of the target increase unit
+
+    :type options: dict
+    :param options: Table or GSI options
+    :type name: str
+    :param name: Table or GSI, for the error messages
+    """
+    for operation in ['reads', 'writes']:
+        target = options.get('target_{0}_utilization'.format(operation))
+        units = [
+            options.get(option.format(operation)) for option in [
+                'increase_{0}_unit',
+                'increase_consumed_{0}_unit',
+                'increase_throttled_by_consumed_{0}_unit',
+                'increase_throttled_by_provisioned_{0}_unit'
+            ]
+        ]
+
+        if 'target' in units and not target:
+            print(
+                'target-{0}-utilization must be set for {1}, as it scales up '
+                '{0} with the target unit'.format(operation, name))
+            sys.exit(1)
+
+        # A throttled table or GSI is sized as consuming 100%, a target
+        # of 100 would keep its provisioning
+        if target is not None and not 1 <= target < 100:
+            print(
+                'target-{0}-utilization must be between 1 and 99 '
+                'for {1}'.format(operation, name))
+            sys.exit(1)
+
+
 def __check_logging_rules(configuration):
     """ Check that the logging values are proper """
     valid_log_levels = [
@@ -523,15 +874,19 @@ def __check_table_rules(configuration):
         table = configuration['tables'][table_name]
         # Check that increase/decrease units is OK
         valid_units = ['percent', 'units']
-        if table['increase_reads_unit'] not in valid_units:
-            print('increase-reads-unit must be set to either percent or units')
+        valid_increase_units = ['percent', 'units', 'target']
+        if table['increase_reads_unit'] not in valid_increase_units:
+            print(
+                'increase-reads-unit must be set to '
+                'either percent, units or target')
             sys.exit(1)
         if table['decrease_reads_unit'] not in valid_units:
             print('decrease-reads-unit must be set to either percent or units')
             sys.exit(1)
-        if table['increase_writes_unit'] not in valid_units:
+        if table['increase_writes_unit'] not in valid_increase_units:
             print(
-                'increase-writes-unit must be set to either percent or units')
+                'increase-writes-unit must be set to '
+                'either percent, units or target')
             sys.exit(1)
         if table['decrease_writes_unit'] not in valid_units:
             print(
@@ -539,51 +894,56 @@ def __check_table_rules(configuration):
             sys.exit(1)
         if ('increase_consumed_reads_unit' in table
                 and table['increase_consumed_reads_unit']
-                and table['increase_consumed_reads_unit'] not in valid_units):
+                and table['increase_consumed_reads_unit']
+                not in valid_increase_units):
             print(
                 'increase-consumed-reads-unit must be set to '
-                'either percent or units, or left unset')
+                'either percent, units or target, or left unset')
             sys.exit(1)
         if ('increase_consumed_writes_unit' in table
                 and table['increase_consumed_writes_unit']
-                and table['increase_consumed_writes_unit'] not in valid_units):
+                and table['increase_consumed_writes_unit']
+                not in valid_increase_units):
             print(
                 'increase-consumed-writes-unit must be set to '
-                'either percent or units, or left unset')
+                'either percent, units or target, or left unset')
             sys.exit(1)
         if ('increase_throttled_by_consumed_reads_unit' in table
                 and table['increase_throttled_by_consumed_reads_unit']
                 and table['increase_throttled_by_consumed_reads_unit']
-                not in valid_units):
+                not in valid_increase_units):
             print(
                 'increase-throttled-by-consumed-reads-unit must be set to '
-                'either percent or units, or left unset')
+                'either percent, units or target, or left unset')
             sys.exit(1)
         if ('increase_throttled_by_consumed_writes_unit' in table
                 and table['increase_throttled_by_consumed_writes_unit']
                 and table['increase_throttled_by_consumed_writes_unit']
-                not in valid_units):
+                not in valid_increase_units):
             print(
                 'increase-throttled-by-consumed-writes-unit must be set to '
-                'either percent or units, or left unset')
+                'either percent, units or target, or left unset')
             sys.exit(1)
         if ('increase_throttled_by_provisioned_reads_unit' in table
                 and table['increase_throttled_by_provisioned_reads_unit']
                 and table['increase_throttled_by_provisioned_reads_unit']
-                not in valid_units):
+                not in valid_increase_units):
             print(
                 'increase-throttled-by-provisioned-reads-unit must be set to '
-                'either percent or units, or left unset')
+                'either percent, units or target, or left unset')
             sys.exit(1)
         if ('increase_throttled_by_provisioned_writes_unit' in table
                 and table['increase_throttled_by_provisioned_writes_unit']
                 and table['increase_throttled_by_provisioned_writes_unit']
-                not in valid_units):
+                not in valid_increase_units):
             print(
                 'increase-throttled-by-provisioned-writes-unit must be set to '
-                'either percent or units, or left unset')
+                'either percent, units or target, or left unset')
             sys.exit(1)
 
+        __check_target_utilization(table, 'table {0}'.format(table_name))
+        __check_controller(table, 'table {0}'.format(table_name))
+
         # Check lookback-window start
         if table['lookback_window_start'] < 1:
             print(
@@ -622,13 +982,17 @@ def __check_table_rules(configuration):
             'num_read_checks_before_scale_down',
             'num_write_checks_before_scale_down',
             'increase_consumed_reads_with',
-            'increase_consumed_writes_with'
+            'increase_consumed_writes_with',
+            'min_check_interval',
+            'max_check_interval'
         ]
         # Config options without a mandatory default
         # should be allowed a None value
         non_default = [
             'increase_consumed_reads_with',
-            'increase_consumed_writes_with'
+            'increase_consumed_writes_with',
+            'min_check_interval',
+            'max_check_interval'
         ]
 
         for option in options:
@@ -664,3 +1028,26 @@ def __check_table_rules(configuration):
                     table['max_provisioned_writes'],
                     table_name))
             sys.exit(1)
+
+        if (table['min_check_interval'] and table['max_check_interval'] and
+                table['min_check_interval'] > table['max_check_interval']):
+            print(
+                'min_check_interval ({0}) may not be higher than '
+                'max_check_interval ({1}) for table {2}'.format(
+                    table['min_check_interval'],
+                    table['max_check_interval'],
+                    table_name))
+            sys.exit(1)
+
+        # Tables are checked in the cycles, which run every check-interval
+        for option in ['min_check_interval', 'max_check_interval']:
+            if (table[option] and
+                    table[option] < configuration['global']['check_interval']):
+                print(
+                    '{0} ({1}) may not be lower than check_interval ({2}) '
+                    'for table {3}'.format(
+                        option,
+                        table[option],
+                        configuration['global']['check_interval'],
+                        table_name))
+                sys.exit(1)
@@ -30,6 +30,11 @@ def parse():
         type=int,
         help="""How many seconds should we wait between
                 the checks (default: 300)""")
+    parser.add_argument(
+        '--max-workers',
+        type=int,
+        help="""How many tables should be checked in parallel
+                (default: 1)""")
     parser.add_argument(
         '--log-file',
         help='Send output to the given log file')
@@ -113,11 +118,18 @@ def parse():
     r_scaling_ag.add_argument(
         '--increase-reads-unit',
         type=str,
-        help='Do you want to scale in percent or units? (default: percent)')
+        help="""Do you want to scale in percent or units, or up to
+                --target-reads-utilization with target? (default: percent)""")
     r_scaling_ag.add_argument(
         '--decrease-reads-unit',
         type=str,
         help='Do you want to scale in percent or units? (default: percent)')
+    r_scaling_ag.add_argument(
+        '--target-reads-utilization',
+        type=int,
+        help="""How many percent of the reads should be consumed after
+                scaling up with --increase-reads-unit target, between 1
+                and 99""")
     r_scaling_ag.add_argument(
         '--min-provisioned-reads',
         type=int,
@@ -169,11 +181,18 @@ def parse():
     w_scaling_ag.add_argument(
         '--increase-writes-unit',
         type=str,
-        help='Do you want to scale in percent or units? (default: percent)')
+        help="""Do you want to scale in percent or units, or up to
+                --target-writes-utilization with target? (default: percent)""")
     w_scaling_ag.add_argument(
         '--decrease-writes-unit',
         type=str,
         help='Do you want to scale in percent or units? (default: percent)')
+    w_scaling_ag.add_argument(
+        '--target-writes-utilization',
+        type=int,
+        help="""How many percent of the writes should be consumed after
+                scaling up with --increase-writes-unit target, between 1
+                and 99""")
     w_scaling_ag.add_argument(
         '--min-provisioned-writes',
         type=int,
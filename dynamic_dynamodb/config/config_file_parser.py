@@ -91,6 +91,12 @@ TABLE_CONFIG_OPTIONS = [
         'required': True,
         'type': 'str'
     },
+    {
+        'key': 'target_reads_utilization',
+        'option': 'target-reads-utilization',
+        'required': False,
+        'type': 'int'
+    },
     {
         'key': 'writes_lower_threshold',
         'option': 'writes-lower-threshold',
@@ -133,6 +139,12 @@ TABLE_CONFIG_OPTIONS = [
         'required': True,
         'type': 'str'
     },
+    {
+        'key': 'target_writes_utilization',
+        'option': 'target-writes-utilization',
+        'required': False,
+        'type': 'int'
+    },
     {
         'key': 'min_provisioned_reads',
         'option': 'min-provisioned-reads',
@@ -253,6 +265,48 @@ TABLE_CONFIG_OPTIONS = [
         'required': False,
         'type': 'int'
     },
+    {
+        'key': 'min_check_interval',
+        'option': 'min-check-interval',
+        'required': False,
+        'type': 'int'
+    },
+    {
+        'key': 'max_check_interval',
+        'option': 'max-check-interval',
+        'required': False,
+        'type': 'int'
+    },
+    {
+        'key': 'scaling_controller',
+        'option': 'scaling-controller',
+        'required': False,
+        'type': 'str'
+    },
+    {
+        'key': 'controller_proportional_gain',
+        'option': 'controller-proportional-gain',
+        'required': False,
+        'type': 'float'
+    },
+    {
+        'key': 'controller_integral_gain',
+        'option': 'controller-integral-gain',
+        'required': False,
+        'type': 'float'
+    },
+    {
+        'key': 'controller_hysteresis_band',
+        'option': 'controller-hysteresis-band',
+        'required': False,
+        'type': 'float'
+    },
+    {
+        'key': 'controller_max_decreases_per_day',
+        'option': 'controller-max-decreases-per-day',
+        'required': False,
+        'type': 'int'
+    },
     {
         'key': 'increase_throttled_by_provisioned_reads_unit',
         'option': 'increase-throttled-by-provisioned-reads-unit',
@@ -511,6 +565,36 @@ def parse(config_path):
                     'required': False,
                     'type': 'int'
                 },
+                {
+                    'key': 'check_spread',
+                    'option': 'check-spread',
+                    'required': False,
+                    'type': 'int'
+                },
+                {
+                    'key': 'max_workers',
+                    'option': 'max-workers',
+                    'required': False,
+                    'type': 'int'
+                },
+                {
+                    'key': 'table_discovery_interval',
+                    'option': 'table-discovery-interval',
+                    'required': False,
+                    'type': 'int'
+                },
+                {
+                    'key': 'metrics_port',
+                    'option': 'metrics-port',
+                    'required': False,
+                    'type': 'int'
+                },
+                {
+                    'key': 'throttle_check_interval',
+                    'option': 'throttle-check-interval',
+                    'required': False,
+                    'type': 'int'
+                },
                 {
                     'key': 'circuit_breaker_url',
                     'option': 'circuit-breaker-url',
@@ -523,6 +607,12 @@ def parse(config_path):
                     'required': False,
                     'type': 'float'
                 },
+                {
+                    'key': 'circuit_breaker_cache_ttl',
+                    'option': 'circuit-breaker-cache-ttl',
+                    'required': False,
+                    'type': 'int'
+                },
             ])
 
     #
@@ -561,11 +651,13 @@ def parse(config_path):
         default_options = __parse_options(
             config_file, 'default_options', default_config_options)
         # if we've got a default set required to be false for table parsing
-        for item in TABLE_CONFIG_OPTIONS:
+        table_config_options = deepcopy(TABLE_CONFIG_OPTIONS)
+        for item in table_config_options:
             if item['key'] in default_options:
                 item['required'] = False
     else:
         default_options = {}
+        table_config_options = TABLE_CONFIG_OPTIONS
 
     #
     # Handle [table: ]
@@ -582,7 +674,7 @@ def parse(config_path):
         current_table_name = current_section.rsplit(':', 1)[1].strip()
         table_config['tables'][current_table_name] = \
             dict(default_options.items() + __parse_options(
-                config_file, current_section, TABLE_CONFIG_OPTIONS).items())
+                config_file, current_section, table_config_options).items())
 
     if not found_table:
         print('Could not find a [table: <table_name>] section in {0}'.format(
@@ -610,7 +702,7 @@ def parse(config_path):
 
         table_config['tables'][table_key]['gsis'][gsi_key] = \
             ordereddict(default_options.items() + __parse_options(
-                config_file, current_section, TABLE_CONFIG_OPTIONS).items())
+                config_file, current_section, table_config_options).items())
 
     return ordereddict(
         global_config.items() +
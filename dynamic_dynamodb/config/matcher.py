@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+""" Match table and GSI names against the configuration keys """
+import re
+import sre_constants
+import sre_parse
+
+# Most groups in one combined pattern, Python 2 allows 100
+MAX_COMBINED_GROUPS = 90
+
+
+def compile_matcher(keys):
+    """ Compile configuration keys into a Matcher
+
+    :type keys: list
+    :param keys: Configuration keys, in configuration order
+    :returns: Matcher
+    :raises: re.error if a key is not a valid regular expression
+    """
+    keys = list(keys)
+    compiled = []
+    exact = {}
+    trie = {}
+    other = []
+    literals = []
+
+    for index, key in enumerate(keys):
+        try:
+            compiled.append(re.compile(key))
+            parsed = sre_parse.parse(key)
+        except (re.error, sre_constants.error) as error:
+            raise re.error('{0}: "{1}"'.format(error, key))
+
+        literal, is_exact = __literal_prefix(parsed)
+        literals.append(literal)
+        if is_exact:
+            exact.setdefault(literal, []).append(index)
+        elif literal:
+            node = trie
+            for char in literal:
+                node = node.setdefault(char, {})
+            node.setdefault(None, []).append(index)
+        else:
+            other.append((index, key, compiled[index]))
+
+    if other:
+        # Some key can match names with any prefix
+        prefixes = None
+    else:
+        prefixes = __shortest_prefixes(literals)
+
+    return Matcher(keys, compiled, exact, trie, __combine(other), prefixes)
+
+
+class Matcher(object):
+    """ Index of configuration keys, used as regular expressions
+
+    A name matches a key if re.match(key, name) matches. Keys are split by
+    their shape:
+
+    - literal keys like ^my_table$ are looked up in a dict
+    - keys starting with a literal, like ^prod_.*, are found with a prefix
+      trie and then checked with their own regular expression
+    - all other keys are first checked with combined alternations, so that
+      names matching none of them are rejected in one call
+
+    Results are memoized per name. Use compile_matcher() to create one.
+    """
+    def __init__(self, keys, compiled, exact, trie, combined, prefixes):
+        """ Create the matcher from the compiled keys
+
+        :type keys: list
+        :param keys: Configuration keys, in configuration order
+        :type compiled: list
+        :param compiled: Compiled regular expression of each key
+        :type exact: dict
+        :param exact: Literal name -> indexes of keys matching only it
+        :type trie: dict
+        :param trie: Prefix trie, indexes of keys are stored under None
+        :type combined: list
+        :param combined: List of tuples (alternation or None, indexes)
+        :type prefixes: list or None
+        :param prefixes: Sorted literal prefixes that every matching name
+            starts with, None if a key has no literal prefix
+        """
+        self.keys = keys
+        self._compiled = compiled
+        self._exact = exact
+        self._trie = trie
+        self._combined = combined
+        self._cache = {}
+        self.prefixes = prefixes
+
+    def match(self, name):
+        """ Return the keys matching the name
+
+        :type name: str
+        :param name: Table or GSI name
+        :returns: tuple -- Matching keys, in configuration order
+        """
+        try:
+            return self._cache[name]
+        except KeyError:
+            pass
+
+        indexes = list(self._exact.get(name, []))
+
+        node = self._trie
+        for char in name:
+            if None in node:
+                indexes.extend(
+                    index for index in node[None]
+                    if self._compiled[index].match(name))
+            node = node.get(char)
+            if node is None:
+                break
+        else:
+            if None in node:
+                indexes.extend(
+                    index for index in node[None]
+                    if self._compiled[index].match(name))
+
+        for pattern, candidates in self._combined:
+            if pattern is not None and not pattern.match(name):
+                continue
+            indexes.extend(
+                index for index in candidates
+                if self._compiled[index].match(name))
+
+        keys = tuple(self.keys[index] for index in sorted(indexes))
+        self._cache[name] = keys
+        return keys
+
+    def match_first(self, name):
+        """ Return the first key matching the name
+
+        :type name: str
+        :param name: Table or GSI name
+        :returns: str or None -- First matching key, in configuration order
+        """
+        keys = self.match(name)
+        if keys:
+            return keys[0]
+
+        return None
+
+
+def __literal_prefix(parsed):
+    """ Find the literal text a pattern starts with
+
+    :type parsed: sre_parse.SubPattern
+    :param parsed: Parsed regular expression
+    :returns: (str, bool) -- The literal prefix and whether the pattern
+        matches exactly that text and nothing else
+    """
+    if parsed.pattern.flags & (sre_parse.SRE_FLAG_IGNORECASE |
+                               sre_parse.SRE_FLAG_LOCALE |
+                               sre_parse.SRE_FLAG_UNICODE):
+        return '', False
+
+    items = list(parsed)
+    if items and items[0] == (sre_constants.AT, sre_constants.AT_BEGINNING):
+        items = items[1:]
+
+    literal = []
+    for op, value in items:
+        if op != sre_constants.LITERAL:
+            break
+        literal.append(chr(value) if value < 256 else unichr(value))
+
+    rest = items[len(literal):]
+    exact = rest == [(sre_constants.AT, sre_constants.AT_END)]
+
+    return ''.join(literal), exact
+
+
+def __shortest_prefixes(literals):
+    """ Drop the prefixes that start with another prefix
+
+    :type literals: list
+    :param literals: Literal prefixes
+    :returns: list -- Sorted prefixes, none starting with another
+    """
+    prefixes = []
+    for literal in sorted(set(literals)):
+        if prefixes and literal.startswith(prefixes[-1]):
+            continue
+        prefixes.append(literal)
+
+    return prefixes
+
+
+def __combine(keys):
+    """ Combine keys into alternations that reject non-matching names
+
+    Keys with back references or flags change meaning when combined, and
+    named groups may be repeated by other keys, so they are checked on
+    their own.
+
+    :type keys: list
+    :param keys: List of tuples (index, key, compiled pattern)
+    :returns: list -- List of tuples (compiled alternation or None,
+        indexes of the keys it covers)
+    """
+    combined = []
+    alternatives = []
+    indexes = []
+    groups = 0
+
+    for index, key, compiled in keys:
+        if (compiled.flags or compiled.groupindex or
+                __has_groupref(sre_parse.parse(key))):
+            combined.append((None, [index]))
+            continue
+
+        if alternatives and groups + compiled.groups > MAX_COMBINED_GROUPS:
+            combined.append((
+                re.compile('|'.join(alternatives)), indexes))
+            alternatives, indexes, groups = [], [], 0
+
+        alternatives.append('(?:{0})'.format(key))
+        indexes.append(index)
+        groups += compiled.groups
+
+    if alternatives:
+        combined.append((re.compile('|'.join(alternatives)), indexes))
+
+    return combined
+
+
+def __has_groupref(parsed):
+    """ Check if a parsed pattern refers back to a group
+
+    :type parsed: sre_parse.SubPattern or list
+    :param parsed: Parsed regular expression
+    :returns: bool -- True if there is a back reference
+    """
+    for op, value in parsed:
+        if op in (sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS):
+            return True
+
+        for item in (value if isinstance(value, (list, tuple)) else [value]):
+            if isinstance(item, sre_parse.SubPattern):
+                if __has_groupref(item):
+                    return True
+            elif isinstance(item, (list, tuple)):
+                for sub in item:
+                    if (isinstance(sub, sre_parse.SubPattern) and
+                            __has_groupref(sub)):
+                        return True
+
+    return False
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+""" Look up the scaling amount of the *-scale options
+
+A scale option maps thresholds to scaling amounts, e.g.
+{0: 0, 0.25: 5, 0.5: 10}. Scales are compiled once into sorted threshold
+and amount lists, and then looked up with bisect. The *_batch methods look
+up many values at once with NumPy, which is only needed for them.
+"""
+from bisect import bisect_left, bisect_right
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+NUMPY_MISSING = (
+    'NumPy is required for the batch lookups, install it with: '
+    'pip install numpy')
+
+
+def compile_scale(scale):
+    """ Compile a scale option into a StepFunction
+
+    :type scale: dict
+    :param scale: Threshold -> scaling amount
+    :returns: StepFunction
+    """
+    thresholds = sorted(scale.keys())
+    return StepFunction(thresholds, [scale[key] for key in thresholds])
+
+
+def get_step_function(scale):
+    """ Return the StepFunction of a scale option
+
+    Scales frozen with the configuration carry their compiled StepFunction,
+    other scales, like Consul overrides, are compiled here.
+
+    :type scale: dict
+    :param scale: Threshold -> scaling amount
+    :returns: StepFunction
+    """
+    steps = getattr(scale, 'steps', None)
+    if steps is None:
+        steps = compile_scale(scale)
+
+    return steps
+
+
+class StepFunction(object):
+    """ Scaling amounts of a scale option, by threshold
+
+    increase() returns the amount of the highest threshold at or below the
+    value, decrease() the amount of the lowest threshold at or above it.
+    Both return 0 if there is no such threshold. Use compile_scale() to
+    create one.
+    """
+    def __init__(self, thresholds, amounts):
+        """ Create the step function
+
+        :type thresholds: list
+        :param thresholds: Sorted thresholds
+        :type amounts: list
+        :param amounts: Scaling amount of each threshold
+        """
+        self.thresholds = thresholds
+        self.amounts = amounts
+
+    def increase(self, current_value):
+        """ Return the amount to scale up with
+
+        :type current_value: float
+        :param current_value: The current consumed units or throttled events
+        :returns: int -- The amount to scale provisioning by
+        """
+        index = bisect_right(self.thresholds, current_value)
+        if index == 0:
+            return 0
+
+        return self.amounts[index - 1]
+
+    def decrease(self, current_value):
+        """ Return the amount to scale down with
+
+        :type current_value: float
+        :param current_value: The current consumed units
+        :returns: int -- The amount to scale provisioning by
+        """
+        index = bisect_left(self.thresholds, current_value)
+        if index == len(self.thresholds):
+            return 0
+
+        return self.amounts[index]
+
+    def increase_batch(self, current_values):
+        """ Return the amounts to scale up with, see increase()
+
+        :type current_values: numpy.ndarray
+        :param current_values: The current consumed units or throttled events
+        :returns: numpy.ndarray -- The amounts to scale provisioning by
+        """
+        if numpy is None:
+            raise ImportError(NUMPY_MISSING)
+
+        indexes = numpy.searchsorted(
+            numpy.asarray(self.thresholds, dtype=float),
+            numpy.asarray(current_values, dtype=float),
+            side='right')
+
+        return numpy.asarray([0] + list(self.amounts))[indexes]
+
+    def decrease_batch(self, current_values):
+        """ Return the amounts to scale down with, see decrease()
+
+        :type current_values: numpy.ndarray
+        :param current_values: The current consumed units
+        :returns: numpy.ndarray -- The amounts to scale provisioning by
+        """
+        if numpy is None:
+            raise ImportError(NUMPY_MISSING)
+
+        current_values = numpy.asarray(current_values, dtype=float)
+        indexes = numpy.searchsorted(
+            numpy.asarray(self.thresholds, dtype=float),
+            current_values,
+            side='left')
+
+        # NaN is above all thresholds for searchsorted, but decrease()
+        # never finds it above one
+        indexes = numpy.where(numpy.isnan(current_values), 0, indexes)
+
+        return numpy.asarray(list(self.amounts) + [0])[indexes]
+
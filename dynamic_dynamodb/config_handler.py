@@ -2,8 +2,6 @@
 """ Configuration handler """
 import config
 
-CONFIGURATION = config.get_configuration()
-
 
 def get_configured_tables():
     """ Returns a list of all configured tables
@@ -11,7 +9,7 @@ def get_configured_tables():
     :returns: list -- List of tables
     """
     try:
-        return CONFIGURATION['tables'].keys()
+        return config.get_configuration()['tables'].keys()
     except KeyError:
         return []
 
@@ -22,7 +20,7 @@ def get_global_option(option):
     :returns: str or None
     """
     try:
-        return CONFIGURATION['global'][option]
+        return config.get_configuration()['global'][option]
     except KeyError:
         return None
 
@@ -37,22 +35,40 @@ def get_gsi_option(table_key, gsi_key, option):
     :returns: str or None
     """
     try:
-        return CONFIGURATION['tables'][table_key]['gsis'][gsi_key][option]
+        return config.get_configuration()['tables'][table_key]['gsis'][gsi_key][option]
     except KeyError:
         return None
 
 
+def get_gsi_matcher(table_key):
+    """ Returns the matcher for the GSI keys of a table key
+
+    :type table_key: str
+    :param table_key: Table key name
+    :returns: dynamic_dynamodb.config.matcher.Matcher or None
+    """
+    return config.get_matchers()['gsis'].get(table_key)
+
+
 def get_logging_option(option):
     """ Returns the value of the option
 
     :returns: str or None
     """
     try:
-        return CONFIGURATION['logging'][option]
+        return config.get_configuration()['logging'][option]
     except KeyError:
         return None
 
 
+def get_table_matcher():
+    """ Returns the matcher for the configured table keys
+
+    :returns: dynamic_dynamodb.config.matcher.Matcher
+    """
+    return config.get_matchers()['tables']
+
+
 def get_table_option(table_name, option):
     """ Returns the value of the option
 
@@ -61,6 +77,6 @@ def get_table_option(table_name, option):
     :returns: str or None
     """
     try:
-        return CONFIGURATION['tables'][table_name][option]
+        return config.get_configuration()['tables'][table_name][option]
     except KeyError:
         return None
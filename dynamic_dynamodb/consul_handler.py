@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+""" Handles the connection to Consul """
+import base64
+import bisect
+import json
+import threading
+import time
+
+import consul
+from requests.adapters import HTTPAdapter
+
+from dynamic_dynamodb.log_handler import LOGGER as logger
+from dynamic_dynamodb.config_handler import get_global_option
+
+# (host, token, max_workers, consul.Consul) of the current client
+CLIENT = None
+CLIENT_LOCK = threading.Lock()
+
+# Prefix of all keys written and read by Dynamic DynamoDB
+KV_PREFIX = 'dynamic-dynamodb/'
+
+# How long a blocking query waits for changes before returning
+WATCH_WAIT = '55s'
+
+# Seconds to wait before retrying a failed blocking query
+WATCH_RETRY_DELAY = 5
+
+# Parsed values of all keys under KV_PREFIX and the sorted list of all
+# keys, kept up to date by the watcher thread. OVERRIDES is None until the
+# first successful read.
+OVERRIDES = None
+OVERRIDE_KEYS = []
+
+# Maximum number of operations in one Consul transaction
+MAX_TXN_OPS = 64
+
+# Writes queued during the check cycle, key -> serialized value or None
+# for deletes. WRITTEN holds the last value written for each key.
+PENDING_WRITES = {}
+WRITTEN = {}
+WRITES_LOCK = threading.Lock()
+
+
+def get_client():
+    """ Return the Consul client
+
+    The client is created on first use and kept for the lifetime of the
+    process, so that its HTTP connections are reused between the checks.
+    A new client is only created if the Consul options change.
+
+    :returns: consul.Consul
+    """
+    global CLIENT
+
+    host = get_global_option('consul_host')
+    token = get_global_option('consul_token')
+    max_workers = get_global_option('max_workers')
+
+    with CLIENT_LOCK:
+        if CLIENT is None or CLIENT[:3] != (host, token, max_workers):
+            if CLIENT is not None:
+                CLIENT[3].http.session.close()
+
+            client = __get_connection_consul(host, token, max_workers)
+            CLIENT = (host, token, max_workers, client)
+            __start_watcher(client)
+
+        return CLIENT[3]
+
+
+def get_override(client, key):
+    """ Return the parsed override stored under a Consul key
+
+    Served from the map kept by the watcher. Consul is only read directly
+    if the map has not been loaded yet.
+
+    :type client: consul.Consul
+    :param client: Consul client
+    :type key: str
+    :param key: Consul key, e.g. dynamic-dynamodb/<table>
+    :returns: dict or None -- The override, None if the key does not exist
+    """
+    overrides = OVERRIDES
+    if overrides is not None:
+        return overrides.get(key)
+
+    l_tmp, l_data = client.kv.get(key)
+    if l_data is None:
+        return None
+
+    return json.loads(l_data['Value'])
+
+
+def get_effective_config(client, key, entity_config):
+    """ Return the configuration of a table or GSI with its override applied
+
+    :type client: consul.Consul
+    :param client: Consul client
+    :type key: str
+    :param key: Consul key of the override, e.g. dynamic-dynamodb/<table>
+    :type entity_config: dict
+    :param entity_config: Configuration from the config file
+    :returns: dict -- A copy of entity_config, updated with the override
+    """
+    effective_config = entity_config.copy()
+    try:
+        effective_config.update(get_override(client, key) or {})
+    except Exception as error:
+        logger.debug("Can't read config from consul for {0}: {1}".format(
+            key, error))
+
+    return effective_config
+
+
+def get_override_keys(client, prefix):
+    """ Return all Consul keys starting with prefix
+
+    :type client: consul.Consul
+    :param client: Consul client
+    :type prefix: str
+    :param prefix: Key prefix, e.g. dynamic-dynamodb/<table>/index/
+    :returns: list -- List of keys
+    """
+    if OVERRIDES is not None:
+        keys = OVERRIDE_KEYS
+        matches = []
+        for i in xrange(bisect.bisect_left(keys, prefix), len(keys)):
+            if not keys[i].startswith(prefix):
+                break
+            matches.append(keys[i])
+
+        return matches
+
+    l_tmp, l_data = client.kv.get(prefix, keys=True)
+    return l_data or []
+
+
+def get_pool_stats():
+    """ Return statistics about the Consul connection pool
+
+    :returns: dict -- Number of connections opened, requests sent and
+        connections currently idle in the pool
+    """
+    stats = {
+        'connections': 0,
+        'requests': 0,
+        'idle_connections': 0
+    }
+
+    if CLIENT is None:
+        return stats
+
+    adapter = CLIENT[3].http.session.get_adapter(
+        CLIENT[3].http.base_uri)
+    pools = adapter.poolmanager.pools
+    for key in pools.keys():
+        pool = pools.get(key)
+        if pool is None:
+            continue
+
+        stats['connections'] += pool.num_connections
+        stats['requests'] += pool.num_requests
+        if pool.pool is not None:
+            # Unused slots in the pool queue are filled with None
+            stats['idle_connections'] += len(
+                [conn for conn in list(pool.pool.queue) if conn])
+
+    return stats
+
+
+def queue_put(key, value):
+    """ Queue a value to be written to Consul by flush_writes()
+
+    Nothing is queued if the key already holds the same value.
+
+    :type key: str
+    :param key: Consul key
+    :type value: dict
+    :param value: Value, stored as JSON
+    """
+    serialized = json.dumps(value, sort_keys=True)
+
+    with WRITES_LOCK:
+        if key not in PENDING_WRITES and WRITTEN.get(key) == serialized:
+            return
+
+        overrides = OVERRIDES
+        if (key not in PENDING_WRITES and overrides is not None and
+                overrides.get(key) == json.loads(serialized)):
+            WRITTEN[key] = serialized
+            return
+
+        PENDING_WRITES[key] = serialized
+
+
+def queue_delete(key):
+    """ Queue a key to be deleted from Consul by flush_writes()
+
+    :type key: str
+    :param key: Consul key
+    """
+    with WRITES_LOCK:
+        PENDING_WRITES[key] = None
+
+
+def flush_writes(client):
+    """ Send the queued writes to Consul in transactions
+
+    Keys of a failed transaction are not recorded as written, so the
+    next cycle queues them again and they are retried every cycle until
+    a write succeeds.
+
+    :type client: consul.Consul
+    :param client: Consul client
+    :returns: int -- Number of keys written or deleted
+    """
+    global PENDING_WRITES
+
+    with WRITES_LOCK:
+        pending = PENDING_WRITES
+        PENDING_WRITES = {}
+
+    keys = sorted(pending.keys())
+    written = 0
+    for i in range(0, len(keys), MAX_TXN_OPS):
+        batch = keys[i:i + MAX_TXN_OPS]
+
+        operations = []
+        for key in batch:
+            if pending[key] is None:
+                operations.append({'KV': {'Verb': 'delete', 'Key': key}})
+            else:
+                operations.append({'KV': {
+                    'Verb': 'set',
+                    'Key': key,
+                    'Value': base64.b64encode(pending[key])
+                }})
+
+        try:
+            client.txn.put(operations)
+        except Exception as e:
+            logger.error("Can't update config in consul for {0}: {1}".format(
+                ', '.join(batch), e))
+            # Not recorded in WRITTEN, so they are retried next cycle
+            continue
+
+        with WRITES_LOCK:
+            for key in batch:
+                if pending[key] is None:
+                    WRITTEN.pop(key, None)
+                else:
+                    WRITTEN[key] = pending[key]
+
+        written += len(batch)
+
+    if keys:
+        logger.debug('Wrote {0:d} of {1:d} changed keys to consul'.format(
+            written, len(keys)))
+
+    return written
+
+
+def __load_overrides(client, index=None):
+    """ Read all keys under KV_PREFIX and replace the override map
+
+    :type client: consul.Consul
+    :param client: Consul client
+    :type index: str
+    :param index: X-Consul-Index to block on, None to return at once
+    :returns: str -- The X-Consul-Index of the response
+    """
+    global OVERRIDES, OVERRIDE_KEYS
+
+    if index is None:
+        new_index, l_data = client.kv.get(KV_PREFIX, recurse=True)
+    else:
+        new_index, l_data = client.kv.get(
+            KV_PREFIX, recurse=True, index=index, wait=WATCH_WAIT)
+
+    if index is not None and new_index == index:
+        # The blocking query timed out without changes
+        return new_index
+
+    overrides = {}
+    keys = []
+    for item in l_data or []:
+        keys.append(item['Key'])
+        if item['Value'] is None:
+            continue
+
+        try:
+            overrides[item['Key']] = json.loads(item['Value'])
+        except ValueError as e:
+            logger.error("Can't parse config from consul key {0}: {1}".format(
+                item['Key'], e))
+
+    OVERRIDE_KEYS = sorted(keys)
+    OVERRIDES = overrides
+    logger.debug('Read {0:d} config keys from consul, index {1}'.format(
+        len(overrides), new_index))
+
+    return new_index
+
+
+def __start_watcher(client):
+    """ Load the overrides and keep them up to date in a thread
+
+    No thread is started in --run-once mode, where the overrides are
+    read only once.
+
+    :type client: consul.Consul
+    :param client: Consul client
+    """
+    global OVERRIDES
+
+    OVERRIDES = None
+    try:
+        index = __load_overrides(client)
+    except Exception as e:
+        logger.error("Can't read config from consul: {0}".format(e))
+        index = None
+
+    if get_global_option('run_once'):
+        return
+
+    watcher = threading.Thread(
+        target=__watch_overrides, args=(client, index), name='consul-watch')
+    watcher.daemon = True
+    watcher.start()
+
+
+def __watch_overrides(client, index):
+    """ Update the overrides whenever a key under KV_PREFIX changes
+
+    Runs until the client is replaced.
+
+    :type client: consul.Consul
+    :param client: Consul client
+    :type index: str
+    :param index: X-Consul-Index of the last read, None if it failed
+    """
+    while CLIENT is not None and CLIENT[3] is client:
+        try:
+            new_index = __load_overrides(client, index)
+        except Exception as e:
+            logger.error("Can't watch config in consul: {0}".format(e))
+            time.sleep(WATCH_RETRY_DELAY)
+            continue
+
+        # The index is reset if it goes backwards, as the Consul docs say
+        if index is not None and int(new_index) < int(index):
+            index = None
+        else:
+            index = new_index
+
+
+def __get_connection_consul(host, token, max_workers):
+    """ Create a Consul client with a keep-alive connection pool
+
+    :type host: str
+    :param host: Consul host
+    :type token: str
+    :param token: Consul ACL token
+    :type max_workers: int
+    :param max_workers: Number of threads that will use the client
+    :returns: consul.Consul
+    """
+    client = consul.Consul(host=host, token=token)
+
+    # One connection per worker thread, plus one for the main thread
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers + 1)
+    client.http.session.mount('http://', adapter)
+    client.http.session.mount('https://', adapter)
+
+    logger.debug('Using Consul at {0}'.format(host))
+    return client
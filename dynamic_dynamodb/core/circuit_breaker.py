@@ -2,6 +2,8 @@
 """ Circuit breaker functionality """
 import re
 import sys
+import threading
+import time
 
 import requests
 
@@ -9,10 +11,33 @@ from dynamic_dynamodb.log_handler import LOGGER as logger
 from dynamic_dynamodb.config_handler import get_global_option, \
     get_table_option, get_gsi_option
 
+# Pattern used to parse the circuit breaker URLs
+URL_PATTERN = re.compile(
+    r'^(?P<scheme>http(s)?://)'
+    r'((?P<username>.+):(?P<password>.+)@){0,1}'
+    r'(?P<url>.*)$'
+)
+
+# Parsed circuit breaker URLs, url -> (request url, auth)
+PARSED_URLS = {}
+
+# Cached answers, (request url, auth) -> (expiry time, is open)
+RESULTS = {}
+
+# One lock per circuit breaker URL, so that only one thread polls it
+URL_LOCKS = {}
+LOCK = threading.Lock()
+
+# HTTP session, keeping connections to the circuit breakers open
+SESSION = requests.Session()
+
 
 def is_open(table_name=None, table_key=None, gsi_name=None, gsi_key=None):
     """ Checks whether the circuit breaker is open
 
+    With circuit-breaker-cache-ttl set, the answer for a URL is reused for
+    all tables and GSIs pointing at it until the TTL has passed.
+
     :param table_name: Name of the table being checked
     :param table_key: Configuration key for table
     :param gsi_name: Name of the GSI being checked
@@ -21,13 +46,6 @@ def is_open(table_name=None, table_key=None, gsi_name=None, gsi_key=None):
     """
     logger.debug('Checking circuit breaker status')
 
-    # Parse the URL to make sure it is OK
-    pattern = re.compile(
-        r'^(?P<scheme>http(s)?://)'
-        r'((?P<username>.+):(?P<password>.+)@){0,1}'
-        r'(?P<url>.*)$'
-    )
-
     url = timeout = None
     if gsi_name:
         url = get_gsi_option(table_key, gsi_key, 'circuit_breaker_url')
@@ -40,7 +58,47 @@ def is_open(table_name=None, table_key=None, gsi_name=None, gsi_key=None):
         url = get_global_option('circuit_breaker_url')
         timeout = get_global_option('circuit_breaker_timeout')
 
-    match = pattern.match(url)
+    request_url, auth = __parse_url(url)
+
+    headers = {}
+    if table_name:
+        headers["x-table-name"] = table_name
+    if gsi_name:
+        headers["x-gsi-name"] = gsi_name
+
+    cache_ttl = get_global_option('circuit_breaker_cache_ttl')
+    if not cache_ttl:
+        return __poll(request_url, auth, timeout, headers)
+
+    key = (request_url, auth)
+    with LOCK:
+        url_lock = URL_LOCKS.setdefault(key, threading.Lock())
+
+    with url_lock:
+        expires, circuit_open = RESULTS.get(key, (0, True))
+        if expires > time.time():
+            logger.debug('Using cached circuit breaker status')
+            return circuit_open
+
+        circuit_open = __poll(request_url, auth, timeout, headers)
+        RESULTS[key] = (time.time() + cache_ttl, circuit_open)
+
+    return circuit_open
+
+
+def __parse_url(url):
+    """ Parse the circuit breaker URL, exits if it is malformatted
+
+    :type url: str
+    :param url: Circuit breaker URL, optionally with basic auth credentials
+    :returns: (str, tuple) -- URL to call and basic auth credentials
+    """
+    try:
+        return PARSED_URLS[url]
+    except KeyError:
+        pass
+
+    match = URL_PATTERN.match(url)
     if not match:
         logger.error('Malformatted URL: {0}'.format(url))
         sys.exit(1)
@@ -50,22 +108,33 @@ def is_open(table_name=None, table_key=None, gsi_name=None, gsi_key=None):
         use_basic_auth = True
 
     # Make the actual URL to call
+    request_url = url
     auth = ()
     if use_basic_auth:
-        url = '{scheme}{url}'.format(
+        request_url = '{scheme}{url}'.format(
             scheme=match.group('scheme'),
             url=match.group('url'))
         auth = (match.group('username'), match.group('password'))
 
-    headers = {}
-    if table_name:
-        headers["x-table-name"] = table_name
-    if gsi_name:
-        headers["x-gsi-name"] = gsi_name
+    PARSED_URLS[url] = (request_url, auth)
+    return request_url, auth
 
-    # Make the actual request
+
+def __poll(url, auth, timeout, headers):
+    """ Poll the circuit breaker
+
+    :type url: str
+    :param url: URL to call
+    :type auth: tuple
+    :param auth: Basic auth credentials, empty if not used
+    :type timeout: float
+    :param timeout: Timeout in ms
+    :type headers: dict
+    :param headers: Headers identifying the table and GSI
+    :returns: bool -- True if the circuit is open
+    """
     try:
-        response = requests.get(
+        response = SESSION.get(
             url,
             auth=auth,
             timeout=timeout / 1000.00,
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+""" Damped proportional-integral controller for the provisioning
+
+With scaling-controller set to pi, the reads and writes of a table or GSI
+are steered towards target-reads-utilization and
+target-writes-utilization instead of following the thresholds. Each check
+the provisioning is multiplied by
+
+    1 + proportional gain * error + integral gain * integral
+
+where the error is the relative distance of the utilisation from the
+target and the integral is the leaky sum of the errors since the last
+update. The provisioning is only changed while both the utilisation and
+its moving average are outside the hysteresis band around the target, or
+when all of the provisioning is used. Single noisy checks do not change
+the provisioning, a lasting drift always does.
+
+The integral and the average are only reset once an update has been
+applied, see record_update(). The state also keeps the times of the
+decreases of the last day, as DynamoDB only allows a few decreases per
+table or GSI a day.
+"""
+import math
+import time
+
+# Controller state of each table and GSI, (table_name, gsi_name,
+# operation) -> state, gsi_name is None for tables
+STATES = {}
+
+# Largest magnitude of the integral, in multiples of the target
+MAX_INTEGRAL = 2.0
+
+# Share of the integral kept from one check to the next
+INTEGRAL_DECAY = 0.9
+
+# Weight of the latest check in the moving average of the distance from
+# the target
+AVERAGE_WEIGHT = 0.3
+
+# Seconds the decreases count against controller-max-decreases-per-day
+DAY = 24 * 60 * 60
+
+
+def get_state(table_name, gsi_name, operation):
+    """ Return the controller state of a table or GSI
+
+    :type table_name: str
+    :param table_name: Name of the DynamoDB table
+    :type gsi_name: str
+    :param gsi_name: Name of the GSI, None for the table
+    :type operation: str
+    :param operation: 'reads' or 'writes'
+    :returns: dict or None -- None before the first check
+    """
+    return STATES.get((table_name, gsi_name, operation))
+
+
+def set_state(table_name, gsi_name, operation, state):
+    """ Store the controller state of a table or GSI
+
+    :type table_name: str
+    :param table_name: Name of the DynamoDB table
+    :type gsi_name: str
+    :param gsi_name: Name of the GSI, None for the table
+    :type operation: str
+    :param operation: 'reads' or 'writes'
+    :type state: dict
+    :param state: Controller state, None to forget it
+    """
+    if state is None:
+        STATES.pop((table_name, gsi_name, operation), None)
+    else:
+        STATES[(table_name, gsi_name, operation)] = state
+
+
+def forget_table(table_name):
+    """ Drop the controller states of a table and its GSIs
+
+    Called when a table is no longer found, so its states are not kept
+    for ever.
+
+    :type table_name: str
+    :param table_name: Name of the DynamoDB table
+    """
+    for key in list(STATES):
+        if key[0] == table_name:
+            del STATES[key]
+
+
+def get_states(table_name, gsi_name):
+    """ Return the controller states of a table or GSI
+
+    :type table_name: str
+    :param table_name: Name of the DynamoDB table
+    :type gsi_name: str
+    :param gsi_name: Name of the GSI, None for the table
+    :returns: dict -- 'reads' and 'writes' -> state, for core.decision.plan
+    """
+    return dict(
+        (operation, state)
+        for (table, gsi, operation), state in STATES.items()
+        if table == table_name and gsi == gsi_name)
+
+
+def store_plan(table_name, gsi_name, scaling_plan):
+    """ Store the controller states of a scaling plan
+
+    :type table_name: str
+    :param table_name: Name of the DynamoDB table
+    :type gsi_name: str
+    :param gsi_name: Name of the GSI, None for the table
+    :type scaling_plan: core.decision.Plan
+    :param scaling_plan: Plan made at the check
+    """
+    for scaling in (scaling_plan.reads, scaling_plan.writes):
+        set_state(
+            table_name, gsi_name, scaling.operation,
+            scaling.controller_state)
+
+
+def record_plan(table_name, gsi_name, scaling_plan, applied, now=None):
+    """ Update the controller states after a scaling plan was applied
+
+    :type table_name: str
+    :param table_name: Name of the DynamoDB table
+    :type gsi_name: str
+    :param gsi_name: Name of the GSI, None for the table
+    :type scaling_plan: core.decision.Plan
+    :param scaling_plan: Plan the update was made for
+    :type applied: tuple
+    :param applied: (reads, writes) set, None if nothing was changed
+    :type now: float
+    :param now: Time of the update, now if None
+    """
+    if applied is None:
+        return
+
+    record_update(
+        table_name,
+        gsi_name,
+        {
+            'reads': scaling_plan.reads.current_units,
+            'writes': scaling_plan.writes.current_units
+        },
+        {'reads': applied[0], 'writes': applied[1]},
+        now)
+
+
+def record_update(table_name, gsi_name, current, applied, now=None):
+    """ Update the controller states after the provisioning was changed
+
+    :type table_name: str
+    :param table_name: Name of the DynamoDB table
+    :type gsi_name: str
+    :param gsi_name: Name of the GSI, None for the table
+    :type current: dict
+    :param current: Provisioning before the update, per operation
+    :type applied: dict
+    :param applied: Provisioning after the update, per operation
+    :type now: float
+    :param now: Time of the update, now if None
+    """
+    if now is None:
+        now = time.time()
+
+    # Decreasing the reads, the writes or both is one decrease
+    decreased = any(
+        applied[operation] < current[operation] for operation in current)
+    for operation in current:
+        set_state(
+            table_name,
+            gsi_name,
+            operation,
+            get_updated_state(
+                get_state(table_name, gsi_name, operation),
+                applied[operation] != current[operation],
+                decreased,
+                now))
+
+
+def get_updated_state(state, changed, decreased, now):
+    """ Return the controller state after an update was applied
+
+    :type state: dict
+    :param state: Controller state, or None
+    :type changed: bool
+    :param changed: True if the provisioning of the operation changed
+    :type decreased: bool
+    :param decreased: True if the update decreased the table or GSI
+    :type now: float
+    :param now: Time of the update
+    :returns: dict or None -- None if state is None
+    """
+    if state is None:
+        return None
+
+    state = dict(state)
+    if changed:
+        # The update corrects the error so far, start over from it
+        state['integral'] = 0.0
+        state['average'] = 0.0
+
+    state['decreases'] = __get_recent_decreases(state, now)
+    if decreased:
+        state['decreases'].append(now)
+
+    return state
+
+
+def get_decreases_left(state, max_decreases_per_day, now):
+    """ Return how many more decreases may be made today
+
+    :type state: dict
+    :param state: Controller state, or None
+    :type max_decreases_per_day: int
+    :param max_decreases_per_day: Decreases allowed in a day
+    :type now: float
+    :param now: Current time
+    :returns: int
+    """
+    return max_decreases_per_day - len(__get_recent_decreases(state, now))
+
+
+def step(
+        current_units, consumed_percent, target_utilization,
+        proportional_gain, integral_gain, hysteresis_band, state):
+    """ Propose the provisioning for the next check
+
+    :type current_units: int
+    :param current_units: Currently provisioned units
+    :type consumed_percent: float
+    :param consumed_percent: Percent of the provisioning consumed
+    :type target_utilization: int
+    :param target_utilization: Percent of the provisioning to consume
+    :type proportional_gain: float
+    :param proportional_gain: Share of the error corrected at once
+    :type integral_gain: float
+    :param integral_gain: Share of the integral corrected
+    :type hysteresis_band: float
+    :param hysteresis_band: Percentage points around the target where
+        the provisioning is kept
+    :type state: dict
+    :param state: Controller state from the last check, or None
+    :returns: (int, dict) -- Proposed units and the new controller state
+    """
+    state = dict(state or {})
+
+    distance = consumed_percent - target_utilization
+    average = AVERAGE_WEIGHT * distance + (1 - AVERAGE_WEIGHT) * \
+        state.get('average', distance)
+    state['average'] = average
+
+    error = distance / float(target_utilization)
+    integral = min(
+        max(state.get('integral', 0.0) * INTEGRAL_DECAY + error,
+            -MAX_INTEGRAL),
+        MAX_INTEGRAL)
+    state['integral'] = integral
+
+    if consumed_percent < 100 and not (
+            abs(distance) > hysteresis_band and
+            abs(average) > hysteresis_band and
+            distance * average > 0):
+        return current_units, state
+
+    factor = max(
+        1 + proportional_gain * error + integral_gain * integral, 0)
+
+    return int(math.ceil(current_units * factor)), state
+
+
+def __get_recent_decreases(state, now):
+    """ Return the times of the decreases in the last day
+
+    :type state: dict
+    :param state: Controller state, or None
+    :type now: float
+    :param now: Current time
+    :returns: list
+    """
+    return [
+        decreased for decreased in (state or {}).get('decreases', [])
+        if decreased > now - DAY]
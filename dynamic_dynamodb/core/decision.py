@@ -0,0 +1,682 @@
+# -*- coding: utf-8 -*-
+""" Decide how to scale the provisioning of a table or GSI
+
+The decisions are made from a snapshot of the metrics, the current
+provisioning, the effective configuration and the consecutive check
+counters only. Nothing is fetched from AWS and nothing is logged here: the
+log messages are returned with the plan. The callers in core.table and
+core.gsi fetch the inputs, log the messages and carry out the plan.
+
+A metrics snapshot is a dict with the keys consumed_percent,
+throttled_count, throttled_by_provisioned_percent and
+throttled_by_consumed_percent.
+
+Tables and GSIs with scaling-controller set to pi are scaled by the
+controller in core.controller instead of the thresholds. Its state is
+passed in and returned with the decisions, like the consecutive check
+counters.
+"""
+import time
+
+from dynamic_dynamodb import calculators
+from dynamic_dynamodb.core import controller
+from dynamic_dynamodb.config.scale import get_step_function
+
+OPERATIONS = ('reads', 'writes')
+
+INCREASE = {
+    'reads': calculators.increase_reads,
+    'writes': calculators.increase_writes
+}
+DECREASE = {
+    'reads': calculators.decrease_reads,
+    'writes': calculators.decrease_writes
+}
+
+# Options used in the decisions, {0} is reads or writes and {1} is read or
+# write
+OPTIONS = [
+    ('enable_autoscaling', 'enable_{0}_autoscaling'),
+    ('enable_up_scaling', 'enable_{0}_up_scaling'),
+    ('enable_down_scaling', 'enable_{0}_down_scaling'),
+    ('allow_scaling_down_on_0_percent', 'allow_scaling_down_{0}_on_0_percent'),
+    ('upper_threshold', '{0}_upper_threshold'),
+    ('lower_threshold', '{0}_lower_threshold'),
+    ('throttled_upper_threshold', 'throttled_{0}_upper_threshold'),
+    ('increase_unit', 'increase_{0}_unit'),
+    ('increase_with', 'increase_{0}_with'),
+    ('target_utilization', 'target_{0}_utilization'),
+    ('decrease_unit', 'decrease_{0}_unit'),
+    ('decrease_with', 'decrease_{0}_with'),
+    ('min_provisioned', 'min_provisioned_{0}'),
+    ('max_provisioned', 'max_provisioned_{0}'),
+    ('num_checks_before_scale_down', 'num_{1}_checks_before_scale_down'),
+    ('num_checks_reset_percent', 'num_{1}_checks_reset_percent'),
+    ('increase_throttled_by_provisioned_unit',
+     'increase_throttled_by_provisioned_{0}_unit'),
+    ('increase_throttled_by_provisioned_scale',
+     'increase_throttled_by_provisioned_{0}_scale'),
+    ('increase_throttled_by_consumed_unit',
+     'increase_throttled_by_consumed_{0}_unit'),
+    ('increase_throttled_by_consumed_scale',
+     'increase_throttled_by_consumed_{0}_scale'),
+    ('increase_consumed_unit', 'increase_consumed_{0}_unit'),
+    ('increase_consumed_with', 'increase_consumed_{0}_with'),
+    ('increase_consumed_scale', 'increase_consumed_{0}_scale'),
+    ('decrease_consumed_unit', 'decrease_consumed_{0}_unit'),
+    ('decrease_consumed_with', 'decrease_consumed_{0}_with'),
+    ('decrease_consumed_scale', 'decrease_consumed_{0}_scale'),
+    ('controller', 'scaling_controller'),
+    ('proportional_gain', 'controller_proportional_gain'),
+    ('integral_gain', 'controller_integral_gain'),
+    ('hysteresis_band', 'controller_hysteresis_band'),
+    ('max_decreases_per_day', 'controller_max_decreases_per_day')
+]
+
+
+class Decision(object):
+    """ Decision for the reads or writes of a table or GSI """
+
+    def __init__(
+            self, operation, current_units, num_consec_checks,
+            controller_state=None):
+        """ Start with keeping the current provisioning
+
+        :type operation: str
+        :param operation: 'reads' or 'writes'
+        :type current_units: int
+        :param current_units: Currently provisioned units
+        :type num_consec_checks: int
+        :param num_consec_checks: Consecutive checks meeting the scale down
+            criteria so far
+        :type controller_state: dict
+        :param controller_state: State of the PI controller, see
+            core.controller
+        """
+        self.operation = operation
+        self.current_units = current_units
+        self.units = current_units
+        self.update_needed = False
+        self.num_consec_checks = num_consec_checks
+        self.controller_state = controller_state
+        self.messages = []
+
+    def log(self, level, message):
+        """ Add a log message
+
+        :type level: str
+        :param level: Log level, e.g. info
+        :type message: str
+        :param message: Message
+        """
+        self.messages.append((level, message))
+
+
+class Plan(object):
+    """ Scaling plan for a table or GSI """
+
+    def __init__(self, reads, writes):
+        """ Combine the decisions for reads and writes
+
+        :type reads: Decision
+        :param reads: Decision for the reads
+        :type writes: Decision
+        :param writes: Decision for the writes
+        """
+        self.reads = reads
+        self.writes = writes
+
+    @property
+    def update_needed(self):
+        """ True if the reads or the writes should be updated """
+        return self.reads.update_needed or self.writes.update_needed
+
+    @property
+    def messages(self):
+        """ Log messages of the reads and writes decisions, in order
+
+        :returns: list -- List of tuples (level, message)
+        """
+        return self.reads.messages + self.writes.messages
+
+
+def plan(
+        snapshots, provisioning, entity_config, num_consec_checks, log_tag,
+        controller_states=None, now=None):
+    """ Decide how to scale the reads and writes of a table or GSI
+
+    :type snapshots: dict
+    :param snapshots: Metrics snapshot per operation, may be None for
+        operations with autoscaling disabled
+    :type provisioning: dict
+    :param provisioning: Currently provisioned units per operation
+    :type entity_config: dict
+    :param entity_config: Effective configuration of the table or GSI
+    :type num_consec_checks: dict
+    :param num_consec_checks: Consecutive check counter per operation
+    :type log_tag: str
+    :param log_tag: Prefix for the log messages
+    :type controller_states: dict
+    :param controller_states: PI controller state per operation
+    :type now: float
+    :param now: Time of the check, now if None
+    :returns: Plan
+    """
+    controller_states = controller_states or {}
+
+    return Plan(*[
+        decide(
+            operation,
+            snapshots[operation],
+            provisioning[operation],
+            entity_config,
+            num_consec_checks[operation],
+            log_tag,
+            controller_states.get(operation),
+            now)
+        for operation in OPERATIONS
+    ])
+
+
+def decide(
+        operation, snapshot, current_units, entity_config,
+        num_consec_checks, log_tag, controller_state=None, now=None):
+    """ Decide how to scale the reads or writes of a table or GSI
+
+    :type operation: str
+    :param operation: 'reads' or 'writes'
+    :type snapshot: dict
+    :param snapshot: Metrics snapshot, may be None if autoscaling of the
+        operation is disabled
+    :type current_units: int
+    :param current_units: Currently provisioned units
+    :type entity_config: dict
+    :param entity_config: Effective configuration of the table or GSI
+    :type num_consec_checks: int
+    :param num_consec_checks: Consecutive checks meeting the scale down
+        criteria so far
+    :type log_tag: str
+    :param log_tag: Prefix for the log messages
+    :type controller_state: dict
+    :param controller_state: State of the PI controller, see core.controller
+    :type now: float
+    :param now: Time of the check, now if None
+    :returns: Decision
+    """
+    options = __get_options(entity_config, operation)
+    decision = Decision(
+        operation, current_units, num_consec_checks, controller_state)
+
+    if not options['enable_autoscaling']:
+        decision.log(
+            'info',
+            '{0} - Autoscaling of {1} has been disabled'.format(
+                log_tag, operation))
+        decision.num_consec_checks = 0
+        return decision
+
+    consumed_percent = snapshot['consumed_percent']
+
+    if options['controller'] == 'pi':
+        __decide_controller(
+            decision,
+            snapshot,
+            options,
+            log_tag,
+            time.time() if now is None else now)
+    else:
+        __decide_thresholds(decision, snapshot, options, log_tag)
+
+    # Never go over the configured max provisioning
+    max_provisioned = options['max_provisioned']
+    if max_provisioned and int(decision.units) > max_provisioned:
+        decision.update_needed = True
+        decision.units = max_provisioned
+        decision.log(
+            'info',
+            '{0} - Will not increase {1} over max-provisioned-{1} '
+            'limit ({2} {1})'.format(log_tag, operation, decision.units))
+
+    # Ensure that we have met the min provisioning
+    min_provisioned = options['min_provisioned']
+    if min_provisioned and int(min_provisioned) > int(decision.units):
+        decision.update_needed = True
+        decision.units = int(min_provisioned)
+        decision.log(
+            'info',
+            '{0} - Increasing {1} to meet min-provisioned-{1} '
+            'limit ({2} {1})'.format(log_tag, operation, decision.units))
+
+    if calculators.is_consumed_over_proposed(
+            current_units, decision.units, consumed_percent):
+        decision.update_needed = False
+        decision.units = current_units
+        decision.log(
+            'info',
+            '{0} - Consumed is over proposed {1} units. Will leave the '
+            'provisioning at the current setting.'.format(
+                log_tag, operation[:-1]))
+
+    if options['controller'] != 'pi':
+        decision.log(
+            'debug',
+            '{0} - Consecutive {1} checks {2}/{3}'.format(
+                log_tag,
+                operation[:-1],
+                decision.num_consec_checks,
+                options['num_checks_before_scale_down']))
+
+    if decision.update_needed:
+        decision.num_consec_checks = 0
+
+    return decision
+
+
+def scale_reader(provision_increase_scale, current_value):
+    """ Return the amount to scale up with
+
+    :type provision_increase_scale: dict
+    :param provision_increase_scale: dictionary with key being the
+        scaling threshold and value being scaling amount
+    :type current_value: float
+    :param current_value: the current consumed units or throttled events
+    :returns: (int) The amount to scale provisioning by
+    """
+    if not provision_increase_scale:
+        return 0
+
+    return get_step_function(provision_increase_scale).increase(
+        current_value)
+
+
+def scale_reader_decrease(provision_decrease_scale, current_value):
+    """ Return the amount to scale down with
+
+    :type provision_decrease_scale: dict
+    :param provision_decrease_scale: dictionary with key being the
+        scaling threshold and value being scaling amount
+    :type current_value: float
+    :param current_value: the current consumed units or throttled events
+    :returns: (int) The amount to scale provisioning by
+    """
+    if not provision_decrease_scale:
+        return 0
+
+    return get_step_function(provision_decrease_scale).decrease(
+        current_value)
+
+
+def __decide_thresholds(decision, snapshot, options, log_tag):
+    """ Scale by the thresholds, scales and consecutive checks
+
+    :type decision: Decision
+    :param decision: Decision to update
+    :type snapshot: dict
+    :param snapshot: Metrics snapshot
+    :type options: dict
+    :param options: Options of the operation, see __get_options()
+    :type log_tag: str
+    :param log_tag: Prefix for the log messages
+    """
+    consumed_percent = snapshot['consumed_percent']
+
+    # Reset the consecutive checks if the reset percent is reached
+    if (options['num_checks_reset_percent'] and
+            consumed_percent >= options['num_checks_reset_percent']):
+        decision.log(
+            'info',
+            '{0} - Resetting the number of consecutive {1} checks. '
+            'Reason: Consumed percent {2} is greater than reset percent: '
+            '{3}'.format(
+                log_tag,
+                decision.operation[:-1],
+                consumed_percent,
+                options['num_checks_reset_percent']))
+        decision.num_consec_checks = 0
+
+    if (consumed_percent == 0 and
+            not options['allow_scaling_down_on_0_percent']):
+        decision.log(
+            'info',
+            '{0} - Scaling down {1} is not done when usage is at 0%'.format(
+                log_tag, decision.operation))
+
+    if not options['enable_up_scaling']:
+        decision.log(
+            'debug',
+            '{0} - Up scaling event detected. No action taken as scaling up '
+            '{1} has been disabled in the configuration'.format(
+                log_tag, decision.operation))
+    else:
+        __decide_increase(decision, snapshot, options, log_tag)
+
+    if not decision.update_needed:
+        if not options['enable_down_scaling']:
+            decision.log(
+                'debug',
+                '{0} - Down scaling event detected. No action taken as '
+                'scaling down {1} has been disabled in the '
+                'configuration'.format(log_tag, decision.operation))
+        else:
+            __decide_decrease(decision, snapshot, options, log_tag)
+
+
+def __decide_controller(decision, snapshot, options, log_tag, now):
+    """ Scale by the PI controller, see core.controller
+
+    Decreases are only made while the decreases of the last day are fewer
+    than controller-max-decreases-per-day.
+
+    :type decision: Decision
+    :param decision: Decision to update
+    :type snapshot: dict
+    :param snapshot: Metrics snapshot
+    :type options: dict
+    :param options: Options of the operation, see __get_options()
+    :type log_tag: str
+    :param log_tag: Prefix for the log messages
+    :type now: float
+    :param now: Time of the check
+    """
+    current_units = decision.current_units
+    consumed_percent = snapshot['consumed_percent']
+
+    # Throttled requests are not counted as consumed, so a throttled table
+    # or GSI wants all of its provisioning and the throttled requests
+    if snapshot['throttled_count'] > (
+            options['throttled_upper_threshold'] or 0):
+        consumed_percent = max(consumed_percent, 100.0) + \
+            snapshot['throttled_by_provisioned_percent']
+
+    proposed_units, decision.controller_state = controller.step(
+        current_units,
+        consumed_percent,
+        options['target_utilization'],
+        options['proportional_gain'],
+        options['integral_gain'],
+        options['hysteresis_band'],
+        decision.controller_state)
+    decision.num_consec_checks = 0
+
+    units = current_units
+    if proposed_units > current_units:
+        if not options['enable_up_scaling']:
+            decision.log(
+                'debug',
+                '{0} - Up scaling event detected. No action taken as '
+                'scaling up {1} has been disabled in the '
+                'configuration'.format(log_tag, decision.operation))
+        else:
+            units = INCREASE[decision.operation](
+                'units',
+                current_units,
+                proposed_units - current_units,
+                options['max_provisioned'],
+                0,
+                log_tag)
+    elif proposed_units < current_units:
+        if not options['enable_down_scaling']:
+            decision.log(
+                'debug',
+                '{0} - Down scaling event detected. No action taken as '
+                'scaling down {1} has been disabled in the '
+                'configuration'.format(log_tag, decision.operation))
+        elif (consumed_percent == 0 and
+                not options['allow_scaling_down_on_0_percent']):
+            decision.log(
+                'info',
+                '{0} - Scaling down {1} is not done when usage is at '
+                '0%'.format(log_tag, decision.operation))
+        elif controller.get_decreases_left(
+                decision.controller_state,
+                options['max_decreases_per_day'],
+                now) < 1:
+            decision.log(
+                'info',
+                '{0} - Not scaling down {1}, the {2:d} decreases of the '
+                'last day have been made'.format(
+                    log_tag,
+                    decision.operation,
+                    options['max_decreases_per_day']))
+        else:
+            units = DECREASE[decision.operation](
+                'units',
+                current_units,
+                current_units - proposed_units,
+                options['min_provisioned'],
+                log_tag)
+
+    if units != current_units:
+        decision.log(
+            'info',
+            '{0} - Controller moves {1} from {2:d} to {3:d} units, '
+            '{4:.1f}% consumed, target {5}%'.format(
+                log_tag,
+                decision.operation,
+                int(current_units),
+                int(units),
+                consumed_percent,
+                options['target_utilization']))
+        decision.update_needed = True
+        decision.units = units
+
+
+def __decide_increase(decision, snapshot, options, log_tag):
+    """ Scale up if any metric calls for it, by the largest amount asked for
+
+    :type decision: Decision
+    :param decision: Decision to update
+    :type snapshot: dict
+    :param snapshot: Metrics snapshot
+    :type options: dict
+    :param options: Options of the operation, see __get_options()
+    :type log_tag: str
+    :param log_tag: Prefix for the log messages
+    """
+    current_units = decision.current_units
+    consumed_percent = snapshot['consumed_percent']
+
+    # If local/granular values not specified use global values
+    increase_unit = options['increase_unit']
+    increase_consumed_unit = options['increase_consumed_unit'] or \
+        increase_unit
+    increase_consumed_with = options['increase_consumed_with'] or \
+        options['increase_with']
+
+    # Provisioning asked for by each metric, and the reason
+    candidates = []
+
+    # Increase needed due to high throttled to provisioned ratio
+    amount = scale_reader(
+        options['increase_throttled_by_provisioned_scale'],
+        snapshot['throttled_by_provisioned_percent'])
+    if amount:
+        candidates.append((
+            __increase(
+                decision,
+                options['increase_throttled_by_provisioned_unit'] or
+                increase_unit,
+                amount,
+                options,
+                consumed_percent,
+                log_tag,
+                throttled=True),
+            'due to throttled events by provisioned units threshold being '
+            'exceeded'))
+
+    # Increase needed due to high throttled to consumed ratio
+    amount = scale_reader(
+        options['increase_throttled_by_consumed_scale'],
+        snapshot['throttled_by_consumed_percent'])
+    if amount:
+        candidates.append((
+            __increase(
+                decision,
+                options['increase_throttled_by_consumed_unit'] or
+                increase_unit,
+                amount,
+                options,
+                consumed_percent,
+                log_tag,
+                throttled=True),
+            'due to throttled events by consumed units threshold being '
+            'exceeded'))
+
+    # Increase needed due to high CU consumption. The upper threshold is
+    # only used if no scale is configured
+    amount = scale_reader(
+        options['increase_consumed_scale'], consumed_percent)
+    if (not amount and
+            not options['increase_consumed_scale'] and
+            options['upper_threshold'] and
+            consumed_percent > options['upper_threshold']):
+        amount = increase_consumed_with
+    if amount:
+        candidates.append((
+            __increase(
+                decision,
+                increase_consumed_unit,
+                amount,
+                options,
+                consumed_percent,
+                log_tag),
+            'due to consumed threshold being exceeded'))
+
+    # Increase needed due to high throttling
+    if (options['throttled_upper_threshold'] and
+            snapshot['throttled_count'] >
+            options['throttled_upper_threshold']):
+        candidates.append((
+            __increase(
+                decision,
+                increase_unit,
+                options['increase_with'],
+                options,
+                consumed_percent,
+                log_tag,
+                throttled=True),
+            'due to throttled events threshold being exceeded'))
+
+    # Determine which metric requires the most scaling, the first one wins
+    # a tie
+    calculated_provisioning = 0
+    scale_reason = None
+    for units, reason in candidates:
+        if units > calculated_provisioning:
+            calculated_provisioning = units
+            scale_reason = reason
+
+    if calculated_provisioning > current_units:
+        decision.log(
+            'info',
+            '{0} - Resetting the number of consecutive {1} checks. '
+            'Reason: scale up {2}'.format(
+                log_tag, decision.operation[:-1], scale_reason))
+        decision.num_consec_checks = 0
+        decision.update_needed = True
+        decision.units = calculated_provisioning
+
+
+def __increase(
+        decision, unit, amount, options, consumed_percent, log_tag,
+        throttled=False):
+    """ Return the provisioning after scaling up
+
+    With the target unit, the amount only decides that the provisioning is
+    increased. The new provisioning is sized for the target utilisation.
+    Throttled requests are not counted as consumed, so a throttled table or
+    GSI is sized as if it consumed at least all of its provisioning.
+
+    :type decision: Decision
+    :param decision: Decision being made
+    :type unit: str
+    :param unit: 'percent', 'units' or 'target'
+    :type amount: int
+    :param amount: Percent or units to increase with
+    :type options: dict
+    :param options: Options of the operation, see __get_options()
+    :type consumed_percent: float
+    :param consumed_percent: Percent of the provisioning consumed
+    :type log_tag: str
+    :param log_tag: Prefix for the log messages
+    :type throttled: bool
+    :param throttled: True if the increase is due to throttling
+    :returns: int -- New provisioning
+    """
+    if unit == 'target':
+        amount = options['target_utilization']
+        if throttled:
+            consumed_percent = max(consumed_percent, 100.0)
+
+    return INCREASE[decision.operation](
+        unit,
+        decision.current_units,
+        amount,
+        options['max_provisioned'],
+        consumed_percent,
+        log_tag)
+
+
+def __decide_decrease(decision, snapshot, options, log_tag):
+    """ Scale down once the consumption has been low for enough checks
+
+    :type decision: Decision
+    :param decision: Decision to update
+    :type snapshot: dict
+    :param snapshot: Metrics snapshot
+    :type options: dict
+    :param options: Options of the operation, see __get_options()
+    :type log_tag: str
+    :param log_tag: Prefix for the log messages
+    """
+    current_units = decision.current_units
+    consumed_percent = snapshot['consumed_percent']
+
+    # The lower threshold is only used if no scale is configured
+    amount = scale_reader_decrease(
+        options['decrease_consumed_scale'], consumed_percent)
+    if (not amount and
+            not options['decrease_consumed_scale'] and
+            options['lower_threshold'] and
+            consumed_percent < options['lower_threshold']):
+        # If local/granular values not specified use global values
+        amount = options['decrease_consumed_with'] or \
+            options['decrease_with']
+
+    if not amount:
+        return
+
+    calculated_provisioning = DECREASE[decision.operation](
+        options['decrease_consumed_unit'] or options['decrease_unit'],
+        current_units,
+        amount,
+        options['min_provisioned'],
+        log_tag)
+
+    if calculated_provisioning and current_units != calculated_provisioning:
+        decision.num_consec_checks += 1
+
+        if (decision.num_consec_checks >=
+                options['num_checks_before_scale_down']):
+            decision.update_needed = True
+            decision.units = calculated_provisioning
+
+
+def __get_options(entity_config, operation):
+    """ Return the options of an operation, without the operation in the
+    option names
+
+    :type entity_config: dict
+    :param entity_config: Effective configuration of the table or GSI
+    :type operation: str
+    :param operation: 'reads' or 'writes'
+    :returns: dict -- Options, e.g. upper_threshold for reads_upper_threshold
+    """
+    options = dict(
+        (name, entity_config.get(option.format(operation, operation[:-1])))
+        for name, option in OPTIONS)
+
+    if options['max_provisioned']:
+        options['max_provisioned'] = int(options['max_provisioned'])
+
+    return options
@@ -2,15 +2,16 @@
 """ Core components """
 from boto.exception import JSONResponseError, BotoServerError
 
-from dynamic_dynamodb import calculators
+from dynamic_dynamodb import consul_handler, scheduler, timing
 from dynamic_dynamodb.aws import dynamodb, sns
-from dynamic_dynamodb.core import circuit_breaker
+from dynamic_dynamodb.core import circuit_breaker, controller, decision
+from dynamic_dynamodb.core.decision import (  # noqa
+    scale_reader, scale_reader_decrease)
 from dynamic_dynamodb.statistics import gsi as gsi_stats
 from dynamic_dynamodb.log_handler import LOGGER as logger
 from dynamic_dynamodb.config_handler import get_global_option
 
 import dynamic_dynamodb.config
-import json
 
 def ensure_provisioning(
         _consulapi,
@@ -30,59 +31,78 @@ def ensure_provisioning(
     :param num_consec_read_checks: How many consecutive checks have we had
     :type num_consec_write_checks: int
     :param num_consec_write_checks: How many consecutive checks have we had
-    :returns: (int, int) -- num_consec_read_checks, num_consec_write_checks
+    :returns: (int, int, tuple) -- num_consec_read_checks,
+        num_consec_write_checks and the loads, see scheduler.get_loads()
     """
     l_gsiConfigPath = "dynamic-dynamodb/" + table_name + "/index/" + gsi_name
     CONFIGURATION = dynamic_dynamodb.config.get_configuration()
     l_gsiConfig = CONFIGURATION['tables'][table_key]['gsis'][gsi_key].copy()
 
-    try:
-      l_tmp, l_data = _consulapi.kv.get(l_gsiConfigPath)
+    with timing.phase('consul'):
+        try:
+          l_data = consul_handler.get_override(_consulapi, l_gsiConfigPath)
 
-      if l_data is not None:
-        l_data = json.loads(l_data["Value"])
-        l_gsiConfig.update(l_data)
+          if l_data is not None:
+            l_gsiConfig.update(l_data)
 
-    except Exception as e:
-      logger.error("{0} - GSI: {1} - Can't read config from consul for table global secondary index: {2}".format(table_name, gsi_name, e))
+        except Exception as e:
+          logger.error("{0} - GSI: {1} - Can't read config from consul for table global secondary index: {2}".format(table_name, gsi_name, e))
 
-    if not get_global_option('dry_run'):
-      try:
-        _consulapi.kv.put(l_gsiConfigPath, json.dumps(l_gsiConfig))
+        if not get_global_option('dry_run'):
+          try:
+            consul_handler.queue_put(l_gsiConfigPath, l_gsiConfig)
 
-      except Exception as e:
-        logger.error("{0} - GSI: {1} - Can't update config in consul for table global secondary index: {2}".format(table_name, gsi_name, e))
+          except Exception as e:
+            logger.error("{0} - GSI: {1} - Can't update config in consul for table global secondary index: {2}".format(table_name, gsi_name, e))
 
     if get_global_option('circuit_breaker_url') or l_gsiConfig.get('circuit_breaker_url'):
-        if circuit_breaker.is_open(table_name, table_key, gsi_name, gsi_key):
+        with timing.phase('circuit_breaker'):
+            is_open = circuit_breaker.is_open(
+                table_name, table_key, gsi_name, gsi_key)
+        if is_open:
             logger.warning('Circuit breaker is OPEN!')
-            return (0, 0)
+            return 0, 0, ({}, 0)
 
     logger.debug(
         '{0} - Will ensure provisioning for global secondary index {1}'.format(table_name, gsi_name))
 
     # Handle throughput alarm checks
-    __ensure_provisioning_alarm(table_name, table_key, gsi_name, gsi_key, l_gsiConfig)
+    with timing.phase('decision'):
+        __ensure_provisioning_alarm(table_name, table_key, gsi_name, gsi_key, l_gsiConfig)
 
     try:
-        read_update_needed, updated_read_units, num_consec_read_checks = \
-            __ensure_provisioning_reads(
-                l_gsiConfig,
-                table_name,
-                gsi_name,
-                num_consec_read_checks)
-        write_update_needed, updated_write_units, num_consec_write_checks = \
-            __ensure_provisioning_writes(
+        with timing.phase('decision'):
+            snapshots = dict(
+                (operation, __get_snapshot(
+                    l_gsiConfig, table_name, gsi_name, operation))
+                for operation in decision.OPERATIONS)
+            scaling_plan = decision.plan(
+                snapshots,
+                {
+                    'reads': dynamodb.get_provisioned_gsi_read_units(
+                        table_name, gsi_name),
+                    'writes': dynamodb.get_provisioned_gsi_write_units(
+                        table_name, gsi_name)
+                },
                 l_gsiConfig,
-                table_name,
-                gsi_name,
-                num_consec_write_checks)
+                {
+                    'reads': num_consec_read_checks,
+                    'writes': num_consec_write_checks
+                },
+                '{0} - GSI: {1}'.format(table_name, gsi_name),
+                controller.get_states(table_name, gsi_name))
 
-        if read_update_needed:
-            num_consec_read_checks = 0
+        controller.store_plan(table_name, gsi_name, scaling_plan)
 
-        if write_update_needed:
-            num_consec_write_checks = 0
+        for level, message in scaling_plan.messages:
+            getattr(logger, level)(message)
+
+        read_update_needed = scaling_plan.reads.update_needed
+        updated_read_units = scaling_plan.reads.units
+        num_consec_read_checks = scaling_plan.reads.num_consec_checks
+        write_update_needed = scaling_plan.writes.update_needed
+        updated_write_units = scaling_plan.writes.units
+        num_consec_write_checks = scaling_plan.writes.num_consec_checks
 
         # Handle throughput updates
         if read_update_needed or write_update_needed:
@@ -93,14 +113,16 @@ def ensure_provisioning(
                     gsi_name,
                     int(updated_read_units),
                     int(updated_write_units)))
-            __update_throughput(
-                l_gsiConfig,
-                table_name,
-                table_key,
-                gsi_name,
-                gsi_key,
-                updated_read_units,
-                updated_write_units)
+            with timing.phase('update_table'):
+                applied = __update_throughput(
+                    l_gsiConfig,
+                    table_name,
+                    table_key,
+                    gsi_name,
+                    gsi_key,
+                    updated_read_units,
+                    updated_write_units)
+            controller.record_plan(table_name, gsi_name, scaling_plan, applied)
         else:
             logger.info(
                 '{0} - GSI: {1} - No need to change provisioning'.format(
@@ -111,7 +133,10 @@ def ensure_provisioning(
     except BotoServerError:
         raise
 
-    return num_consec_read_checks, num_consec_write_checks
+    return (
+        num_consec_read_checks,
+        num_consec_write_checks,
+        scheduler.get_loads(gsi_name, snapshots, l_gsiConfig))
 
 
 def __calculate_always_decrease_rw_values(
@@ -159,776 +184,53 @@ def __calculate_always_decrease_rw_values(
     return (read_units, write_units)
 
 
-def __ensure_provisioning_reads(_gsiConfig, table_name, gsi_name, num_consec_read_checks):
-    """ Ensure that provisioning is correct
+def __get_snapshot(_gsiConfig, table_name, gsi_name, operation):
+    """ Return the metrics the scaling decisions are made from
 
     :type table_name: str
     :param table_name: Name of the DynamoDB table
     :type gsi_name: str
     :param gsi_name: Name of the GSI
-    :type num_consec_read_checks: int
-    :param num_consec_read_checks: How many consecutive checks have we had
-    :returns: (bool, int, int)
-        update_needed, updated_read_units, num_consec_read_checks
+    :type operation: str
+    :param operation: 'reads' or 'writes'
+    :returns: dict or None -- Metrics snapshot, see core.decision, None if
+        autoscaling of the operation is disabled
     """
-    if not _gsiConfig.get('enable_reads_autoscaling'):
-        logger.info(
-            '{0} - GSI: {1} - '
-            'Autoscaling of reads has been disabled'.format(table_name, gsi_name))
-        return False, dynamodb.get_provisioned_gsi_read_units(
-            table_name, gsi_name), 0
+    if not _gsiConfig.get('enable_{0}_autoscaling'.format(operation)):
+        return None
 
-    update_needed = False
-    try:
-        lookback_window_start = _gsiConfig.get('lookback_window_start')
-        lookback_period = _gsiConfig.get('lookback_period')
-        current_read_units = dynamodb.get_provisioned_gsi_read_units(
-            table_name, gsi_name)
-        consumed_read_units_percent = \
-            gsi_stats.get_consumed_read_units_percent(
-                table_name, gsi_name, lookback_window_start, lookback_period)
-        throttled_read_count = \
-            gsi_stats.get_throttled_read_event_count(
-                table_name, gsi_name, lookback_window_start, lookback_period)
-        throttled_by_provisioned_read_percent = \
+    lookback_window_start = _gsiConfig.get('lookback_window_start')
+    lookback_period = _gsiConfig.get('lookback_period')
+
+    if operation == 'reads':
+        consumed_percent = gsi_stats.get_consumed_read_units_percent(
+            table_name, gsi_name, lookback_window_start, lookback_period)
+        throttled_count = gsi_stats.get_throttled_read_event_count(
+            table_name, gsi_name, lookback_window_start, lookback_period)
+        throttled_by_provisioned_percent = \
             gsi_stats.get_throttled_by_provisioned_read_event_percent(
                 table_name, gsi_name, lookback_window_start, lookback_period)
-        throttled_by_consumed_read_percent = \
+        throttled_by_consumed_percent = \
             gsi_stats.get_throttled_by_consumed_read_percent(
                 table_name, gsi_name, lookback_window_start, lookback_period)
-        reads_upper_threshold = \
-            _gsiConfig.get('reads_upper_threshold')
-        reads_lower_threshold = \
-            _gsiConfig.get('reads_lower_threshold')
-        increase_reads_unit = \
-            _gsiConfig.get('increase_reads_unit')
-        decrease_reads_unit = \
-            _gsiConfig.get('decrease_reads_unit')
-        increase_reads_with = \
-            _gsiConfig.get('increase_reads_with')
-        decrease_reads_with = \
-            _gsiConfig.get('decrease_reads_with')
-        throttled_reads_upper_threshold = \
-            _gsiConfig.get('throttled_reads_upper_threshold')
-        min_provisioned_reads = \
-            _gsiConfig.get('min_provisioned_reads')
-        max_provisioned_reads = \
-            _gsiConfig.get('max_provisioned_reads')
-        num_read_checks_before_scale_down = \
-            _gsiConfig.get('num_read_checks_before_scale_down')
-        num_read_checks_reset_percent = \
-            _gsiConfig.get('num_read_checks_reset_percent')
-        increase_throttled_by_provisioned_reads_unit = \
-            _gsiConfig.get('increase_throttled_by_provisioned_reads_unit')
-        increase_throttled_by_provisioned_reads_scale = \
-            _gsiConfig.get('increase_throttled_by_provisioned_reads_scale')
-        increase_throttled_by_consumed_reads_unit = \
-            _gsiConfig.get('increase_throttled_by_consumed_reads_unit')
-        increase_throttled_by_consumed_reads_scale = \
-            _gsiConfig.get('increase_throttled_by_consumed_reads_scale')
-        increase_consumed_reads_unit = \
-            _gsiConfig.get('increase_consumed_reads_unit')
-        increase_consumed_reads_with = \
-            _gsiConfig.get('increase_consumed_reads_with')
-        increase_consumed_reads_scale = \
-            _gsiConfig.get('increase_consumed_reads_scale')
-        decrease_consumed_reads_unit = \
-            _gsiConfig.get('decrease_consumed_reads_unit')
-        decrease_consumed_reads_with = \
-            _gsiConfig.get('decrease_consumed_reads_with')
-        decrease_consumed_reads_scale = \
-            _gsiConfig.get('decrease_consumed_reads_scale')
-    except JSONResponseError:
-        raise
-    except BotoServerError:
-        raise
-
-    # Set the updated units to the current read unit value
-    updated_read_units = current_read_units
-
-    # Reset consecutive reads if num_read_checks_reset_percent is reached
-    if num_read_checks_reset_percent:
-
-        if consumed_read_units_percent >= num_read_checks_reset_percent:
-
-            logger.info(
-                '{0} - GSI: {1} - Resetting the number of consecutive '
-                'read checks. Reason: Consumed percent {2} is '
-                'greater than reset percent: {3}'.format(
-                    table_name,
-                    gsi_name,
-                    consumed_read_units_percent,
-                    num_read_checks_reset_percent))
-
-            num_consec_read_checks = 0
-
-    if consumed_read_units_percent == 0 and not _gsiConfig.get('allow_scaling_down_reads_on_0_percent'):
-
-        logger.debug(
-            '{0} - GSI: {1} - '
-            'Scaling down reads is not done when usage is at 0%'.format(table_name, gsi_name))
-
-    # Exit if up scaling has been disabled
-    if not _gsiConfig.get('enable_reads_up_scaling'):
-        logger.debug(
-            '{0} - GSI: {1} - Up scaling event detected. No action taken as '
-            'scaling up reads has been disabled in the configuration'.format(table_name, gsi_name))
-
     else:
-
-        # If local/granular values not specified use global values
-        increase_consumed_reads_unit = \
-            increase_consumed_reads_unit or increase_reads_unit
-        increase_throttled_by_provisioned_reads_unit = \
-            increase_throttled_by_provisioned_reads_unit or increase_reads_unit
-        increase_throttled_by_consumed_reads_unit = \
-            increase_throttled_by_consumed_reads_unit or increase_reads_unit
-
-        increase_consumed_reads_with = \
-            increase_consumed_reads_with or increase_reads_with
-
-        # Initialise variables to store calculated provisioning
-        throttled_by_provisioned_calculated_provisioning = scale_reader(
-            increase_throttled_by_provisioned_reads_scale,
-            throttled_by_provisioned_read_percent)
-        throttled_by_consumed_calculated_provisioning = scale_reader(
-            increase_throttled_by_consumed_reads_scale,
-            throttled_by_consumed_read_percent)
-        consumed_calculated_provisioning = scale_reader(
-            increase_consumed_reads_scale,
-            consumed_read_units_percent)
-        throttled_count_calculated_provisioning = 0
-        calculated_provisioning = 0
-
-        # Increase needed due to high throttled to provisioned ratio
-        if throttled_by_provisioned_calculated_provisioning:
-
-            if increase_throttled_by_provisioned_reads_unit == 'percent':
-                throttled_by_provisioned_calculated_provisioning = \
-                    calculators.increase_reads_in_percent(
-                        current_read_units,
-                        throttled_by_provisioned_calculated_provisioning,
-                        _gsiConfig.get('max_provisioned_reads'),
-                        consumed_read_units_percent,
-                        '{0} - GSI: {1}'.format(table_name, gsi_name))
-            else:
-                throttled_by_provisioned_calculated_provisioning = \
-                    calculators.increase_reads_in_units(
-                        current_read_units,
-                        throttled_by_provisioned_calculated_provisioning,
-                        _gsiConfig.get('max_provisioned_reads'),
-                        consumed_read_units_percent,
-                        '{0} - GSI: {1}'.format(table_name, gsi_name))
-
-        # Increase needed due to high throttled to consumed ratio
-        if throttled_by_consumed_calculated_provisioning:
-
-            if increase_throttled_by_consumed_reads_unit == 'percent':
-                throttled_by_consumed_calculated_provisioning = \
-                    calculators.increase_reads_in_percent(
-                        current_read_units,
-                        throttled_by_consumed_calculated_provisioning,
-                        _gsiConfig.get('max_provisioned_reads'),
-                        consumed_read_units_percent,
-                        '{0} - GSI: {1}'.format(table_name, gsi_name))
-            else:
-                throttled_by_consumed_calculated_provisioning = \
-                    calculators.increase_reads_in_units(
-                        current_read_units,
-                        throttled_by_consumed_calculated_provisioning,
-                        _gsiConfig.get('max_provisioned_reads'),
-                        consumed_read_units_percent,
-                        '{0} - GSI: {1}'.format(table_name, gsi_name))
-
-        # Increase needed due to high CU consumption
-        if consumed_calculated_provisioning:
-
-            if increase_consumed_reads_unit == 'percent':
-                consumed_calculated_provisioning = \
-                    calculators.increase_reads_in_percent(
-                        current_read_units,
-                        consumed_calculated_provisioning,
-                        _gsiConfig.get('max_provisioned_reads'),
-                        consumed_read_units_percent,
-                        '{0} - GSI: {1}'.format(table_name, gsi_name))
-            else:
-                consumed_calculated_provisioning = \
-                    calculators.increase_reads_in_units(
-                        current_read_units,
-                        consumed_calculated_provisioning,
-                        _gsiConfig.get('max_provisioned_reads'),
-                        consumed_read_units_percent,
-                        '{0} - GSI: {1}'.format(table_name, gsi_name))
-
-        elif (reads_upper_threshold
-                and consumed_read_units_percent > reads_upper_threshold
-                and not increase_consumed_reads_scale):
-
-            if increase_consumed_reads_unit == 'percent':
-                consumed_calculated_provisioning = \
-                    calculators.increase_reads_in_percent(
-                        current_read_units,
-                        increase_consumed_reads_with,
-                        _gsiConfig.get('max_provisioned_reads'),
-                        consumed_read_units_percent,
-                        '{0} - GSI: {1}'.format(table_name, gsi_name))
-            else:
-                consumed_calculated_provisioning = \
-                    calculators.increase_reads_in_units(
-                        current_read_units,
-                        increase_consumed_reads_with,
-                        _gsiConfig.get('max_provisioned_reads'),
-                        consumed_read_units_percent,
-                        '{0} - GSI: {1}'.format(table_name, gsi_name))
-
-        # Increase needed due to high throttling
-        if (throttled_reads_upper_threshold
-                and throttled_read_count > throttled_reads_upper_threshold):
-
-            if increase_reads_unit == 'percent':
-                throttled_count_calculated_provisioning = \
-                    calculators.increase_reads_in_percent(
-                        updated_read_units,
-                        increase_reads_with,
-                        _gsiConfig.get('max_provisioned_reads'),
-                        consumed_read_units_percent,
-                        '{0} - GSI: {1}'.format(table_name, gsi_name))
-            else:
-                throttled_count_calculated_provisioning = \
-                    calculators.increase_reads_in_units(
-                        updated_read_units,
-                        increase_reads_with,
-                        _gsiConfig.get('max_provisioned_reads'),
-                        consumed_read_units_percent,
-                        '{0} - GSI: {1}'.format(table_name, gsi_name))
-
-        # Determine which metric requires the most scaling
-        if (throttled_by_provisioned_calculated_provisioning
-                > calculated_provisioning):
-            calculated_provisioning = \
-                throttled_by_provisioned_calculated_provisioning
-            scale_reason = (
-                "due to throttled events by provisioned "
-                "units threshold being exceeded")
-        if (throttled_by_consumed_calculated_provisioning
-                > calculated_provisioning):
-            calculated_provisioning = \
-                throttled_by_consumed_calculated_provisioning
-            scale_reason = (
-                "due to throttled events by consumed "
-                "units threshold being exceeded")
-        if consumed_calculated_provisioning > calculated_provisioning:
-            calculated_provisioning = consumed_calculated_provisioning
-            scale_reason = "due to consumed threshold being exceeded"
-        if throttled_count_calculated_provisioning > calculated_provisioning:
-            calculated_provisioning = throttled_count_calculated_provisioning
-            scale_reason = "due to throttled events threshold being exceeded"
-
-        if calculated_provisioning > current_read_units:
-            logger.info(
-                '{0} - GSI: {1} - Resetting the number of consecutive '
-                'read checks. Reason: scale up {2}'.format(
-                    table_name, gsi_name, scale_reason))
-            num_consec_read_checks = 0
-            update_needed = True
-            updated_read_units = calculated_provisioning
-
-    # Decrease needed due to low CU consumption
-    if not update_needed:
-        # If local/granular values not specified use global values
-        decrease_consumed_reads_unit = \
-            decrease_consumed_reads_unit or decrease_reads_unit
-
-        decrease_consumed_reads_with = \
-            decrease_consumed_reads_with or decrease_reads_with
-
-        # Initialise variables to store calculated provisioning
-        consumed_calculated_provisioning = scale_reader_decrease(
-            decrease_consumed_reads_scale,
-            consumed_read_units_percent)
-        calculated_provisioning = None
-
-        # Exit if down scaling has been disabled
-        if not _gsiConfig.get('enable_reads_down_scaling'):
-            logger.debug(
-                '{0} - GSI: {1} - Down scaling event detected. '
-                'No action taken as scaling '
-                'down reads has been disabled in the configuration'.format(
-                    table_name, gsi_name))
-        else:
-            if consumed_calculated_provisioning:
-                if decrease_consumed_reads_unit == 'percent':
-                    calculated_provisioning = \
-                        calculators.decrease_reads_in_percent(
-                            updated_read_units,
-                            consumed_calculated_provisioning,
-                            _gsiConfig.get('min_provisioned_reads'),
-                            '{0} - GSI: {1}'.format(table_name, gsi_name))
-                else:
-                    calculated_provisioning = \
-                        calculators.decrease_reads_in_units(
-                            updated_read_units,
-                            consumed_calculated_provisioning,
-                            _gsiConfig.get('min_provisioned_reads'),
-                            '{0} - GSI: {1}'.format(table_name, gsi_name))
-            elif (reads_lower_threshold
-                  and consumed_read_units_percent < reads_lower_threshold
-                  and not decrease_consumed_reads_scale):
-                if decrease_consumed_reads_unit == 'percent':
-                    calculated_provisioning = \
-                        calculators.decrease_reads_in_percent(
-                            updated_read_units,
-                            decrease_consumed_reads_with,
-                            _gsiConfig.get('min_provisioned_reads'),
-                            '{0} - GSI: {1}'.format(table_name, gsi_name))
-                else:
-                    calculated_provisioning = \
-                        calculators.decrease_reads_in_units(
-                            updated_read_units,
-                            decrease_consumed_reads_with,
-                            _gsiConfig.get('min_provisioned_reads'),
-                            '{0} - GSI: {1}'.format(table_name, gsi_name))
-
-            if (calculated_provisioning
-                    and current_read_units != calculated_provisioning):
-                num_consec_read_checks += 1
-
-                if num_consec_read_checks >= num_read_checks_before_scale_down:
-                    update_needed = True
-                    updated_read_units = calculated_provisioning
-
-    # Never go over the configured max provisioning
-    if max_provisioned_reads:
-        if int(updated_read_units) > int(max_provisioned_reads):
-            update_needed = True
-            updated_read_units = int(max_provisioned_reads)
-            logger.info(
-                '{0} - GSI: {1} - Will not increase writes over '
-                'gsi-max-provisioned-reads '
-                'limit ({2} writes)'.format(
-                    table_name,
-                    gsi_name,
-                    updated_read_units))
-
-    # Ensure that we have met the min-provisioning
-    if min_provisioned_reads:
-        if int(min_provisioned_reads) > int(updated_read_units):
-            update_needed = True
-            updated_read_units = int(min_provisioned_reads)
-            logger.info(
-                '{0} - GSI: {1} - Increasing reads to '
-                'meet gsi-min-provisioned-reads '
-                'limit ({2} reads)'.format(
-                    table_name,
-                    gsi_name,
-                    updated_read_units))
-
-    if calculators.is_consumed_over_proposed(
-            current_read_units,
-            updated_read_units,
-            consumed_read_units_percent):
-        update_needed = False
-        updated_read_units = current_read_units
-        logger.info(
-            '{0} - GSI: {1} - Consumed is over proposed read units. Will leave '
-            'table at current setting.'.format(table_name, gsi_name))
-
-    logger.debug('{0} - GSI: {1} - Consecutive read checks {2}/{3}'.format(
-        table_name,
-        gsi_name,
-        num_consec_read_checks,
-        num_read_checks_before_scale_down))
-
-    return update_needed, updated_read_units, num_consec_read_checks
-
-
-def __ensure_provisioning_writes(_gsiConfig, table_name, gsi_name, num_consec_write_checks):
-    """ Ensure that provisioning of writes is correct
-
-    :type table_name: str
-    :param table_name: Name of the DynamoDB table
-    :type gsi_name: str
-    :param gsi_name: Name of the GSI
-    :type num_consec_write_checks: int
-    :param num_consec_write_checks: How many consecutive checks have we had
-    :returns: (bool, int, int)
-        update_needed, updated_write_units, num_consec_write_checks
-    """
-    if not _gsiConfig.get('enable_writes_autoscaling'):
-        logger.info(
-            '{0} - GSI: {1} - '
-            'Autoscaling of writes has been disabled'.format(
-                table_name, gsi_name))
-        return False, dynamodb.get_provisioned_gsi_write_units(
-            table_name, gsi_name), 0
-
-    update_needed = False
-    try:
-        lookback_window_start = _gsiConfig.get('lookback_window_start')
-        lookback_period = _gsiConfig.get('lookback_period')
-        current_write_units = dynamodb.get_provisioned_gsi_write_units(
-            table_name, gsi_name)
-        consumed_write_units_percent = \
-            gsi_stats.get_consumed_write_units_percent(
-                table_name, gsi_name, lookback_window_start, lookback_period)
-        throttled_write_count = \
-            gsi_stats.get_throttled_write_event_count(
-                table_name, gsi_name, lookback_window_start, lookback_period)
-        throttled_by_provisioned_write_percent = \
+        consumed_percent = gsi_stats.get_consumed_write_units_percent(
+            table_name, gsi_name, lookback_window_start, lookback_period)
+        throttled_count = gsi_stats.get_throttled_write_event_count(
+            table_name, gsi_name, lookback_window_start, lookback_period)
+        throttled_by_provisioned_percent = \
             gsi_stats.get_throttled_by_provisioned_write_event_percent(
                 table_name, gsi_name, lookback_window_start, lookback_period)
-        throttled_by_consumed_write_percent = \
+        throttled_by_consumed_percent = \
             gsi_stats.get_throttled_by_consumed_write_percent(
                 table_name, gsi_name, lookback_window_start, lookback_period)
-        writes_upper_threshold = \
-            _gsiConfig.get('writes_upper_threshold')
-        writes_lower_threshold = \
-            _gsiConfig.get('writes_lower_threshold')
-        throttled_writes_upper_threshold = \
-            _gsiConfig.get('throttled_writes_upper_threshold')
-        increase_writes_unit = \
-            _gsiConfig.get('increase_writes_unit')
-        increase_writes_with = \
-            _gsiConfig.get('increase_writes_with')
-        decrease_writes_unit = \
-            _gsiConfig.get('decrease_writes_unit')
-        decrease_writes_with = \
-            _gsiConfig.get('decrease_writes_with')
-        min_provisioned_writes = \
-            _gsiConfig.get('min_provisioned_writes')
-        max_provisioned_writes = \
-            _gsiConfig.get('max_provisioned_writes')
-        num_write_checks_before_scale_down = \
-            _gsiConfig.get('num_write_checks_before_scale_down')
-        num_write_checks_reset_percent = \
-            _gsiConfig.get('num_write_checks_reset_percent')
-        increase_throttled_by_provisioned_writes_unit = \
-            _gsiConfig.get('increase_throttled_by_provisioned_writes_unit')
-        increase_throttled_by_provisioned_writes_scale = \
-            _gsiConfig.get('increase_throttled_by_provisioned_writes_scale')
-        increase_throttled_by_consumed_writes_unit = \
-            _gsiConfig.get('increase_throttled_by_consumed_writes_unit')
-        increase_throttled_by_consumed_writes_scale = \
-            _gsiConfig.get('increase_throttled_by_consumed_writes_scale')
-        increase_consumed_writes_unit = \
-            _gsiConfig.get('increase_consumed_writes_unit')
-        increase_consumed_writes_with = \
-            _gsiConfig.get('increase_consumed_writes_with')
-        increase_consumed_writes_scale = \
-            _gsiConfig.get('increase_consumed_writes_scale')
-        decrease_consumed_writes_unit = \
-            _gsiConfig.get('decrease_consumed_writes_unit')
-        decrease_consumed_writes_with = \
-            _gsiConfig.get('decrease_consumed_writes_with')
-        decrease_consumed_writes_scale = \
-            _gsiConfig.get('decrease_consumed_writes_scale')
-    except JSONResponseError:
-        raise
-    except BotoServerError:
-        raise
-
-    # Set the updated units to the current write unit value
-    updated_write_units = current_write_units
-
-    # Reset consecutive write count if num_write_checks_reset_percent
-    # is reached
-    if num_write_checks_reset_percent:
-
-        if consumed_write_units_percent >= num_write_checks_reset_percent:
-
-            logger.info(
-                '{0} - GSI: {1} - Resetting the number of consecutive '
-                'write checks. Reason: Consumed percent {2} is '
-                'greater than reset percent: {3}'.format(
-                    table_name,
-                    gsi_name,
-                    consumed_write_units_percent,
-                    num_write_checks_reset_percent))
-
-            num_consec_write_checks = 0
-
-    # Check if we should update write provisioning
-    if consumed_write_units_percent == 0 and not _gsiConfig.get('allow_scaling_down_writes_on_0_percent'):
-
-        logger.info(
-            '{0} - GSI: {1} - '
-            'Scaling down writes is not done when usage is at 0%'.format(
-                table_name, gsi_name))
-
-    # Exit if up scaling has been disabled
-    if not _gsiConfig.get('enable_writes_up_scaling'):
-        logger.debug(
-            '{0} - GSI: {1} - Up scaling event detected. No action taken as '
-            'scaling up writes has been disabled in the configuration'.format(
-                table_name, gsi_name))
-
-    else:
-
-        # If local/granular values not specified use global values
-        increase_consumed_writes_unit = \
-            increase_consumed_writes_unit or increase_writes_unit
-        increase_throttled_by_provisioned_writes_unit = (
-            increase_throttled_by_provisioned_writes_unit
-            or increase_writes_unit)
-        increase_throttled_by_consumed_writes_unit = \
-            increase_throttled_by_consumed_writes_unit or increase_writes_unit
-
-        increase_consumed_writes_with = \
-            increase_consumed_writes_with or increase_writes_with
-
-        # Initialise variables to store calculated provisioning
-        throttled_by_provisioned_calculated_provisioning = scale_reader(
-            increase_throttled_by_provisioned_writes_scale,
-            throttled_by_provisioned_write_percent)
-        throttled_by_consumed_calculated_provisioning = scale_reader(
-            increase_throttled_by_consumed_writes_scale,
-            throttled_by_consumed_write_percent)
-        consumed_calculated_provisioning = scale_reader(
-            increase_consumed_writes_scale,
-            consumed_write_units_percent)
-        throttled_count_calculated_provisioning = 0
-        calculated_provisioning = 0
-
-        # Increase needed due to high throttled to provisioned ratio
-        if throttled_by_provisioned_calculated_provisioning:
-
-            if increase_throttled_by_provisioned_writes_unit == 'percent':
-                throttled_by_provisioned_calculated_provisioning = \
-                    calculators.increase_writes_in_percent(
-                        current_write_units,
-                        throttled_by_provisioned_calculated_provisioning,
-                        _gsiConfig.get('max_provisioned_writes'),
-                        consumed_write_units_percent,
-                        '{0} - GSI: {1}'.format(table_name, gsi_name))
-            else:
-                throttled_by_provisioned_calculated_provisioning = \
-                    calculators.increase_writes_in_units(
-                        current_write_units,
-                        throttled_by_provisioned_calculated_provisioning,
-                        _gsiConfig.get('max_provisioned_writes'),
-                        consumed_write_units_percent,
-                        '{0} - GSI: {1}'.format(table_name, gsi_name))
-
-        # Increase needed due to high throttled to consumed ratio
-        if throttled_by_consumed_calculated_provisioning:
-
-            if increase_throttled_by_consumed_writes_unit == 'percent':
-                throttled_by_consumed_calculated_provisioning = \
-                    calculators.increase_writes_in_percent(
-                        current_write_units,
-                        throttled_by_consumed_calculated_provisioning,
-                        _gsiConfig.get('max_provisioned_writes'),
-                        consumed_write_units_percent,
-                        '{0} - GSI: {1}'.format(table_name, gsi_name))
-            else:
-                throttled_by_consumed_calculated_provisioning = \
-                    calculators.increase_writes_in_units(
-                        current_write_units,
-                        throttled_by_consumed_calculated_provisioning,
-                        _gsiConfig.get('max_provisioned_writes'),
-                        consumed_write_units_percent,
-                        '{0} - GSI: {1}'.format(table_name, gsi_name))
-
-        # Increase needed due to high CU consumption
-        if consumed_calculated_provisioning:
 
-            if increase_consumed_writes_unit == 'percent':
-                consumed_calculated_provisioning = \
-                    calculators.increase_writes_in_percent(
-                        current_write_units,
-                        consumed_calculated_provisioning,
-                        _gsiConfig.get('max_provisioned_writes'),
-                        consumed_write_units_percent,
-                        '{0} - GSI: {1}'.format(table_name, gsi_name))
-            else:
-                consumed_calculated_provisioning = \
-                    calculators.increase_writes_in_units(
-                        current_write_units,
-                        consumed_calculated_provisioning,
-                        _gsiConfig.get('max_provisioned_writes'),
-                        consumed_write_units_percent,
-                        '{0} - GSI: {1}'.format(table_name, gsi_name))
-
-        elif (writes_upper_threshold
-                and consumed_write_units_percent > writes_upper_threshold
-                and not increase_consumed_writes_scale):
-
-            if increase_consumed_writes_unit == 'percent':
-                consumed_calculated_provisioning = \
-                    calculators.increase_writes_in_percent(
-                        current_write_units,
-                        increase_consumed_writes_with,
-                        _gsiConfig.get('max_provisioned_writes'),
-                        consumed_write_units_percent,
-                        '{0} - GSI: {1}'.format(table_name, gsi_name))
-            else:
-                consumed_calculated_provisioning = \
-                    calculators.increase_writes_in_units(
-                        current_write_units,
-                        increase_consumed_writes_with,
-                        _gsiConfig.get('max_provisioned_writes'),
-                        consumed_write_units_percent,
-                        '{0} - GSI: {1}'.format(table_name, gsi_name))
-
-        # Increase needed due to high throttling
-        if (throttled_writes_upper_threshold
-                and throttled_write_count > throttled_writes_upper_threshold):
-
-            if increase_writes_unit == 'percent':
-                throttled_count_calculated_provisioning = \
-                    calculators.increase_writes_in_percent(
-                        updated_write_units,
-                        increase_writes_with,
-                        _gsiConfig.get('max_provisioned_writes'),
-                        consumed_write_units_percent,
-                        '{0} - GSI: {1}'.format(table_name, gsi_name))
-            else:
-                throttled_count_calculated_provisioning = \
-                    calculators.increase_writes_in_units(
-                        updated_write_units,
-                        increase_writes_with,
-                        _gsiConfig.get('max_provisioned_writes'),
-                        consumed_write_units_percent,
-                        '{0} - GSI: {1}'.format(table_name, gsi_name))
-
-        # Determine which metric requires the most scaling
-        if (throttled_by_provisioned_calculated_provisioning
-                > calculated_provisioning):
-            calculated_provisioning = \
-                throttled_by_provisioned_calculated_provisioning
-            scale_reason = (
-                "due to throttled events by provisioned "
-                "units threshold being exceeded")
-        if (throttled_by_consumed_calculated_provisioning
-                > calculated_provisioning):
-            calculated_provisioning = \
-                throttled_by_consumed_calculated_provisioning
-            scale_reason = (
-                "due to throttled events by consumed "
-                "units threshold being exceeded")
-        if consumed_calculated_provisioning > calculated_provisioning:
-            calculated_provisioning = consumed_calculated_provisioning
-            scale_reason = "due to consumed threshold being exceeded"
-        if throttled_count_calculated_provisioning > calculated_provisioning:
-            calculated_provisioning = throttled_count_calculated_provisioning
-            scale_reason = "due to throttled events threshold being exceeded"
-
-        if calculated_provisioning > current_write_units:
-            logger.info(
-                '{0} - GSI: {1} - Resetting the number of consecutive '
-                'write checks. Reason: scale up {2}'.format(
-                    table_name, gsi_name, scale_reason))
-            num_consec_write_checks = 0
-            update_needed = True
-            updated_write_units = calculated_provisioning
-
-    # Decrease needed due to low CU consumption
-    if not update_needed:
-        # If local/granular values not specified use global values
-        decrease_consumed_writes_unit = \
-            decrease_consumed_writes_unit or decrease_writes_unit
-
-        decrease_consumed_writes_with = \
-            decrease_consumed_writes_with or decrease_writes_with
-
-        # Initialise variables to store calculated provisioning
-        consumed_calculated_provisioning = scale_reader_decrease(
-            decrease_consumed_writes_scale,
-            consumed_write_units_percent)
-        calculated_provisioning = None
-
-        # Exit if down scaling has been disabled
-        if not _gsiConfig.get('enable_writes_down_scaling'):
-            logger.debug(
-                '{0} - GSI: {1} - Down scaling event detected. '
-                'No action taken as scaling '
-                'down writes has been disabled in the configuration'.format(table_name, gsi_name))
-        else:
-            if consumed_calculated_provisioning:
-                if decrease_consumed_writes_unit == 'percent':
-                    calculated_provisioning = \
-                        calculators.decrease_writes_in_percent(
-                            updated_write_units,
-                            consumed_calculated_provisioning,
-                            _gsiConfig.get('min_provisioned_writes'),
-                            '{0} - GSI: {1}'.format(table_name, gsi_name))
-                else:
-                    calculated_provisioning = \
-                        calculators.decrease_writes_in_units(
-                            updated_write_units,
-                            consumed_calculated_provisioning,
-                            _gsiConfig.get('min_provisioned_writes'),
-                            '{0} - GSI: {1}'.format(table_name, gsi_name))
-            elif (writes_lower_threshold
-                  and consumed_write_units_percent < writes_lower_threshold
-                  and not decrease_consumed_writes_scale):
-                if decrease_consumed_writes_unit == 'percent':
-                    calculated_provisioning = \
-                        calculators.decrease_writes_in_percent(
-                            updated_write_units,
-                            decrease_consumed_writes_with,
-                            _gsiConfig.get('min_provisioned_writes'),
-                            '{0} - GSI: {1}'.format(table_name, gsi_name))
-                else:
-                    calculated_provisioning = \
-                        calculators.decrease_writes_in_units(
-                            updated_write_units,
-                            decrease_consumed_writes_with,
-                            _gsiConfig.get('min_provisioned_writes'),
-                            '{0} - GSI: {1}'.format(table_name, gsi_name))
-
-            if (calculated_provisioning
-                    and current_write_units != calculated_provisioning):
-                num_consec_write_checks += 1
-
-                if num_consec_write_checks >= \
-                        num_write_checks_before_scale_down:
-                    update_needed = True
-                    updated_write_units = calculated_provisioning
-
-    # Never go over the configured max provisioning
-    if max_provisioned_writes:
-        if int(updated_write_units) > int(max_provisioned_writes):
-            update_needed = True
-            updated_write_units = int(max_provisioned_writes)
-            logger.info(
-                '{0} - GSI: {1} - '
-                'Will not increase writes over gsi-max-provisioned-writes '
-                'limit ({2} writes)'.format(
-                    table_name,
-                    gsi_name,
-                    updated_write_units))
-
-    # Ensure that we have met the min-provisioning
-    if min_provisioned_writes:
-        if int(min_provisioned_writes) > int(updated_write_units):
-            update_needed = True
-            updated_write_units = int(min_provisioned_writes)
-            logger.info(
-                '{0} - GSI: {1} - Increasing writes to '
-                'meet gsi-min-provisioned-writes '
-                'limit ({2} writes)'.format(
-                    table_name,
-                    gsi_name,
-                    updated_write_units))
-
-    if calculators.is_consumed_over_proposed(
-            current_write_units,
-            updated_write_units,
-            consumed_write_units_percent):
-        update_needed = False
-        updated_write_units = current_write_units
-        logger.info(
-            '{0} - GSI: {1} - Consumed is over proposed write units. Will leave '
-            'table at current setting.'.format(table_name, gsi_name))
-
-    logger.debug('{0} - GSI: {1} - Consecutive write checks {2}/{3}'.format(
-        table_name,
-        gsi_name,
-        num_consec_write_checks,
-        num_write_checks_before_scale_down))
-
-    return update_needed, updated_write_units, num_consec_write_checks
+    return {
+        'consumed_percent': consumed_percent,
+        'throttled_count': throttled_count,
+        'throttled_by_provisioned_percent': throttled_by_provisioned_percent,
+        'throttled_by_consumed_percent': throttled_by_consumed_percent
+    }
 
 
 def __update_throughput(_gsiConfig, table_name, table_key, gsi_name, gsi_key, read_units, write_units):
@@ -946,6 +248,8 @@ def __update_throughput(_gsiConfig, table_name, table_key, gsi_name, gsi_key, re
     :param read_units: New read unit provisioning
     :type write_units: int
     :param write_units: New write unit provisioning
+    :returns: (int, int) -- The reads and writes set, None if the
+        provisioning was not changed
     """
     try:
         current_ru = dynamodb.get_provisioned_gsi_read_units(
@@ -985,7 +289,7 @@ def __update_throughput(_gsiConfig, table_name, table_key, gsi_name, gsi_key, re
                 table_name, gsi_name))
             return
 
-    dynamodb.update_gsi_provisioning(
+    return dynamodb.update_gsi_provisioning(
         table_name,
         table_key,
         gsi_name,
@@ -1100,47 +404,3 @@ def __ensure_provisioning_alarm(table_name, table_key, gsi_name, gsi_key, _gsiCo
             '{0} - GSI: {1} - Throughput alarm thresholds not crossed'.format(
                 table_name, gsi_name))
 
-
-def scale_reader(provision_increase_scale, current_value):
-    """
-
-    :type provision_increase_scale: dict
-    :param provision_increase_scale: dictionary with key being the scaling
-        threshold and value being scaling amount
-    :type current_value: float
-    :param current_value: the current consumed units or throttled events
-    :returns: (int) The amount to scale provisioning by
-    """
-
-    scale_value = 0
-    if provision_increase_scale:
-        for limits in sorted(provision_increase_scale.keys()):
-            if current_value < limits:
-                return scale_value
-            else:
-                scale_value = provision_increase_scale.get(limits)
-        return scale_value
-    else:
-        return scale_value
-
-
-def scale_reader_decrease(provision_decrease_scale, current_value):
-    """
-
-    :type provision_decrease_scale: dict
-    :param provision_decrease_scale: dictionary with key being the
-        scaling threshold and value being scaling amount
-    :type current_value: float
-    :param current_value: the current consumed units or throttled events
-    :returns: (int) The amount to scale provisioning by
-    """
-    scale_value = 0
-    if provision_decrease_scale:
-        for limits in sorted(provision_decrease_scale.keys(), reverse=True):
-            if current_value > limits:
-                return scale_value
-            else:
-                scale_value = provision_decrease_scale.get(limits)
-        return scale_value
-    else:
-        return scale_value
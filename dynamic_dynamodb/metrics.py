@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+""" Serve counters, gauges and histograms in the Prometheus text format
+
+The metrics are always collected. They are only served over HTTP, on
+/metrics, if metrics-port is set.
+"""
+import threading
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from contextlib import contextmanager
+
+from dynamic_dynamodb.log_handler import LOGGER as logger
+from dynamic_dynamodb.config_handler import get_global_option
+
+# All metrics, in the order they are served
+REGISTRY = []
+
+# The HTTP server, once started
+SERVER = None
+SERVER_LOCK = threading.Lock()
+
+
+class Metric(object):
+    """ Base class for metrics with labels """
+    metric_type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        """ Create the metric and add it to the registry
+
+        :type name: str
+        :param name: Metric name
+        :type documentation: str
+        :param documentation: Help text
+        :type labelnames: tuple
+        :param labelnames: Names of the labels
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def collect(self):
+        """ Return the metric in the text exposition format
+
+        :returns: list -- Lines
+        """
+        lines = [
+            '# HELP {0} {1}'.format(self.name, self.documentation),
+            '# TYPE {0} {1}'.format(self.name, self.metric_type)
+        ]
+
+        with self._lock:
+            values = sorted(self._values.items())
+
+        for labels, value in values:
+            lines.extend(self._format(labels, value))
+
+        return lines
+
+    def remove(self, **labels):
+        """ Remove the samples of all label sets matching the labels
+
+        :type labels: dict
+        :param labels: Label values by name, other labels match any value
+        """
+        matches = [
+            (self.labelnames.index(name), unicode(value or ''))
+            for name, value in labels.items()]
+
+        with self._lock:
+            for key in self._values.keys():
+                if all(key[index] == value for index, value in matches):
+                    del self._values[key]
+
+    def _format(self, labels, value):
+        """ Format the samples of one label set
+
+        :type labels: tuple
+        :param labels: Label values
+        :param value: Stored value
+        :returns: list -- Lines
+        """
+        return ['{0}{1} {2}'.format(
+            self.name,
+            _format_labels(zip(self.labelnames, labels)),
+            _format_value(value))]
+
+    def _key(self, labels):
+        """ Return the label values in the order of labelnames
+
+        :type labels: dict
+        :param labels: Label values by name
+        :returns: tuple
+        """
+        return tuple(
+            unicode(labels.get(name) or '') for name in self.labelnames)
+
+
+class Counter(Metric):
+    """ Value that only goes up """
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        """ Increase the counter
+
+        :type amount: float
+        :param amount: Amount to add
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """ Value that can go up and down """
+    metric_type = 'gauge'
+
+    def set(self, value, **labels):
+        """ Set the gauge
+
+        :type value: float
+        :param value: New value
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    """ Distribution of observed values in cumulative buckets """
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=()):
+        """ Create the histogram
+
+        :type buckets: tuple
+        :param buckets: Upper bounds of the buckets, +Inf is added
+        """
+        Metric.__init__(self, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        """ Add an observation
+
+        :type value: float
+        :param value: Observed value
+        """
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # Count per bucket, then +Inf, then the sum
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    def _format(self, labels, value):
+        """ Format the buckets, sum and count of one label set """
+        labels = zip(self.labelnames, labels)
+        bounds = [_format_value(bound) for bound in self.buckets] + ['+Inf']
+
+        lines = [
+            '{0}_bucket{1} {2}'.format(
+                self.name,
+                _format_labels(labels + [('le', bound)]),
+                count)
+            for bound, count in zip(bounds, value[:-1])
+        ]
+        lines.append('{0}_sum{1} {2}'.format(
+            self.name, _format_labels(labels), _format_value(value[-1])))
+        lines.append('{0}_count{1} {2}'.format(
+            self.name, _format_labels(labels), value[-2]))
+
+        return lines
+
+
+CYCLE_SECONDS = Histogram(
+    'dynamic_dynamodb_cycle_duration_seconds',
+    'Duration of the check cycles',
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800))
+CYCLE_OVERRUNS = Counter(
+    'dynamic_dynamodb_cycle_overruns_total',
+    'Check cycles that took longer than check-interval')
+CHECK_INTERVAL = Gauge(
+    'dynamic_dynamodb_check_interval_seconds',
+    'Configured check-interval')
+PHASE_SECONDS = Histogram(
+    'dynamic_dynamodb_phase_duration_seconds',
+    'Time spent in each phase of the check cycle',
+    labelnames=('phase',),
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30))
+AWS_REQUESTS = Counter(
+    'dynamic_dynamodb_aws_requests_total',
+    'Requests made to AWS',
+    labelnames=('service', 'operation', 'outcome'))
+THROTTLED_EVENTS = Gauge(
+    'dynamic_dynamodb_throttled_events',
+    'Throttle events in the last lookback period',
+    labelnames=('table', 'gsi', 'operation'))
+PROVISIONED_UNITS = Gauge(
+    'dynamic_dynamodb_provisioned_units',
+    'Provisioned capacity units',
+    labelnames=('table', 'gsi', 'operation'))
+CONSUMED_UNITS = Gauge(
+    'dynamic_dynamodb_consumed_units',
+    'Consumed capacity units per second in the last lookback period',
+    labelnames=('table', 'gsi', 'operation'))
+SCALING_EVENTS = Counter(
+    'dynamic_dynamodb_scaling_events_total',
+    'Provisioning changes made',
+    labelnames=('table', 'gsi', 'operation', 'direction'))
+
+
+@contextmanager
+def aws_request(service, operation):
+    """ Count an AWS request and whether it succeeded
+
+    :type service: str
+    :param service: AWS service, e.g. dynamodb
+    :type operation: str
+    :param operation: API operation, e.g. DescribeTable
+    """
+    try:
+        yield
+    except Exception:
+        AWS_REQUESTS.inc(
+            service=service, operation=operation, outcome='error')
+        raise
+
+    AWS_REQUESTS.inc(service=service, operation=operation, outcome='ok')
+
+
+def count_scaling(table_name, gsi_name, current_reads, reads,
+                  current_writes, writes):
+    """ Count the provisioning changes of an update
+
+    :type table_name: str
+    :param table_name: Name of the DynamoDB table
+    :type gsi_name: str
+    :param gsi_name: Name of the GSI, or None
+    :type current_reads: int
+    :param current_reads: Read units before the update
+    :type reads: int
+    :param reads: Read units after the update
+    :type current_writes: int
+    :param current_writes: Write units before the update
+    :type writes: int
+    :param writes: Write units after the update
+    """
+    for operation, current, new in (
+            ('read', current_reads, reads),
+            ('write', current_writes, writes)):
+        if new == current:
+            continue
+
+        SCALING_EVENTS.inc(
+            table=table_name,
+            gsi=gsi_name,
+            operation=operation,
+            direction='up' if new > current else 'down')
+
+
+def forget_table(table_name):
+    """ Stop serving the gauges of a table and its GSIs
+
+    Called when a table is no longer found, so its last values are not
+    served for ever.
+
+    :type table_name: str
+    :param table_name: Name of the DynamoDB table
+    """
+    for gauge in (THROTTLED_EVENTS, PROVISIONED_UNITS, CONSUMED_UNITS):
+        gauge.remove(table=table_name)
+
+
+def generate():
+    """ Return all metrics in the text exposition format
+
+    :returns: str
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+
+    return u'\n'.join(lines).encode('utf-8') + '\n'
+
+
+def start_server():
+    """ Serve the metrics on metrics-port, if it is set
+
+    The server runs in a daemon thread and is only started once.
+    """
+    global SERVER
+
+    port = get_global_option('metrics_port')
+    if not port:
+        return
+
+    with SERVER_LOCK:
+        if SERVER is not None:
+            return
+
+        try:
+            SERVER = ThreadingHTTPServer(('', port), MetricsHandler)
+        except Exception as error:
+            logger.error('Could not serve metrics on port {0}: {1}'.format(
+                port, error))
+            return
+
+        thread = threading.Thread(
+            target=SERVER.serve_forever, name='metrics-server')
+        thread.daemon = True
+        thread.start()
+
+    logger.info('Serving metrics on port {0}'.format(port))
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    """ HTTP server handling each request in a thread """
+    daemon_threads = True
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """ Serve the metrics on /metrics """
+    def do_GET(self):
+        """ Handle GET requests """
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+
+        body = generate()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """ Log requests at debug level instead of to stderr """
+        logger.debug('Metrics request from {0}: {1}'.format(
+            self.client_address[0], format % args))
+
+
+def _format_labels(labels):
+    """ Format label pairs as {name="value",...}
+
+    :type labels: list
+    :param labels: List of tuples (name, value)
+    :returns: unicode
+    """
+    if not labels:
+        return u''
+
+    return u'{' + u','.join(
+        u'{0}="{1}"'.format(
+            name,
+            value.replace('\\', '\\\\').replace('\n', '\\n').replace(
+                '"', '\\"'))
+        for name, value in labels) + u'}'
+
+
+def _format_value(value):
+    """ Format a sample value
+
+    :type value: float
+    :param value: Value
+    :returns: str
+    """
+    if isinstance(value, float):
+        return repr(value)
+
+    return str(value)
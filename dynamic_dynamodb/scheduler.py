@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+""" Run the check cycles on fixed deadlines
+
+Cycles are due every check-interval seconds, counted from the start of the
+first cycle, no matter how long each cycle takes. If check-spread is set,
+the tables of a cycle are started at jittered times spread over that many
+seconds, instead of all at once.
+
+Each table also has its own check interval, between its min-check-interval
+and max-check-interval. Tables are only checked in the cycles where they
+are due. The interval is shortened for tables that are throttled or close
+to their upper thresholds, and stretched for tables with a flat, low
+utilisation.
+
+The due tables are checked in order of urgency: tables that were throttled
+at their last check first, then by how close they were to their upper
+thresholds and by how long ago they were checked.
+"""
+import random
+import time
+
+from dynamic_dynamodb.log_handler import LOGGER as logger
+from dynamic_dynamodb.config_handler import get_global_option
+
+# Time the running cycle was due and the time the next cycle is due,
+# None before the first cycle
+CYCLE_DUE = None
+NEXT_CYCLE = None
+
+# Last and next check time, check interval, utilisation and throttle
+# events of each table
+TABLE_SCHEDULES = {}
+
+# Tables using more than this share of an upper threshold are checked
+# more often
+NEAR_THRESHOLD_SHARE = 0.8
+
+# Utilisation changing less than this many percentage points between two
+# checks is considered flat
+FLAT_CHANGE_PERCENT = 5.0
+
+
+def start_cycle():
+    """ Wait until the next cycle is due
+
+    The first cycle starts at once.
+
+    :returns: float -- Time the cycle was due
+    """
+    global CYCLE_DUE
+
+    if NEXT_CYCLE is None:
+        CYCLE_DUE = time.time()
+    else:
+        logger.debug('Sleeping {0:.1f} seconds until next check'.format(
+            max(NEXT_CYCLE - time.time(), 0)))
+        sleep_until(NEXT_CYCLE)
+        CYCLE_DUE = NEXT_CYCLE
+
+    return CYCLE_DUE
+
+
+def end_cycle():
+    """ Schedule the next cycle, check-interval after this one was due
+
+    If this cycle overran, that is reported and the next cycle starts at
+    once. The deadlines after it are counted from then on.
+
+    :returns: bool -- True if the cycle overran
+    """
+    global NEXT_CYCLE
+
+    NEXT_CYCLE = CYCLE_DUE + get_global_option('check_interval')
+
+    now = time.time()
+    if now <= NEXT_CYCLE:
+        return False
+
+    logger.warning(
+        'Check cycle overran check-interval ({0} seconds) by {1:.1f} '
+        'seconds, starting the next check now'.format(
+            get_global_option('check_interval'), now - NEXT_CYCLE))
+    NEXT_CYCLE = now
+
+    return True
+
+
+def get_next_cycle():
+    """ Return the time the next cycle is due
+
+    :returns: float or None -- None before the first cycle
+    """
+    return NEXT_CYCLE
+
+
+def spread(count, due):
+    """ Return the start times of the tables of a cycle
+
+    The check-spread window is divided into one slot per table. Each table
+    starts at a random time within its slot.
+
+    :type count: int
+    :param count: Number of tables
+    :type due: float
+    :param due: Time the cycle was due
+    :returns: list -- Start times, in table order
+    """
+    window = get_global_option('check_spread')
+    if not window or not count:
+        return [due] * count
+
+    slot = float(window) / count
+    return [due + (i + random.random()) * slot for i in range(count)]
+
+
+def sleep_until(wake_up):
+    """ Sleep until the given time
+
+    Signals, like SIGUSR1 for the timings, cut time.sleep() short, so
+    sleep again until the time has come.
+
+    :type wake_up: float
+    :param wake_up: Time to wake up
+    """
+    while True:
+        remaining = wake_up - time.time()
+        if remaining <= 0:
+            return
+
+        time.sleep(remaining)
+
+
+def get_due_tables(tables, due):
+    """ Return the tables that should be checked in this cycle
+
+    Tables that have not been checked yet are always due. Tables are due
+    if their next check is closer to this cycle than to the next one.
+
+    :type tables: list
+    :param tables: List of tuples (table_name, table_key)
+    :type due: float
+    :param due: Time the cycle was due
+    :returns: list -- The due tables, in the same order
+    """
+    # Forget the tables that are gone
+    table_names = set(table_name for table_name, table_key in tables)
+    for table_name in list(TABLE_SCHEDULES):
+        if table_name not in table_names:
+            del TABLE_SCHEDULES[table_name]
+
+    margin = get_global_option('check_interval') / 2.0
+    due_tables = [
+        (table_name, table_key) for table_name, table_key in tables
+        if table_name not in TABLE_SCHEDULES or
+        TABLE_SCHEDULES[table_name]['next_check'] <= due + margin
+    ]
+
+    if len(due_tables) < len(tables):
+        logger.debug('Checking {0:d} of {1:d} tables, the others are not '
+                     'due yet'.format(len(due_tables), len(tables)))
+
+    return due_tables
+
+
+def prioritize(tables, due):
+    """ Order the tables of a cycle by urgency
+
+    Tables are ordered by the throttle events seen at their last check,
+    then by their highest utilisation relative to its upper threshold, then
+    by the time since their last check. Tables that have not been checked
+    yet come after the throttled ones, in the given order.
+
+    :type tables: list
+    :param tables: List of tuples (table_name, table_key)
+    :type due: float
+    :param due: Time the cycle was due
+    :returns: list -- The tables, most urgent first
+    """
+    prioritized = sorted(
+        tables, key=lambda table: __urgency(table[0], due), reverse=True)
+
+    if prioritized and prioritized[0][0] in TABLE_SCHEDULES:
+        schedule = TABLE_SCHEDULES[prioritized[0][0]]
+        if schedule['throttled_events']:
+            logger.debug(
+                '{0} - Checking first, {1:d} throttle events at the last '
+                'check'.format(
+                    prioritized[0][0], schedule['throttled_events']))
+
+    return prioritized
+
+
+def get_loads(gsi_name, snapshots, entity_config):
+    """ Return the loads of a table or GSI for schedule_table()
+
+    :type gsi_name: str
+    :param gsi_name: Name of the GSI, None for the table
+    :type snapshots: dict
+    :param snapshots: 'reads' and 'writes' -> metrics snapshot, see
+        core.decision, None if autoscaling is disabled
+    :type entity_config: dict
+    :param entity_config: Table or GSI configuration
+    :returns: (dict, int) -- (gsi_name, 'reads' or 'writes') ->
+        (utilisation percent, lower threshold, upper threshold), and the
+        throttle events
+    """
+    loads = {}
+    throttled_events = 0
+    for operation, snapshot in snapshots.items():
+        if snapshot is None:
+            continue
+
+        loads[(gsi_name, operation)] = (
+            snapshot['consumed_percent'],
+            entity_config['{0}_lower_threshold'.format(operation)],
+            entity_config['{0}_upper_threshold'.format(operation)])
+        throttled_events += snapshot['throttled_count']
+
+    return loads, throttled_events
+
+
+def schedule_table(
+        table_name, due, loads, throttled_events,
+        min_check_interval=None, max_check_interval=None):
+    """ Set when a table should be checked next
+
+    :type table_name: str
+    :param table_name: Name of the DynamoDB table
+    :type due: float
+    :param due: Time the cycle that checked the table was due
+    :type loads: dict
+    :param loads: (gsi_name, 'reads' or 'writes') -> (utilisation percent,
+        lower threshold, upper threshold) for the table and its GSIs
+    :type throttled_events: int
+    :param throttled_events: Throttle events of the table and its GSIs
+    :type min_check_interval: int
+    :param min_check_interval: Shortest interval, check-interval if None
+    :type max_check_interval: int
+    :param max_check_interval: Longest interval, check-interval if None
+    :returns: int -- Seconds until the next check
+    """
+    check_interval = get_global_option('check_interval')
+    if min_check_interval is None:
+        min_check_interval = min(
+            check_interval, max_check_interval or check_interval)
+    if max_check_interval is None:
+        max_check_interval = max(check_interval, min_check_interval)
+
+    previous = TABLE_SCHEDULES.get(table_name)
+    interval = previous['interval'] if previous else check_interval
+
+    if throttled_events or any(
+            utilisation >= upper
+            for utilisation, lower, upper in loads.values()):
+        interval = min_check_interval
+    elif any(
+            utilisation >= upper * NEAR_THRESHOLD_SHARE
+            for utilisation, lower, upper in loads.values()):
+        interval = interval / 2
+    elif previous and loads and all(
+            utilisation <= lower and
+            abs(utilisation - previous['loads'].get(key, (0,))[0]) <
+            FLAT_CHANGE_PERCENT
+            for key, (utilisation, lower, upper) in loads.items()):
+        interval = interval * 2
+    else:
+        interval = check_interval
+
+    interval = int(min(max(interval, min_check_interval), max_check_interval))
+
+    if interval != (previous['interval'] if previous else check_interval):
+        logger.info('{0} - Checking every {1:d} seconds'.format(
+            table_name, interval))
+
+    TABLE_SCHEDULES[table_name] = {
+        'checked': due,
+        'next_check': due + interval,
+        'interval': interval,
+        'loads': loads,
+        'throttled_events': throttled_events
+    }
+
+    return interval
+
+
+def __urgency(table_name, due):
+    """ Return the sort key of a table, higher is more urgent
+
+    :type table_name: str
+    :param table_name: Name of the DynamoDB table
+    :type due: float
+    :param due: Time the cycle was due
+    :returns: tuple -- (throttle events, utilisation share of the upper
+        threshold, seconds since the last check)
+    """
+    schedule = TABLE_SCHEDULES.get(table_name)
+    if schedule is None:
+        return 0, float('inf'), float('inf')
+
+    share = max([
+        utilisation / upper
+        for utilisation, lower, upper in schedule['loads'].values()
+        if upper
+    ] or [0.0])
+
+    return schedule['throttled_events'], share, due - schedule['checked']
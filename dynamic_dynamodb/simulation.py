@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+""" Replay recorded traffic through the scaling decisions
+
+Scaling settings, e.g. the thresholds against the pi scaling-controller,
+can be compared offline before they are rolled out. The traffic is the
+consumed units wanted at each check, e.g. exported from the
+ConsumedReadCapacityUnits CloudWatch metric. Nothing is fetched from or
+sent to AWS.
+
+    traffic = simulation.load_traffic('consumed_reads.csv')
+    config = simulation.get_entity_config(
+        scaling_controller='pi', target_reads_utilization=50)
+    print(simulation.simulate(traffic, config)['updates'])
+"""
+import csv
+import math
+
+from dynamic_dynamodb.config import DEFAULT_OPTIONS
+from dynamic_dynamodb.core import controller, decision
+
+
+def get_entity_config(**options):
+    """ Return a table configuration with the default options
+
+    :param options: Options to change, e.g. reads_upper_threshold=80
+    :returns: dict -- Table configuration
+    """
+    entity_config = dict(DEFAULT_OPTIONS['table'])
+    entity_config.update(options)
+
+    return entity_config
+
+
+def load_traffic(path, column=-1):
+    """ Read the consumed units of each check from a CSV file
+
+    Rows without a number in the column, like headers, are skipped.
+
+    :type path: str
+    :param path: Path to the CSV file
+    :type column: int
+    :param column: Column with the consumed units, the last by default
+    :returns: list -- Consumed units per check
+    """
+    traffic = []
+    with open(path) as csv_file:
+        for row in csv.reader(csv_file):
+            try:
+                traffic.append(float(row[column]))
+            except (IndexError, ValueError):
+                continue
+
+    return traffic
+
+
+def simulate(
+        traffic, entity_config, operation='reads', initial_units=None,
+        check_interval=300, max_decreases_per_day=4):
+    """ Replay the traffic through the scaling decisions
+
+    Each check consumes up to the provisioned units, the rest of the
+    traffic is throttled. Provisioning updates take effect at the next
+    check. Like DynamoDB, decreases beyond max_decreases_per_day in 24
+    hours are rejected.
+
+    :type traffic: list
+    :param traffic: Consumed units wanted at each check
+    :type entity_config: dict
+    :param entity_config: Table or GSI configuration
+    :type operation: str
+    :param operation: 'reads' or 'writes'
+    :type initial_units: int
+    :param initial_units: Provisioning at the first check, the first
+        traffic value by default
+    :type check_interval: int
+    :param check_interval: Seconds between the checks
+    :type max_decreases_per_day: int
+    :param max_decreases_per_day: Decreases allowed in 24 hours, None for
+        no limit
+    :returns: dict -- updates, increases, decreases, rejected_decreases,
+        max_daily_decreases, throttled_checks, throttled_units and the
+        provisioning at each check
+    """
+    units = int(initial_units or max(1, int(math.ceil(traffic[0]))))
+    num_consec_checks = 0
+    controller_state = None
+    decreases = []
+
+    result = {
+        'updates': 0,
+        'increases': 0,
+        'decreases': 0,
+        'rejected_decreases': 0,
+        'max_daily_decreases': 0,
+        'throttled_checks': 0,
+        'throttled_units': 0.0,
+        'provisioning': []
+    }
+
+    for check, wanted in enumerate(traffic):
+        now = check * check_interval
+        result['provisioning'].append(units)
+        consumed = min(wanted, units)
+        throttled = wanted - consumed
+        if throttled > 0:
+            result['throttled_checks'] += 1
+            result['throttled_units'] += throttled
+
+        snapshot = {
+            'consumed_percent': 100.0 * consumed / units,
+            'throttled_count': int(math.ceil(throttled)),
+            'throttled_by_provisioned_percent': 100.0 * throttled / units,
+            'throttled_by_consumed_percent':
+                100.0 * throttled / consumed if consumed else 0.0
+        }
+
+        scaling = decision.decide(
+            operation,
+            snapshot,
+            units,
+            entity_config,
+            num_consec_checks,
+            'simulation',
+            controller_state,
+            now)
+        num_consec_checks = scaling.num_consec_checks
+        controller_state = scaling.controller_state
+
+        new_units = int(scaling.units)
+        if not scaling.update_needed or new_units == units:
+            continue
+
+        decreases = [
+            decreased for decreased in decreases
+            if decreased > now - controller.DAY]
+        if new_units < units:
+            if (max_decreases_per_day and
+                    len(decreases) >= max_decreases_per_day):
+                result['rejected_decreases'] += 1
+                continue
+
+            decreases.append(now)
+            result['decreases'] += 1
+            result['max_daily_decreases'] = max(
+                result['max_daily_decreases'], len(decreases))
+        else:
+            result['increases'] += 1
+
+        result['updates'] += 1
+        controller_state = controller.get_updated_state(
+            controller_state, True, new_units < units, now)
+        units = new_units
+
+    return result
@@ -1,14 +1,13 @@
 # -*- coding: utf-8 -*-
 """ This module returns stats about the DynamoDB table """
-from datetime import datetime, timedelta
-
 from boto.exception import JSONResponseError, BotoServerError
 from retrying import retry
 
 from dynamic_dynamodb.aws import dynamodb
+from dynamic_dynamodb.metrics import (
+    CONSUMED_UNITS, PROVISIONED_UNITS, THROTTLED_EVENTS)
 from dynamic_dynamodb.log_handler import LOGGER as logger
-from dynamic_dynamodb.aws.cloudwatch import (
-    CLOUDWATCH_CONNECTION as cloudwatch_connection)
+from dynamic_dynamodb.aws import cloudwatch
 
 
 def get_consumed_read_units_percent(
@@ -53,6 +52,11 @@ def get_consumed_read_units_percent(
     except JSONResponseError:
         raise
 
+    CONSUMED_UNITS.set(
+        consumed_read_units, table=table_name, gsi=gsi_name, operation='read')
+    PROVISIONED_UNITS.set(
+        gsi_read_units, table=table_name, gsi=gsi_name, operation='read')
+
     logger.info('{0} - GSI: {1} - Consumed read units: {2:.2f}%'.format(
         table_name, gsi_name, consumed_read_units_percent))
     return consumed_read_units_percent
@@ -87,6 +91,10 @@ def get_throttled_read_event_count(
     else:
         throttled_read_events = 0
 
+    THROTTLED_EVENTS.set(
+        throttled_read_events, table=table_name, gsi=gsi_name,
+        operation='read')
+
     logger.info('{0} - GSI: {1} - Read throttle count: {2:d}'.format(
         table_name, gsi_name, throttled_read_events))
     return throttled_read_events
@@ -230,6 +238,12 @@ def get_consumed_write_units_percent(
     except JSONResponseError:
         raise
 
+    CONSUMED_UNITS.set(
+        consumed_write_units, table=table_name, gsi=gsi_name,
+        operation='write')
+    PROVISIONED_UNITS.set(
+        gsi_write_units, table=table_name, gsi=gsi_name, operation='write')
+
     logger.info('{0} - GSI: {1} - Consumed write units: {2:.2f}%'.format(
         table_name, gsi_name, consumed_write_units_percent))
     return consumed_write_units_percent
@@ -264,6 +278,10 @@ def get_throttled_write_event_count(
     else:
         throttled_write_events = 0
 
+    THROTTLED_EVENTS.set(
+        throttled_write_events, table=table_name, gsi=gsi_name,
+        operation='write')
+
     logger.info('{0} - GSI: {1} - Write throttle count: {2:d}'.format(
         table_name, gsi_name, throttled_write_events))
     return throttled_write_events
@@ -394,23 +412,12 @@ def __get_aws_metric(table_name,
         there was no data
     """
     try:
-        now = datetime.utcnow()
-        start_time = now - timedelta(minutes=lookback_window_start)
-        end_time = now - timedelta(
-            minutes=lookback_window_start - lookback_period)
-
-        return cloudwatch_connection.get_metric_statistics(
-            period=lookback_period * 60,
-            start_time=start_time,
-            end_time=end_time,
-            metric_name=metric_name,
-            namespace='AWS/DynamoDB',
-            statistics=['Sum'],
-            dimensions={
-                'TableName': table_name,
-                'GlobalSecondaryIndexName': gsi_name
-            },
-            unit='Count')
+        return cloudwatch.get_dynamodb_metric(
+            table_name,
+            gsi_name,
+            metric_name,
+            lookback_window_start,
+            lookback_period)
     except BotoServerError as error:
         logger.error(
             'Unknown boto error. Status: "{0}". '
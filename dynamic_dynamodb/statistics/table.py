@@ -1,14 +1,13 @@
 # -*- coding: utf-8 -*-
 """ This module returns stats about the DynamoDB table """
-from datetime import datetime, timedelta
-
 from boto.exception import JSONResponseError, BotoServerError
 from retrying import retry
 
 from dynamic_dynamodb.aws import dynamodb
+from dynamic_dynamodb.metrics import (
+    CONSUMED_UNITS, PROVISIONED_UNITS, THROTTLED_EVENTS)
 from dynamic_dynamodb.log_handler import LOGGER as logger
-from dynamic_dynamodb.aws.cloudwatch import (
-    CLOUDWATCH_CONNECTION as cloudwatch_connection)
+from dynamic_dynamodb.aws import cloudwatch
 
 
 def get_consumed_read_units_percent(
@@ -50,6 +49,11 @@ def get_consumed_read_units_percent(
     except JSONResponseError:
         raise
 
+    CONSUMED_UNITS.set(
+        consumed_read_units, table=table_name, gsi=None, operation='read')
+    PROVISIONED_UNITS.set(
+        table_read_units, table=table_name, gsi=None, operation='read')
+
     logger.info('{0} - Consumed read units: {1:.2f}%'.format(
         table_name, consumed_read_units_percent))
     return consumed_read_units_percent
@@ -81,6 +85,9 @@ def get_throttled_read_event_count(
     else:
         throttled_read_events = 0
 
+    THROTTLED_EVENTS.set(
+        throttled_read_events, table=table_name, gsi=None, operation='read')
+
     logger.debug('{0} - Read throttle count: {1:d}'.format(
         table_name, throttled_read_events))
     return throttled_read_events
@@ -194,6 +201,11 @@ def get_consumed_write_units_percent(
     except JSONResponseError:
         raise
 
+    CONSUMED_UNITS.set(
+        consumed_write_units, table=table_name, gsi=None, operation='write')
+    PROVISIONED_UNITS.set(
+        table_write_units, table=table_name, gsi=None, operation='write')
+
     logger.info('{0} - Consumed write units: {1:.2f}%'.format(
         table_name, consumed_write_units_percent))
     return consumed_write_units_percent
@@ -225,6 +237,9 @@ def get_throttled_write_event_count(
     else:
         throttled_write_count = 0
 
+    THROTTLED_EVENTS.set(
+        throttled_write_count, table=table_name, gsi=None, operation='write')
+
     logger.debug('{0} - Write throttle count: {1:d}'.format(
         table_name, throttled_write_count))
     return throttled_write_count
@@ -339,20 +354,12 @@ def __get_aws_metric(table_name, lookback_window_start, lookback_period,
     be None if there was no data
     """
     try:
-        now = datetime.utcnow()
-        start_time = now - timedelta(minutes=lookback_window_start)
-        end_time = now - timedelta(
-            minutes=lookback_window_start - lookback_period)
-
-        return cloudwatch_connection.get_metric_statistics(
-            period=lookback_period * 60,
-            start_time=start_time,
-            end_time=end_time,
-            metric_name=metric_name,
-            namespace='AWS/DynamoDB',
-            statistics=['Sum'],
-            dimensions={'TableName': table_name},
-            unit='Count')
+        return cloudwatch.get_dynamodb_metric(
+            table_name,
+            None,
+            metric_name,
+            lookback_window_start,
+            lookback_period)
     except BotoServerError as error:
         logger.error(
             'Unknown boto error. Status: "{0}". '
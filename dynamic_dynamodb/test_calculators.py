@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 """ Testing the Dynamic DynamoDB calculators """
+import itertools
 import unittest
 
 import calculators
@@ -153,5 +154,115 @@ class TestCalculators(unittest.TestCase):
         result = calculators.increase_writes_in_units(20, 10, 25, 'test')
         self.assertEqual(result, 25)
 
+    def test_increase_reads_to_target(self):
+        """ Ensure that the target utilisation is reached in one step """
+        result = calculators.increase_reads_to_target(
+            100, 70, 1000, 210.0, 'test')
+        self.assertEqual(result, 300)
+
+    def test_increase_reads_to_target_hit_max_value(self):
+        """ Check that max values are honoured """
+        result = calculators.increase_reads_to_target(
+            100, 70, 250, 210.0, 'test')
+        self.assertEqual(result, 250)
+
+    def test_increase_reads_to_target_already_reached(self):
+        """ Check that the provisioning is not decreased """
+        result = calculators.increase_reads_to_target(
+            100, 70, 1000, 50.0, 'test')
+        self.assertEqual(result, 100)
+
+    def test_increase_writes_to_target(self):
+        """ Ensure that the target utilisation is reached in one step """
+        result = calculators.increase_writes_to_target(
+            10, 80, 0, 101.0, 'test')
+        self.assertEqual(result, 13)
+
+    def test_increase_writes_target_unit(self):
+        """ Ensure that the target unit uses the target utilisation """
+        result = calculators.increase_writes(
+            'target', 10, 80, 0, 101.0, 'test')
+        self.assertEqual(result, 13)
+
+
+@unittest.skipIf(calculators.numpy is None, 'NumPy is not installed')
+class TestBatchCalculators(unittest.TestCase):
+    """ Test that the batch calculators match the scalar ones """
+
+    def setUp(self):
+        """ Build one element per combination of the inputs """
+        self.cases = list(itertools.product(
+            ['percent', 'units'],
+            [1, 3, 7, 20, 99, 100, 333, 1000],
+            [0, 1, 10, 33, 50, 90, 120],
+            [0, 1, 15, 250, 1500],
+            [0.0, 12.5, 49.9, 99.99, 100.0, 150.0, 333.3]))
+        (self.units, self.current, self.step,
+         self.limit, self.consumed) = zip(*self.cases)
+
+    def test_decrease_reads_batch(self):
+        """ Ensure that batch read decreases match decrease_reads """
+        result = calculators.decrease_reads_batch(
+            self.units, self.current, self.step, self.limit)
+        self.assertEqual(list(result), [
+            calculators.decrease_reads(
+                units, current, step, limit, 'test')
+            for units, current, step, limit, consumed in self.cases])
+
+    def test_decrease_writes_batch(self):
+        """ Ensure that batch write decreases match decrease_writes """
+        result = calculators.decrease_writes_batch(
+            self.units, self.current, self.step, self.limit)
+        self.assertEqual(list(result), [
+            calculators.decrease_writes(
+                units, current, step, limit, 'test')
+            for units, current, step, limit, consumed in self.cases])
+
+    def test_increase_reads_batch(self):
+        """ Ensure that batch read increases match increase_reads """
+        result = calculators.increase_reads_batch(
+            self.units, self.current, self.step, self.limit, self.consumed)
+        self.assertEqual(list(result), [
+            calculators.increase_reads(
+                units, current, step, limit, consumed, 'test')
+            for units, current, step, limit, consumed in self.cases])
+
+    def test_increase_writes_batch(self):
+        """ Ensure that batch write increases match increase_writes """
+        result = calculators.increase_writes_batch(
+            self.units, self.current, self.step, self.limit, self.consumed)
+        self.assertEqual(list(result), [
+            calculators.increase_writes(
+                units, current, step, limit, consumed, 'test')
+            for units, current, step, limit, consumed in self.cases])
+
+    def test_increase_batch_target_unit(self):
+        """ Ensure that batch target increases match the scalar ones """
+        cases = [
+            (current, target, limit, consumed)
+            for units, current, target, limit, consumed in self.cases
+            if target]
+        current, target, limit, consumed = zip(*cases)
+        for batch, scalar in [
+                (calculators.increase_reads_batch,
+                 calculators.increase_reads),
+                (calculators.increase_writes_batch,
+                 calculators.increase_writes)]:
+            result = batch('target', current, target, limit, consumed)
+            self.assertEqual(list(result), [
+                scalar('target', *(case + ('test',))) for case in cases])
+
+    def test_batch_with_one_unit_for_all(self):
+        """ Check that a single unit applies to all elements """
+        result = calculators.increase_reads_batch(
+            'units', [10, 20], [5, 5], [0, 22], [50.0, 50.0])
+        self.assertEqual(list(result), [15, 22])
+
+    def test_batch_without_limits(self):
+        """ Check that None limits are treated as not set """
+        result = calculators.decrease_writes_batch(
+            'percent', [200, 20], [90, 120], [None, None])
+        self.assertEqual(list(result), [20, 1])
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
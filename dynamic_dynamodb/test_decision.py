@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+""" Testing the Dynamic DynamoDB scaling decisions """
+import unittest
+
+from dynamic_dynamodb.config import DEFAULT_OPTIONS
+from dynamic_dynamodb.core import decision
+
+
+def get_config(**options):
+    """ Return a table configuration with the default options """
+    entity_config = dict(DEFAULT_OPTIONS['table'])
+    entity_config.update(options)
+    return entity_config
+
+
+def get_snapshot(consumed_percent, throttled_count=0):
+    """ Return a metrics snapshot """
+    return {
+        'consumed_percent': consumed_percent,
+        'throttled_count': throttled_count,
+        'throttled_by_provisioned_percent': 0.0,
+        'throttled_by_consumed_percent': 0.0
+    }
+
+
+def decide(consumed_percent, current_units=100, num_consec_checks=0,
+           throttled_count=0, **options):
+    """ Decide the reads of a table """
+    return decision.decide(
+        'reads',
+        get_snapshot(consumed_percent, throttled_count),
+        current_units,
+        get_config(**options),
+        num_consec_checks,
+        'my_table')
+
+
+class TestDecide(unittest.TestCase):
+    """ Test the scaling decisions of the thresholds """
+
+    def test_no_change(self):
+        """ Ensure that the provisioning is kept between the thresholds """
+        result = decide(50.0)
+        self.assertFalse(result.update_needed)
+        self.assertEqual(result.units, 100)
+        self.assertEqual(result.num_consec_checks, 0)
+
+    def test_autoscaling_disabled(self):
+        """ Ensure that nothing is decided with autoscaling disabled """
+        result = decision.decide(
+            'reads', None, 100,
+            get_config(enable_reads_autoscaling=False), 2, 'my_table')
+        self.assertFalse(result.update_needed)
+        self.assertEqual(result.num_consec_checks, 0)
+        self.assertEqual(result.messages, [(
+            'info', 'my_table - Autoscaling of reads has been disabled')])
+
+    def test_scale_up_upper_threshold(self):
+        """
+        Ensure that the upper threshold scales up and resets the
+        consecutive checks
+        """
+        result = decide(95.0, num_consec_checks=2)
+        self.assertTrue(result.update_needed)
+        self.assertEqual(result.units, 150)
+        self.assertEqual(result.num_consec_checks, 0)
+        self.assertIn(
+            ('info',
+             'my_table - Resetting the number of consecutive read checks. '
+             'Reason: scale up due to consumed threshold being exceeded'),
+            result.messages)
+
+    def test_scale_up_disabled(self):
+        """ Ensure that nothing is scaled up with up scaling disabled """
+        result = decide(95.0, enable_reads_up_scaling=False)
+        self.assertFalse(result.update_needed)
+        self.assertEqual(result.units, 100)
+
+    def test_consumed_scale_replaces_upper_threshold(self):
+        """ Ensure that the upper threshold is ignored if a scale is set """
+        result = decide(95.0, increase_consumed_reads_scale={99: 10})
+        self.assertFalse(result.update_needed)
+        self.assertEqual(result.units, 100)
+
+        result = decide(60.0, increase_consumed_reads_scale={50: 20})
+        self.assertTrue(result.update_needed)
+        self.assertEqual(result.units, 120)
+
+    def test_consumed_scale_replaces_lower_threshold(self):
+        """ Ensure that the lower threshold is ignored if a scale is set """
+        result = decide(20.0, decrease_consumed_reads_scale={5: 10})
+        self.assertFalse(result.update_needed)
+        self.assertEqual(result.units, 100)
+
+        result = decide(4.0, decrease_consumed_reads_scale={5: 10})
+        self.assertTrue(result.update_needed)
+        self.assertEqual(result.units, 90)
+
+    def test_scale_down_lower_threshold(self):
+        """ Ensure that the lower threshold scales down """
+        result = decide(20.0)
+        self.assertTrue(result.update_needed)
+        self.assertEqual(result.units, 50)
+        self.assertEqual(result.num_consec_checks, 0)
+
+    def test_scale_down_after_consecutive_checks(self):
+        """ Ensure that scaling down waits for the consecutive checks """
+        result = decide(
+            20.0, num_consec_checks=0, num_read_checks_before_scale_down=3)
+        self.assertFalse(result.update_needed)
+        self.assertEqual(result.units, 100)
+        self.assertEqual(result.num_consec_checks, 1)
+
+        result = decide(
+            20.0, num_consec_checks=2, num_read_checks_before_scale_down=3)
+        self.assertTrue(result.update_needed)
+        self.assertEqual(result.units, 50)
+        self.assertEqual(result.num_consec_checks, 0)
+
+    def test_scale_down_disabled(self):
+        """ Ensure that nothing is scaled down with down scaling disabled """
+        result = decide(20.0, enable_reads_down_scaling=False)
+        self.assertFalse(result.update_needed)
+        self.assertEqual(result.num_consec_checks, 0)
+
+    def test_reset_percent(self):
+        """ Ensure that the reset percent resets the consecutive checks """
+        result = decide(
+            45.0, num_consec_checks=2, num_read_checks_reset_percent=40)
+        self.assertFalse(result.update_needed)
+        self.assertEqual(result.num_consec_checks, 0)
+        self.assertIn(
+            ('info',
+             'my_table - Resetting the number of consecutive read checks. '
+             'Reason: Consumed percent 45.0 is greater than reset percent: '
+             '40'),
+            result.messages)
+
+    def test_reset_percent_not_reached(self):
+        """ Ensure that the consecutive checks are kept below it """
+        result = decide(
+            35.0, num_consec_checks=2, num_read_checks_reset_percent=40)
+        self.assertEqual(result.num_consec_checks, 2)
+
+    def test_max_provisioned(self):
+        """ Ensure that tables over max-provisioned-reads are scaled down """
+        result = decide(50.0, current_units=200, max_provisioned_reads=120)
+        self.assertTrue(result.update_needed)
+        self.assertEqual(result.units, 120)
+        self.assertIn(
+            ('info',
+             'my_table - Will not increase reads over max-provisioned-reads '
+             'limit (120 reads)'),
+            result.messages)
+
+    def test_min_provisioned(self):
+        """ Ensure that tables under min-provisioned-reads are scaled up """
+        result = decide(50.0, current_units=50, min_provisioned_reads=80)
+        self.assertTrue(result.update_needed)
+        self.assertEqual(result.units, 80)
+        self.assertIn(
+            ('info',
+             'my_table - Increasing reads to meet min-provisioned-reads '
+             'limit (80 reads)'),
+            result.messages)
+
+    def test_min_provisioned_limits_scale_down(self):
+        """ Ensure that scaling down stops at min-provisioned-reads """
+        result = decide(20.0, min_provisioned_reads=80)
+        self.assertTrue(result.update_needed)
+        self.assertEqual(result.units, 80)
+
+    def test_throttled_count(self):
+        """ Ensure that throttled events scale up by increase-reads-with """
+        result = decide(
+            50.0, throttled_count=20, throttled_reads_upper_threshold=10)
+        self.assertTrue(result.update_needed)
+        self.assertEqual(result.units, 150)
+
+    def test_throttled_count_max_provisioned(self):
+        """ Ensure that throttled events scale up to the max only """
+        result = decide(
+            50.0,
+            throttled_count=20,
+            throttled_reads_upper_threshold=10,
+            max_provisioned_reads=130)
+        self.assertTrue(result.update_needed)
+        self.assertEqual(result.units, 130)
+
+    def test_throttled_count_target(self):
+        """
+        Ensure that throttled events scale up to the target utilisation of
+        all of the provisioning
+        """
+        result = decide(
+            50.0,
+            throttled_count=500,
+            throttled_reads_upper_threshold=10,
+            increase_reads_unit='target',
+            target_reads_utilization=80)
+        self.assertTrue(result.update_needed)
+        self.assertEqual(result.units, 125)
+
+    def test_consumed_over_proposed(self):
+        """ Ensure that the provisioning is not cut below the consumption """
+        result = decide(25.0, decrease_consumed_reads_scale={50: 90})
+        self.assertFalse(result.update_needed)
+        self.assertEqual(result.units, 100)
+        self.assertIn(
+            ('info',
+             'my_table - Consumed is over proposed read units. Will leave '
+             'the provisioning at the current setting.'),
+            result.messages)
+
+    def test_consecutive_checks_logged(self):
+        """ Ensure that the consecutive checks are logged every check """
+        for consumed_percent in [50.0, 95.0, 20.0]:
+            result = decide(consumed_percent)
+            self.assertIn(
+                ('debug', 'my_table - Consecutive read checks {0}/1'.format(
+                    1 if consumed_percent == 20.0 else 0)),
+                result.messages)
+
+    def test_zero_percent_not_allowed(self):
+        """
+        Ensure that 0% usage is reported, and the table still scaled
+        down as before the decisions were shared
+        """
+        result = decide(0.0)
+        self.assertIn(
+            ('info',
+             'my_table - Scaling down reads is not done when usage is at 0%'),
+            result.messages)
+        self.assertTrue(result.update_needed)
+        self.assertEqual(result.units, 50)
+
+    def test_zero_percent_allowed(self):
+        """ Ensure that 0% usage is not reported if allowed """
+        result = decide(0.0, allow_scaling_down_reads_on_0_percent=True)
+        self.assertNotIn(
+            ('info',
+             'my_table - Scaling down reads is not done when usage is at 0%'),
+            result.messages)
+        self.assertTrue(result.update_needed)
+        self.assertEqual(result.units, 50)
+
+
+class TestDecideController(unittest.TestCase):
+    """ Test the scaling decisions of the PI controller """
+
+    def decide(self, controller_state):
+        """ Decide the reads of a table at 10% utilisation """
+        return decision.decide(
+            'reads',
+            get_snapshot(10.0),
+            100,
+            get_config(
+                scaling_controller='pi', target_reads_utilization=50),
+            0,
+            'my_table',
+            controller_state,
+            100000)
+
+    def test_scale_down(self):
+        """ Ensure that a low utilisation scales down """
+        result = self.decide({'decreases': [20000, 30000, 40000]})
+        self.assertTrue(result.update_needed)
+        self.assertEqual(result.units, 52)
+
+    def test_throttled(self):
+        """ Ensure that throttled requests count as wanted capacity """
+        snapshot = get_snapshot(100.0, throttled_count=500)
+        snapshot['throttled_by_provisioned_percent'] = 40.0
+        result = decision.decide(
+            'reads',
+            snapshot,
+            100,
+            get_config(
+                scaling_controller='pi', target_reads_utilization=99),
+            0,
+            'my_table')
+        self.assertTrue(result.update_needed)
+        self.assertGreater(result.units, 100)
+
+    def test_scale_down_limit(self):
+        """ Ensure that no more decreases are made than allowed a day """
+        result = self.decide({'decreases': [20000, 30000, 40000, 50000]})
+        self.assertFalse(result.update_needed)
+        self.assertEqual(result.units, 100)
+        self.assertIn(
+            ('info',
+             'my_table - Not scaling down reads, the 4 decreases of the '
+             'last day have been made'),
+            result.messages)
+
+
+class TestPlan(unittest.TestCase):
+    """ Test combining the reads and writes decisions """
+
+    def test_plan(self):
+        """ Ensure that reads and writes are decided separately """
+        result = decision.plan(
+            {'reads': get_snapshot(95.0), 'writes': get_snapshot(50.0)},
+            {'reads': 100, 'writes': 10},
+            get_config(),
+            {'reads': 0, 'writes': 0},
+            'my_table')
+        self.assertTrue(result.update_needed)
+        self.assertEqual(result.reads.units, 150)
+        self.assertFalse(result.writes.update_needed)
+        self.assertEqual(result.writes.units, 10)
+        self.assertEqual(
+            result.messages,
+            result.reads.messages + result.writes.messages)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
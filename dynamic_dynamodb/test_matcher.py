@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+""" Testing the matching of names against the configuration keys """
+import unittest
+
+from dynamic_dynamodb.config.matcher import compile_matcher
+
+
+class TestMatcher(unittest.TestCase):
+    """ Test the configuration key matcher """
+
+    def test_exact(self):
+        """ Ensure that literal keys only match their name """
+        matcher = compile_matcher(['^my_table$', '^other$'])
+        self.assertEqual(matcher.match('my_table'), ('^my_table$',))
+        self.assertEqual(matcher.match('my_table_2'), ())
+
+    def test_prefix(self):
+        """ Ensure that keys with a literal prefix are matched in order """
+        matcher = compile_matcher(['^prod_.*', '^prod_a$', '^dev_.*'])
+        self.assertEqual(matcher.match('prod_a'), ('^prod_.*', '^prod_a$'))
+        self.assertEqual(matcher.match_first('dev_b'), '^dev_.*')
+        self.assertIsNone(matcher.match_first('test_c'))
+
+    def test_combined(self):
+        """ Ensure that keys without a literal prefix are matched """
+        matcher = compile_matcher(['.*_a$', '(prod|dev)_b', '^c$'])
+        self.assertEqual(matcher.match('prod_b'), ('(prod|dev)_b',))
+        self.assertEqual(matcher.match('x_a'), ('.*_a$',))
+        self.assertEqual(matcher.match('x_b'), ())
+
+    def test_duplicate_group_names(self):
+        """ Ensure that keys may reuse the same named group """
+        matcher = compile_matcher(['^(?P<env>prod)_a', '^(?P<env>dev)_b'])
+        self.assertEqual(matcher.match('prod_a'), ('^(?P<env>prod)_a',))
+        self.assertEqual(matcher.match('dev_b'), ('^(?P<env>dev)_b',))
+        self.assertEqual(matcher.match('dev_a'), ())
+
+    def test_back_reference(self):
+        """ Ensure that keys with back references are matched on their own """
+        matcher = compile_matcher(['(a|b)_\\1', '(c)_x'])
+        self.assertEqual(matcher.match('a_a'), ('(a|b)_\\1',))
+        self.assertEqual(matcher.match('a_b'), ())
+        self.assertEqual(matcher.match('c_x'), ('(c)_x',))
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
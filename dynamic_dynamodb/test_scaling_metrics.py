@@ -2,18 +2,39 @@
 """ Testing the Dynamic DynamoDB scaling methods """
 import unittest
 
-from dynamic_dynamodb.core.table import scale_reader
+from dynamic_dynamodb.config import scale
+from dynamic_dynamodb.core.table import scale_reader, scale_reader_decrease
+
+
+def linear_scale_reader(provision_increase_scale, current_value):
+    """ The scale reader before the scales were compiled """
+    scale_value = 0
+    for limits in sorted(provision_increase_scale.keys()):
+        if current_value < limits:
+            return scale_value
+        scale_value = provision_increase_scale.get(limits)
+    return scale_value
+
+
+def linear_scale_reader_decrease(provision_decrease_scale, current_value):
+    """ The decrease scale reader before the scales were compiled """
+    scale_value = 0
+    for limits in sorted(provision_decrease_scale.keys(), reverse=True):
+        if current_value > limits:
+            return scale_value
+        scale_value = provision_decrease_scale.get(limits)
+    return scale_value
 
 
 class TestScaleReader(unittest.TestCase):
     """ Test the scale reader method """
 
-    def __init__(self):
+    def setUp(self):
         self.value = {0: 0, 0.25: 5, 0.5: 10, 1: 20, 2: 50, 5: 100}
 
     def test_scale_reader_zero(self):
         """ Ensure that using a current_value of zero returns zero """
-        result = scale_reader(self.value, 0, 80)
+        result = scale_reader(self.value, 0)
         self.assertEqual(result, 0)
 
     def test_scale_reader_lower_threshold(self):
@@ -21,7 +42,7 @@ class TestScaleReader(unittest.TestCase):
         Ensure that when current_value is above zero but
         before the lowest threshold zero is returned
         """
-        result = scale_reader(self.value, 0.1, 80)
+        result = scale_reader(self.value, 0.1)
         self.assertEquals(result, 0)
 
     def test_scale_reader_upper_threshold(self):
@@ -29,7 +50,7 @@ class TestScaleReader(unittest.TestCase):
         Ensure that when current_value is above the highest
         threshold the highest scaling configured is used
         """
-        result = scale_reader(self.value, 7, 80)
+        result = scale_reader(self.value, 7)
         self.assertEquals(result, 100)
 
     def test_scale_reader_boundary_value_lower(self):
@@ -37,7 +58,7 @@ class TestScaleReader(unittest.TestCase):
         Ensure that correct scaling is used when current_value
         is on the lower end of a boundary
         """
-        result = scale_reader(self.value, 1, 80)
+        result = scale_reader(self.value, 0.99)
         self.assertEquals(result, 10)
 
     def test_scale_reader_boundary_value_upper(self):
@@ -45,16 +66,113 @@ class TestScaleReader(unittest.TestCase):
         Ensure that correct scaling is used when current_value
         is on the upper end of a boundary
         """
-        result = scale_reader(self.value, 1.01, 80)
+        result = scale_reader(self.value, 1)
         self.assertEquals(result, 20)
 
     def test_scale_reader_default_scale(self):
         """
         Ensure that if no provision_increase_scale is provided
-        the default_scale_with value is used
+        zero is returned
         """
-        result = scale_reader({}, 5, 80)
-        self.assertEquals(result, 80)
+        result = scale_reader({}, 5)
+        self.assertEquals(result, 0)
+
+    def test_scale_reader_below_all_thresholds(self):
+        """ Ensure that values below the lowest threshold return zero """
+        result = scale_reader({0.5: 10, 1: 20}, 0.25)
+        self.assertEquals(result, 0)
+
+
+class TestScaleReaderDecrease(unittest.TestCase):
+    """ Test the scale reader decrease method """
+
+    def setUp(self):
+        self.value = {0: 0, 0.25: 5, 0.5: 10, 1: 20, 2: 50, 5: 100}
+
+    def test_scale_reader_decrease_boundary_value(self):
+        """ Ensure that a value on a threshold uses its scaling """
+        result = scale_reader_decrease(self.value, 1)
+        self.assertEquals(result, 20)
+
+    def test_scale_reader_decrease_between_thresholds(self):
+        """ Ensure that the next higher threshold is used """
+        result = scale_reader_decrease(self.value, 1.01)
+        self.assertEquals(result, 50)
+
+    def test_scale_reader_decrease_above_all_thresholds(self):
+        """ Ensure that values above the highest threshold return zero """
+        result = scale_reader_decrease(self.value, 7)
+        self.assertEquals(result, 0)
+
+    def test_scale_reader_decrease_default_scale(self):
+        """ Ensure that an empty scale returns zero """
+        result = scale_reader_decrease(None, 5)
+        self.assertEquals(result, 0)
+
+
+class TestCompiledScale(unittest.TestCase):
+    """ Test that the compiled scales match the linear scans """
+
+    def setUp(self):
+        self.scales = [
+            {0: 0, 0.25: 5, 0.5: 10, 1: 20, 2: 50, 5: 100},
+            {50: 10, 70: 25, 90: 50},
+            {-1: 3, 0: 7},
+            {10: 5}
+        ]
+        self.values = [
+            -2, -1, -0.5, 0, 0.1, 0.25, 0.3, 0.5, 0.99, 1, 1.01, 2, 4.99, 5,
+            7, 10, 49.99, 50, 50.01, 69, 70, 89.99, 90, 90.01, 1000,
+            float('inf'), float('-inf'), float('nan')
+        ]
+
+    def test_increase_matches_linear_scan(self):
+        """ Check increase lookups on and around every threshold """
+        for value in self.scales:
+            steps = scale.compile_scale(value)
+            for current_value in self.values:
+                self.assertEqual(
+                    steps.increase(current_value),
+                    linear_scale_reader(value, current_value),
+                    '{0} in {1}'.format(current_value, value))
+
+    def test_decrease_matches_linear_scan(self):
+        """ Check decrease lookups on and around every threshold """
+        for value in self.scales:
+            steps = scale.compile_scale(value)
+            for current_value in self.values:
+                self.assertEqual(
+                    steps.decrease(current_value),
+                    linear_scale_reader_decrease(value, current_value),
+                    '{0} in {1}'.format(current_value, value))
+
+    def test_frozen_scale_is_compiled_once(self):
+        """ Ensure that a scale frozen with the configuration is reused """
+        class FrozenScale(dict):
+            steps = scale.compile_scale({0: 1})
+
+        self.assertIs(
+            scale.get_step_function(FrozenScale({0: 1})), FrozenScale.steps)
+
+    @unittest.skipIf(scale.numpy is None, 'NumPy is not installed')
+    def test_increase_batch_matches_increase(self):
+        """ Check that batch increase lookups match increase() """
+        for value in self.scales:
+            steps = scale.compile_scale(value)
+            self.assertEqual(
+                list(steps.increase_batch(self.values)),
+                [steps.increase(current_value)
+                 for current_value in self.values])
+
+    @unittest.skipIf(scale.numpy is None, 'NumPy is not installed')
+    def test_decrease_batch_matches_decrease(self):
+        """ Check that batch decrease lookups match decrease() """
+        for value in self.scales:
+            steps = scale.compile_scale(value)
+            self.assertEqual(
+                list(steps.decrease_batch(self.values)),
+                [steps.decrease(current_value)
+                 for current_value in self.values])
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)
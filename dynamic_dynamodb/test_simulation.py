@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+""" Testing the PI controller and the traffic simulation """
+import math
+import random
+import unittest
+
+from dynamic_dynamodb import simulation
+from dynamic_dynamodb.core import controller, decision
+
+
+def noisy_traffic(checks=2016, period=288, noise=0.15, seed=42):
+    """ A week of daily cycles with noise, at 5 minute checks """
+    rnd = random.Random(seed)
+    traffic = []
+    for check in range(checks):
+        base = 200 + 150 * math.sin(check * 2 * math.pi / period)
+        traffic.append(max(1.0, base * (1 + rnd.gauss(0, noise))))
+    return traffic
+
+
+def step(consumed_percent, state=None, current_units=100):
+    """ Step the controller with the default gains and band """
+    return controller.step(
+        current_units, consumed_percent, 50, 0.5, 0.1, 25.0, state)
+
+
+class TestControllerStep(unittest.TestCase):
+    """ Test the PI controller step """
+
+    def test_step_on_target(self):
+        """ Ensure that nothing changes at the target utilisation """
+        units, state = step(50.0)
+        self.assertEqual(units, 100)
+        self.assertEqual(state['integral'], 0.0)
+
+    def test_step_within_band(self):
+        """ Ensure that small deviations only add up in the integral """
+        units, state = step(70.0)
+        self.assertEqual(units, 100)
+        self.assertGreater(state['integral'], 0)
+
+    def test_step_single_check_outside_band(self):
+        """ Ensure that one noisy check does not change the provisioning """
+        units, state = step(90.0, {'integral': 0.0, 'average': 0.0})
+        self.assertEqual(units, 100)
+
+    def test_step_up(self):
+        """ Ensure that a large deviation scales up and keeps the integral """
+        units, state = step(100.0)
+        self.assertEqual(units, 160)
+        self.assertEqual(state['integral'], 1.0)
+
+    def test_step_up_at_capacity(self):
+        """ Ensure that a table using all of its provisioning scales up """
+        units, state = step(100.0, {'integral': 0.0, 'average': -30.0})
+        self.assertEqual(units, 160)
+
+    def test_step_down(self):
+        """ Ensure that a low utilisation scales down """
+        units, state = step(10.0)
+        self.assertEqual(units, 52)
+
+    def test_step_lasting_drift(self):
+        """ Ensure that a lasting deviation is corrected eventually """
+        units, state = step(80.0, {'integral': 0.0, 'average': 0.0})
+        self.assertEqual(units, 100)
+        for _ in range(5):
+            units, state = step(80.0, state, units)
+        self.assertGreater(units, 100)
+
+
+class TestControllerState(unittest.TestCase):
+    """ Test the controller state kept between the checks """
+
+    def tearDown(self):
+        controller.STATES.clear()
+
+    def test_updated_state_resets_changed(self):
+        """ Ensure that an applied change resets the integral """
+        state = controller.get_updated_state(
+            {'integral': 1.5, 'average': 30.0}, True, False, 1000)
+        self.assertEqual(state['integral'], 0.0)
+        self.assertEqual(state['average'], 0.0)
+        self.assertEqual(state['decreases'], [])
+
+    def test_updated_state_keeps_unchanged(self):
+        """ Ensure that the integral is kept if nothing was changed """
+        state = controller.get_updated_state(
+            {'integral': 1.5, 'average': 30.0}, False, False, 1000)
+        self.assertEqual(state['integral'], 1.5)
+        self.assertEqual(state['average'], 30.0)
+
+    def test_updated_state_none(self):
+        """ Ensure that there is no state before the first check """
+        self.assertIsNone(
+            controller.get_updated_state(None, True, True, 1000))
+
+    def test_updated_state_decreases(self):
+        """ Ensure that decreases are recorded for a day """
+        state = controller.get_updated_state(
+            {'integral': 0.0, 'decreases': [100, 5000]},
+            True, True, controller.DAY + 1000)
+        self.assertEqual(state['decreases'], [5000, controller.DAY + 1000])
+
+    def test_decreases_left(self):
+        """ Ensure that only the decreases of the last day are counted """
+        state = {'decreases': [100, 5000, 6000]}
+        self.assertEqual(controller.get_decreases_left(state, 4, 7000), 1)
+        self.assertEqual(
+            controller.get_decreases_left(state, 4, controller.DAY + 1000), 2)
+        self.assertEqual(controller.get_decreases_left(None, 4, 7000), 4)
+
+    def test_record_update(self):
+        """
+        Ensure that only the changed operations are reset, and that a
+        decrease counts for the whole table
+        """
+        controller.set_state('my_table', None, 'reads', {'integral': 1.0})
+        controller.set_state('my_table', None, 'writes', {'integral': 1.0})
+        controller.record_update(
+            'my_table', None,
+            {'reads': 100, 'writes': 10},
+            {'reads': 50, 'writes': 10},
+            1000)
+
+        reads = controller.get_state('my_table', None, 'reads')
+        writes = controller.get_state('my_table', None, 'writes')
+        self.assertEqual(reads['integral'], 0.0)
+        self.assertEqual(writes['integral'], 1.0)
+        self.assertEqual(reads['decreases'], [1000])
+        self.assertEqual(writes['decreases'], [1000])
+
+
+    def test_plan_states(self):
+        """
+        Ensure that the states of a plan are stored, and only reset once
+        the plan has been applied
+        """
+        scaling_plan = decision.plan(
+            {
+                'reads': {
+                    'consumed_percent': 10.0,
+                    'throttled_count': 0,
+                    'throttled_by_provisioned_percent': 0.0,
+                    'throttled_by_consumed_percent': 0.0
+                },
+                'writes': None
+            },
+            {'reads': 100, 'writes': 10},
+            simulation.get_entity_config(
+                scaling_controller='pi',
+                target_reads_utilization=50,
+                enable_writes_autoscaling=False),
+            {'reads': 0, 'writes': 0},
+            'my_table',
+            controller.get_states('my_table', 'my_gsi'),
+            1000)
+        controller.store_plan('my_table', 'my_gsi', scaling_plan)
+        self.assertEqual(
+            controller.get_states('my_table', 'my_gsi')['reads']['integral'],
+            -0.8)
+        self.assertEqual(controller.get_states('my_table', None), {})
+
+        controller.record_plan(
+            'my_table', 'my_gsi', scaling_plan, None, 1000)
+        self.assertEqual(
+            controller.get_state('my_table', 'my_gsi', 'reads')['integral'],
+            -0.8)
+
+        controller.record_plan(
+            'my_table', 'my_gsi', scaling_plan, (52, 10), 1000)
+        reads = controller.get_state('my_table', 'my_gsi', 'reads')
+        self.assertEqual(reads['integral'], 0.0)
+        self.assertEqual(reads['decreases'], [1000])
+
+
+    def test_forget_table(self):
+        """ Ensure that the states of a table and its GSIs are dropped """
+        controller.set_state('my_table', None, 'reads', {'integral': 1.0})
+        controller.set_state('my_table', 'my_gsi', 'writes', {})
+        controller.set_state('other_table', None, 'reads', {})
+        controller.forget_table('my_table')
+        self.assertEqual(
+            controller.STATES.keys(), [('other_table', None, 'reads')])
+
+
+class TestSimulation(unittest.TestCase):
+    """ Test replaying traffic through the scaling decisions """
+
+    def setUp(self):
+        self.traffic = noisy_traffic()
+        self.default_config = simulation.get_entity_config()
+        self.aggressive_config = simulation.get_entity_config(
+            reads_upper_threshold=80,
+            reads_lower_threshold=50,
+            increase_reads_with=30,
+            decrease_reads_with=20)
+        self.pi_config = simulation.get_entity_config(
+            scaling_controller='pi',
+            target_reads_utilization=50)
+
+    def test_simulate_steady_traffic(self):
+        """ Ensure that steady traffic on target is never rescaled """
+        result = simulation.simulate(
+            [50.0] * 100, self.pi_config, initial_units=100)
+        self.assertEqual(result['updates'], 0)
+        self.assertEqual(result['provisioning'], [100] * 100)
+
+    def test_simulate_throttling(self):
+        """ Ensure that traffic above the provisioning is throttled """
+        result = simulation.simulate(
+            [140.0] * 3, self.pi_config, initial_units=100)
+        self.assertEqual(result['provisioning'], [100, 208, 208])
+        self.assertEqual(result['throttled_checks'], 1)
+        self.assertEqual(result['throttled_units'], 40.0)
+
+    def test_simulate_decrease_limit(self):
+        """ Ensure that decreases over the daily limit are rejected """
+        result = simulation.simulate(
+            self.traffic, self.aggressive_config, initial_units=250)
+        self.assertEqual(result['max_daily_decreases'], 4)
+        self.assertGreater(result['rejected_decreases'], 0)
+
+    def test_pi_controller_beats_default_thresholds(self):
+        """ Ensure that the PI controller flaps less than the defaults """
+        thresholds = simulation.simulate(
+            self.traffic, self.default_config, initial_units=250)
+        pi = simulation.simulate(
+            self.traffic, self.pi_config, initial_units=250)
+
+        self.assertLess(pi['updates'], thresholds['updates'])
+        self.assertLess(pi['decreases'], thresholds['decreases'])
+        self.assertLessEqual(
+            pi['throttled_checks'], thresholds['throttled_checks'])
+        self.assertLessEqual(pi['max_daily_decreases'], 4)
+
+    def test_pi_controller_beats_aggressive_thresholds(self):
+        """ Ensure that the PI controller flaps less than tight thresholds """
+        thresholds = simulation.simulate(
+            self.traffic, self.aggressive_config, initial_units=250)
+        pi = simulation.simulate(
+            self.traffic, self.pi_config, initial_units=250)
+
+        self.assertLess(pi['updates'], thresholds['updates'])
+        self.assertLess(
+            pi['decreases'] + pi['rejected_decreases'],
+            thresholds['decreases'] + thresholds['rejected_decreases'])
+        self.assertEqual(pi['rejected_decreases'], 0)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+""" Scale up throttled tables and GSIs between the check cycles
+
+With throttle-check-interval set, the time between two check cycles is used
+to poll the ReadThrottleEvents and WriteThrottleEvents of the managed
+tables and GSIs, in as few GetMetricData requests as possible. A table or
+GSI with more throttle events than its throttled-reads-upper-threshold or
+throttled-writes-upper-threshold is scaled up at once, with its
+increase-reads-with or increase-writes-with settings, or to its target
+utilisation with the target unit. The max provisioning, maintenance
+windows and circuit breakers apply as in the check cycles. Scaling down is
+left to the check cycles.
+"""
+import math
+import time
+from datetime import datetime, timedelta
+
+from boto.exception import BotoServerError
+
+from dynamic_dynamodb import calculators, config, consul_handler, scheduler
+from dynamic_dynamodb.aws import cloudwatch, dynamodb, sns
+from dynamic_dynamodb.core import circuit_breaker, controller
+from dynamic_dynamodb.log_handler import LOGGER as logger
+from dynamic_dynamodb.config_handler import get_global_option
+
+# CloudWatch publishes the DynamoDB metrics with a delay, so the polled
+# windows end this many minutes ago
+METRIC_DELAY_MINUTES = 1
+
+# Watched tables, table name -> (table_key, list of tuples
+# (gsi_name, gsi_key))
+WATCHED = {}
+
+# End of the last polled window, so that no throttle event is counted twice
+LAST_WINDOW_END = None
+
+
+def watch(tables, checked_tables, gsis):
+    """ Update the watched tables and GSIs after a check cycle
+
+    :type tables: list
+    :param tables: All managed tables, list of tuples (table_name, table_key)
+    :type checked_tables: list
+    :param checked_tables: Tables checked in the cycle
+    :type gsis: list
+    :param gsis: List of tuples (gsi_name, gsi_key) of each checked table
+    """
+    table_names = set(table_name for table_name, table_key in tables)
+    for table_name in list(WATCHED):
+        if table_name not in table_names:
+            del WATCHED[table_name]
+
+    for (table_name, table_key), table_gsis in zip(checked_tables, gsis):
+        WATCHED[table_name] = (table_key, list(table_gsis))
+
+
+def run_until(l_consulapi, wake_up):
+    """ Poll the throttle events every throttle-check-interval until wake_up
+
+    Returns at once if throttle-check-interval is not set.
+
+    :type l_consulapi: consul.Consul
+    :param l_consulapi: Consul client
+    :type wake_up: float
+    :param wake_up: Time the next check cycle is due, None before the first
+    """
+    interval = get_global_option('throttle_check_interval')
+    if not interval or wake_up is None:
+        return
+
+    while True:
+        poll_time = time.time() + interval
+        if poll_time >= wake_up:
+            return
+
+        scheduler.sleep_until(poll_time)
+
+        try:
+            poll(l_consulapi)
+        except BotoServerError as error:
+            logger.error(
+                'Could not poll throttle events. Status: "{0}". '
+                'Reason: "{1}"'.format(error.status, error.reason))
+
+
+def poll(l_consulapi):
+    """ Scale up the watched tables and GSIs that are throttled
+
+    :type l_consulapi: consul.Consul
+    :param l_consulapi: Consul client
+    :returns: int -- Number of tables and GSIs scaled up
+    """
+    global LAST_WINDOW_END
+
+    end_time = datetime.utcnow().replace(second=0, microsecond=0) - \
+        timedelta(minutes=METRIC_DELAY_MINUTES)
+    start_time = end_time - timedelta(minutes=max(1, int(math.ceil(
+        get_global_option('throttle_check_interval') / 60.0))))
+    if LAST_WINDOW_END is not None:
+        if end_time <= LAST_WINDOW_END:
+            return 0
+
+        start_time = max(start_time, LAST_WINDOW_END)
+
+    entities = []
+    queries = []
+    for table_name, table_key, gsi_name, gsi_key, entity_config in \
+            __get_entities(l_consulapi):
+        for operation, metric in (('reads', 'Read'), ('writes', 'Write')):
+            if (entity_config['enable_{0}_autoscaling'.format(operation)] and
+                    entity_config['enable_{0}_up_scaling'.format(operation)]
+                    and entity_config[
+                        'throttled_{0}_upper_threshold'.format(operation)]):
+                entities.append((
+                    table_name, table_key, gsi_name, gsi_key,
+                    entity_config, operation))
+                queries.append((
+                    table_name,
+                    gsi_name,
+                    '{0}ThrottleEvents'.format(metric)))
+
+    if not queries:
+        return 0
+
+    results = cloudwatch.get_dynamodb_metrics(
+        queries,
+        start_time,
+        end_time,
+        int((end_time - start_time).total_seconds()))
+    if results is None:
+        logger.debug(
+            'GetMetricData is not allowed, not polling throttle events')
+        return 0
+
+    LAST_WINDOW_END = end_time
+
+    # Throttled operations of each table and GSI
+    throttled = {}
+    for (table_name, table_key, gsi_name, gsi_key, entity_config,
+            operation), datapoints in zip(entities, results):
+        throttled_events = sum(
+            int(datapoint['Sum']) for datapoint in datapoints)
+        if throttled_events <= entity_config[
+                'throttled_{0}_upper_threshold'.format(operation)]:
+            continue
+
+        logger.info(
+            '{0} - {1:d} throttled {2} since {3} UTC'.format(
+                __log_tag(table_name, gsi_name),
+                throttled_events,
+                operation,
+                start_time.strftime('%H:%M')))
+        throttled.setdefault(
+            (table_name, table_key, gsi_name, gsi_key),
+            (entity_config, []))[1].append(operation)
+
+    if not throttled:
+        return 0
+
+    # Make sure the provisioning is read after any update made by the cycle
+    dynamodb.clear_table_descriptions()
+
+    scaled = 0
+    for (table_name, table_key, gsi_name, gsi_key), \
+            (entity_config, operations) in sorted(throttled.items()):
+        try:
+            if __scale_up(
+                    table_name, table_key, gsi_name, gsi_key,
+                    entity_config, operations):
+                scaled += 1
+        except BotoServerError as error:
+            logger.error(
+                '{0} - Could not scale up. Status: "{1}". '
+                'Reason: "{2}"'.format(
+                    __log_tag(table_name, gsi_name),
+                    error.status,
+                    error.reason))
+
+    sns.flush_notifications()
+
+    return scaled
+
+
+def __get_entities(l_consulapi):
+    """ Return the watched tables and GSIs with their configuration
+
+    Tables and GSIs whose configuration key is gone, after a configuration
+    reload, are skipped until the next check cycle.
+
+    :type l_consulapi: consul.Consul
+    :param l_consulapi: Consul client
+    :returns: list -- List of tuples (table_name, table_key, gsi_name,
+        gsi_key, configuration), gsi_name and gsi_key are None for tables
+    """
+    configured_tables = config.get_configuration()['tables']
+
+    entities = []
+    for table_name, (table_key, table_gsis) in sorted(WATCHED.items()):
+        if table_key not in configured_tables:
+            continue
+
+        entities.append((
+            table_name, table_key, None, None,
+            consul_handler.get_effective_config(
+                l_consulapi,
+                'dynamic-dynamodb/' + table_name,
+                configured_tables[table_key])))
+
+        for gsi_name, gsi_key in table_gsis:
+            if gsi_key not in configured_tables[table_key].get('gsis', {}):
+                continue
+
+            entities.append((
+                table_name, table_key, gsi_name, gsi_key,
+                consul_handler.get_effective_config(
+                    l_consulapi,
+                    'dynamic-dynamodb/{0}/index/{1}'.format(
+                        table_name, gsi_name),
+                    configured_tables[table_key]['gsis'][gsi_key])))
+
+    return entities
+
+
+def __scale_up(
+        table_name, table_key, gsi_name, gsi_key, entity_config, operations):
+    """ Scale up the throttled operations of a table or GSI
+
+    :type table_name: str
+    :param table_name: Name of the DynamoDB table
+    :type table_key: str
+    :param table_key: Table configuration option key name
+    :type gsi_name: str
+    :param gsi_name: Name of the GSI, or None
+    :type gsi_key: str
+    :param gsi_key: GSI configuration option key name, or None
+    :type entity_config: dict
+    :param entity_config: Configuration of the table or GSI
+    :type operations: list
+    :param operations: Throttled operations, 'reads' and/or 'writes'
+    :returns: bool -- True if the provisioning was updated
+    """
+    log_tag = __log_tag(table_name, gsi_name)
+
+    if (get_global_option('circuit_breaker_url') or
+            entity_config.get('circuit_breaker_url')):
+        if circuit_breaker.is_open(table_name, table_key, gsi_name, gsi_key):
+            logger.warning('Circuit breaker is OPEN!')
+            return False
+
+    if gsi_name is None:
+        status = dynamodb.get_table_status(table_name)
+        current_reads = dynamodb.get_provisioned_table_read_units(table_name)
+        current_writes = dynamodb.get_provisioned_table_write_units(
+            table_name)
+    else:
+        status = dynamodb.get_gsi_status(table_name, gsi_name)
+        current_reads = dynamodb.get_provisioned_gsi_read_units(
+            table_name, gsi_name)
+        current_writes = dynamodb.get_provisioned_gsi_write_units(
+            table_name, gsi_name)
+
+    if status != 'ACTIVE':
+        logger.warning(
+            '{0} - Not performing throughput changes when the status '
+            'is {1}'.format(log_tag, status))
+        return False
+
+    reads = current_reads
+    if 'reads' in operations:
+        reads = calculators.increase_reads(
+            entity_config['increase_reads_unit'],
+            current_reads,
+            __get_increase_with(entity_config, 'reads'),
+            entity_config['max_provisioned_reads'],
+            __get_consumed_percent(entity_config, 'reads'),
+            log_tag)
+
+    writes = current_writes
+    if 'writes' in operations:
+        writes = calculators.increase_writes(
+            entity_config['increase_writes_unit'],
+            current_writes,
+            __get_increase_with(entity_config, 'writes'),
+            entity_config['max_provisioned_writes'],
+            __get_consumed_percent(entity_config, 'writes'),
+            log_tag)
+
+    reads = max(int(reads), current_reads)
+    writes = max(int(writes), current_writes)
+    if reads == current_reads and writes == current_writes:
+        logger.info(
+            '{0} - Throttled, but already at the max provisioning'.format(
+                log_tag))
+        return False
+
+    logger.info(
+        '{0} - Scaling up to {1:d} read units and {2:d} write units '
+        'before the next check'.format(log_tag, reads, writes))
+
+    if gsi_name is None:
+        applied = dynamodb.update_table_provisioning(
+            table_name, table_key, reads, writes)
+    else:
+        applied = dynamodb.update_gsi_provisioning(
+            table_name, table_key, gsi_name, gsi_key, reads, writes)
+
+    if applied is not None:
+        controller.record_update(
+            table_name,
+            gsi_name,
+            {'reads': current_reads, 'writes': current_writes},
+            {'reads': applied[0], 'writes': applied[1]})
+
+    return True
+
+
+def __get_increase_with(entity_config, operation):
+    """ Return the increase-*-with value, or the target utilisation of the
+    target unit
+
+    :type entity_config: dict
+    :param entity_config: Configuration of the table or GSI
+    :type operation: str
+    :param operation: 'reads' or 'writes'
+    :returns: int
+    """
+    if entity_config['increase_{0}_unit'.format(operation)] == 'target':
+        return entity_config['target_{0}_utilization'.format(operation)]
+
+    return entity_config['increase_{0}_with'.format(operation)]
+
+
+def __get_consumed_percent(entity_config, operation):
+    """ Return the consumption to scale up from
+
+    The consumption is not polled. The percent and units increases are
+    made from the provisioning. The target unit sizes a throttled table or
+    GSI as if it consumed all of its provisioning.
+
+    :type entity_config: dict
+    :param entity_config: Configuration of the table or GSI
+    :type operation: str
+    :param operation: 'reads' or 'writes'
+    :returns: float
+    """
+    if entity_config['increase_{0}_unit'.format(operation)] == 'target':
+        return 100.0
+
+    return 0
+
+
+def __log_tag(table_name, gsi_name):
+    """ Return the log prefix of a table or GSI
+
+    :type table_name: str
+    :param table_name: Name of the DynamoDB table
+    :type gsi_name: str
+    :param gsi_name: Name of the GSI, or None
+    :returns: str
+    """
+    if gsi_name is None:
+        return table_name
+
+    return '{0} - GSI: {1}'.format(table_name, gsi_name)
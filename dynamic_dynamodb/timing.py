@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+""" Time the phases of the check cycle
+
+Phases are timed with the phase() context manager. Phases may be nested,
+each phase is only charged the time not spent in its nested phases. Time
+spent while checking a table is also added up per table, see table().
+
+A summary is logged at the end of each cycle. Send SIGUSR1 to the process
+to write the timings of the last cycle to a JSON file.
+"""
+import json
+import os.path
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from dynamic_dynamodb import metrics
+from dynamic_dynamodb.log_handler import LOGGER as logger
+from dynamic_dynamodb.config_handler import get_global_option
+
+# Phases in the order they are reported
+PHASES = [
+    'config',
+    'discovery',
+    'consul',
+    'circuit_breaker',
+    'describe_table',
+    'cloudwatch',
+    'decision',
+    'update_table',
+    'sns'
+]
+
+# Number of tables listed in the cycle summary
+SLOWEST_TABLES = 3
+
+# Timings of the running cycle, phase -> [count, seconds, max seconds],
+# and table -> phase -> seconds
+CYCLE_PHASES = {}
+CYCLE_TABLES = {}
+CYCLE_START = None
+CYCLE_LOCK = threading.Lock()
+
+# Timings of the last finished cycle, as returned by end_cycle()
+LAST_CYCLE = None
+
+# Per thread stack of running phases and the table being checked
+CONTEXT = threading.local()
+
+
+def start_cycle():
+    """ Forget the timings of the previous cycle and start a new one """
+    global CYCLE_START
+
+    with CYCLE_LOCK:
+        CYCLE_PHASES.clear()
+        CYCLE_TABLES.clear()
+        CYCLE_START = time.time()
+
+
+def end_cycle():
+    """ Finish the cycle and log a summary of its timings
+
+    :returns: dict -- Timings of the cycle, see get_last_cycle()
+    """
+    global LAST_CYCLE
+
+    with CYCLE_LOCK:
+        started = CYCLE_START or time.time()
+        phases = dict(
+            (name, {'count': count, 'seconds': seconds, 'max': maximum})
+            for name, (count, seconds, maximum) in CYCLE_PHASES.items())
+        tables = dict(
+            (table_name, dict(timings))
+            for table_name, timings in CYCLE_TABLES.items())
+
+    LAST_CYCLE = {
+        'started': datetime.utcfromtimestamp(started).isoformat(),
+        'duration': time.time() - started,
+        'phases': phases,
+        'tables': tables
+    }
+
+    summary = ', '.join(
+        '{0} {1:.2f}s'.format(name, phases[name]['seconds'])
+        for name in sorted(phases, key=__phase_order))
+    slowest = ', '.join(
+        '{0} {1:.2f}s'.format(table_name, tables[table_name]['total'])
+        for table_name in sorted(
+            tables,
+            key=lambda table_name: -tables[table_name].get('total', 0)
+        )[:SLOWEST_TABLES]
+        if 'total' in tables[table_name])
+
+    logger.info('Check cycle took {0:.2f}s. {1}. Slowest tables: {2}'.format(
+        LAST_CYCLE['duration'], summary or 'No phases timed', slowest or '-'))
+
+    return LAST_CYCLE
+
+
+def get_last_cycle():
+    """ Return the timings of the last finished cycle
+
+    :returns: dict or None -- Start time, duration in seconds, count, total
+        and max seconds per phase, and seconds per phase and table
+    """
+    return LAST_CYCLE
+
+
+@contextmanager
+def phase(name):
+    """ Time a phase of the check cycle
+
+    :type name: str
+    :param name: Name of the phase, one of PHASES
+    """
+    stack = getattr(CONTEXT, 'stack', None)
+    if stack is None:
+        stack = CONTEXT.stack = []
+
+    # Seconds spent in nested phases
+    nested = [0.0]
+    stack.append(nested)
+    start = time.time()
+    try:
+        yield
+    finally:
+        elapsed = time.time() - start
+        stack.pop()
+        if stack:
+            stack[-1][0] += elapsed
+
+        __record(name, getattr(CONTEXT, 'table', None), elapsed - nested[0])
+
+
+@contextmanager
+def table(table_name):
+    """ Add the phases timed in this thread to a table
+
+    The time spent in the block is recorded as the total for the table.
+
+    :type table_name: str
+    :param table_name: Name of the DynamoDB table
+    """
+    previous = getattr(CONTEXT, 'table', None)
+    CONTEXT.table = table_name
+    start = time.time()
+    try:
+        yield
+    finally:
+        CONTEXT.table = previous
+        with CYCLE_LOCK:
+            timings = CYCLE_TABLES.setdefault(table_name, {})
+            timings['total'] = timings.get('total', 0) + time.time() - start
+
+
+def install_signal_handler():
+    """ Write the timings of the last cycle to a file on SIGUSR1
+
+    Must be called from the main thread.
+    """
+    signal.signal(signal.SIGUSR1, __handle_signal)
+
+
+def __handle_signal(signum, frame):
+    """ Write the timings of the last cycle to a JSON file
+
+    Runs in the main thread, possibly while it holds CYCLE_LOCK, so only
+    the finished cycle is written.
+    """
+    path = os.path.join(
+        get_global_option('pid_file_dir'),
+        'dynamic-dynamodb.{0}.timing.json'.format(
+            get_global_option('instance')))
+
+    try:
+        with open(path, 'w') as dump_file:
+            json.dump(LAST_CYCLE, dump_file, indent=2, sort_keys=True)
+    except IOError as error:
+        logger.error('Could not write timings to {0}: {1}'.format(
+            path, error))
+        return
+
+    logger.info('Wrote timings of the last check cycle to {0}'.format(path))
+
+
+def __phase_order(name):
+    """ Sort key putting the phases in the order of PHASES
+
+    :type name: str
+    :param name: Name of the phase
+    :returns: tuple
+    """
+    if name in PHASES:
+        return PHASES.index(name), name
+
+    return len(PHASES), name
+
+
+def __record(name, table_name, seconds):
+    """ Add the time spent in a phase to the cycle
+
+    :type name: str
+    :param name: Name of the phase
+    :type table_name: str
+    :param table_name: Table being checked, or None
+    :type seconds: float
+    :param seconds: Seconds spent in the phase
+    """
+    with CYCLE_LOCK:
+        timings = CYCLE_PHASES.get(name)
+        if timings is None:
+            CYCLE_PHASES[name] = [1, seconds, seconds]
+        else:
+            timings[0] += 1
+            timings[1] += seconds
+            if seconds > timings[2]:
+                timings[2] = seconds
+
+        if table_name is not None:
+            table_timings = CYCLE_TABLES.setdefault(table_name, {})
+            table_timings[name] = table_timings.get(name, 0) + seconds
+
+    metrics.PHASE_SECONDS.observe(seconds, phase=name)
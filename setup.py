@@ -13,7 +13,8 @@ def return_requires():
         'boto >= 2.29.1',
         'requests >= 0.14.1',
         'logutils >= 0.3.3',
-        'retrying >= 1.3.3'
+        'retrying >= 1.3.3',
+        'python-consul >= 1.0.0'
     ]
     if sys.version_info < (2, 7):
         install_requires.append('argparse >= 1.4.0')
@@ -35,6 +36,9 @@ setup(
     include_package_data=True,
     zip_safe=False,
     install_requires=return_requires(),
+    extras_require={
+        'batch': ['numpy']
+    },
     classifiers=[
         'Development Status :: 5 - Production/Stable',
         'Environment :: Console',